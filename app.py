@@ -1,24 +1,212 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, send_file
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, send_file, \
+    abort, Response, stream_with_context, g, has_request_context, send_from_directory
 from flask_sqlalchemy import SQLAlchemy
+import click
 from werkzeug.security import generate_password_hash, check_password_hash
 import os
 import io
-from fpdf import FPDF
+import importlib
+import itertools
+import importacao
+import metricas
+import exportacao
+import estaticos
 from io import BytesIO
 import zipfile
-from datetime import datetime, date
+import json
+import sqlite3
+import hashlib
+import mimetypes
+import secrets
+import gzip
+import multiprocessing
+import threading
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor, Future, wait, as_completed, FIRST_COMPLETED, \
+    TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict
+from datetime import datetime, date, timedelta
+from sqlalchemy import func, or_, and_, literal, bindparam, event, true
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import selectinload, configure_mappers
+from werkzeug.http import is_resource_modified
+from werkzeug.security import safe_join
+
+# Ajustes do SQLite para vários workers escrevendo no mesmo arquivo. SQLITE_OTIMIZADO=0
+# volta ao comportamento padrão (usado como linha de base no benchmark de contenção).
+SQLITE_OTIMIZADO = os.environ.get('SQLITE_OTIMIZADO', '1') != '0'
+SQLITE_ESPERA_LOCK = 15  # segundos esperando o lock de escrita antes de "database is locked"
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',       # leitores não bloqueiam o escritor e vice-versa
+    # NORMAL é seguro com WAL (fsync só no checkpoint); FULL faz fsync a cada commit e
+    # não perde commits numa queda de energia, a custo que a GRAVACAO_AGRUPADA dilui
+    'PRAGMA synchronous=' + os.environ.get('SQLITE_SINCRONO', 'NORMAL'),
+    'PRAGMA cache_size=-32000',      # 32 MB de cache de páginas por conexão
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA mmap_size=268435456',
+)
 
 app = Flask(__name__)
 app.secret_key = 'senha_super_secreta'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///romaneio.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///romaneio.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+if SQLITE_OTIMIZADO and app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'connect_args': {'timeout': SQLITE_ESPERA_LOCK, 'check_same_thread': False},
+        # uma conexão por thread do worker gthread (ver Procfile), com folga para os streams SSE
+        'pool_size': 16,
+        'max_overflow': 16,
+        'pool_timeout': 30,
+    }
 db = SQLAlchemy(app)
 
+@event.listens_for(Engine, 'connect')
+def _configurar_sqlite(conexao_dbapi, registro):
+    if not SQLITE_OTIMIZADO or not isinstance(conexao_dbapi, sqlite3.Connection):
+        return
+    cursor = conexao_dbapi.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+# Romaneios finalizados antigos vão para um segundo arquivo SQLite, ao lado do
+# principal (romaneio.db -> romaneio_arquivo.db), anexado como `arquivo` em toda
+# conexão; ver `flask arquivar`.
+ESQUEMA_ARQUIVO = 'arquivo'
+
+@event.listens_for(Engine, 'connect')
+def _anexar_arquivo(conexao_dbapi, registro):
+    if not isinstance(conexao_dbapi, sqlite3.Connection):
+        return
+    principal = next((caminho for _, nome, caminho in conexao_dbapi.execute('PRAGMA database_list')
+                      if nome == 'main'), '')
+    # banco em memória: o arquivo é um banco temporário vazio, só para as consultas valerem
+    arquivo = os.path.splitext(principal)[0] + '_arquivo.db' if principal else ''
+    conexao_dbapi.execute(f'ATTACH DATABASE ? AS {ESQUEMA_ARQUIVO}', (arquivo,))
+    if SQLITE_OTIMIZADO:
+        conexao_dbapi.execute(f'PRAGMA {ESQUEMA_ARQUIVO}.journal_mode=WAL')
+
+# --- Métricas ---
+
+registro_metricas = metricas.Metricas()
+PASTA_METRICAS = os.path.join(app.instance_path, 'metricas')
+DESCRICOES_METRICAS = {
+    'romaneio_requisicoes_total': 'Requisições atendidas, por endpoint, método e status HTTP.',
+    'romaneio_requisicao_segundos': 'Latência das requisições por endpoint.',
+    'romaneio_sql_comandos_total': 'Comandos SQL executados, por endpoint.',
+    'romaneio_sql_segundos_total': 'Tempo gasto em SQL, por endpoint.',
+    'romaneio_sql_lentos_total': 'Comandos SQL acima de LIMITE_CONSULTA_LENTA_MS, por endpoint.',
+    'romaneio_leituras_total': 'Leituras de QR em /validar_volume, por resultado.',
+    'romaneio_leituras_repetidas_total': 'Repetições da mesma leitura respondidas pelo cache, sem ir ao banco.',
+    'romaneio_grupos_commit_total': 'Commits feitos pelo gravador agrupado (GRAVACAO_AGRUPADA=1).',
+    'romaneio_gravacoes_agrupadas_total': 'Gravações aplicadas pelo gravador agrupado.',
+    'romaneio_gravacoes_expiradas_total': 'Gravações descartadas por esperar demais na fila do gravador agrupado.',
+    'romaneio_eventos_recusados_total': 'Streams de /eventos recusados por STREAMS_EVENTOS_POR_WORKER.',
+}
+_ultima_gravacao_metricas = [0.0]
+
+def _endpoint_atual():
+    return (request.endpoint or 'desconhecido') if has_request_context() else 'fora_de_requisicao'
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _inicio_sql(conexao, cursor, sql, parametros, contexto, executemany):
+    conexao.info.setdefault('inicio_sql', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _fim_sql(conexao, cursor, sql, parametros, contexto, executemany):
+    duracao = time.perf_counter() - conexao.info['inicio_sql'].pop()
+    endpoint = _endpoint_atual()
+    registro_metricas.incrementar('romaneio_sql_comandos_total', endpoint=endpoint)
+    registro_metricas.incrementar('romaneio_sql_segundos_total', duracao, endpoint=endpoint)
+    if duracao * 1000 > LIMITE_CONSULTA_LENTA_MS:
+        registro_metricas.incrementar('romaneio_sql_lentos_total', endpoint=endpoint)
+        app.logger.warning('SQL lento (%.0f ms) em %s: %s', duracao * 1000, endpoint, ' '.join(sql.split())[:500])
+
+@event.listens_for(Engine, 'handle_error')
+def _erro_sql(contexto):
+    # comando que falhou não passa pelo after_cursor_execute: tira o início dele da pilha
+    if contexto.connection is not None and contexto.connection.info.get('inicio_sql'):
+        contexto.connection.info['inicio_sql'].pop()
+
+@app.before_request
+def _iniciar_medicao():
+    g.inicio_requisicao = time.perf_counter()
+
+@app.after_request
+def _registrar_medicao(resposta):
+    # respostas em streaming (SSE, ZIP) são medidas até o início do envio
+    if 'inicio_requisicao' in g:
+        endpoint = _endpoint_atual()
+        registro_metricas.observar('romaneio_requisicao_segundos',
+                                   time.perf_counter() - g.inicio_requisicao, endpoint=endpoint)
+        registro_metricas.incrementar('romaneio_requisicoes_total', endpoint=endpoint,
+                                      metodo=request.method, status=resposta.status_code)
+    agora = time.monotonic()
+    if agora - _ultima_gravacao_metricas[0] > INTERVALO_GRAVACAO_METRICAS:
+        _ultima_gravacao_metricas[0] = agora
+        registro_metricas.gravar(PASTA_METRICAS)
+    return resposta
+
+@app.route('/metrics')
+def exportar_metricas():
+    """Métricas de todos os workers no formato texto do Prometheus."""
+    registro_metricas.gravar(PASTA_METRICAS)
+    contadores, histogramas = metricas.somar_instantaneos(PASTA_METRICAS, VALIDADE_METRICAS)
+    return Response(metricas.formatar_prometheus(contadores, histogramas, DESCRICOES_METRICAS),
+                    mimetype='text/plain; version=0.0.4')
+
+POR_PAGINA_MENU = 50  # romaneios por página no menu
+TAMANHO_MAXIMO_LOTE = 500  # chaves aceitas por chamada de /validar_volume/lote
+STATUS_VOLUME = ('confirmado', 'faltante', 'pendente')  # aceitos por /api/confirmar_volume
+INTERVALO_VERSAO_INDICE = 2.0  # segundos entre conferências da versão do índice de leitura
+JANELA_LEITURA_REPETIDA = 2.0  # segundos em que a mesma leitura da sessão conta como repetição
+MAXIMO_LEITURAS_RECENTES = 10000  # leituras lembradas por worker para absorver repetições
+INTERVALO_EVENTOS = 1.0  # segundos entre consultas de eventos novos em /eventos
+DURACAO_MAXIMA_EVENTOS = 300  # segundos até o stream SSE fechar (o navegador reconecta)
+# Cada stream aberto ocupa uma das 16 threads do worker (ver Procfile) enquanto
+# durar; acima deste limite /eventos responde 503 e a página passa a consultar
+# /api/volumes de tempos em tempos, deixando as outras threads para as leituras.
+STREAMS_EVENTOS_POR_WORKER = 4
+PROCESSOS_PDF = min(4, os.cpu_count() or 1)  # processos de renderização do lote de PDFs
+CACHE_PDF_ITENS_MEMORIA = 64  # PDFs mantidos em memória por worker
+CACHE_PDF_BYTES_DISCO = 256 * 1024 * 1024  # limite do cache de PDFs em instance/cache_pdf
+TAMANHO_BLOCO_IMPORTACAO = 2000  # volumes por transação na importação de arquivos
+LIMITE_CONSULTA_LENTA_MS = float(os.environ.get('LIMITE_CONSULTA_LENTA_MS', 250))  # loga SQL acima disso
+INTERVALO_GRAVACAO_METRICAS = 5.0  # segundos entre instantâneos das métricas do worker
+VALIDADE_METRICAS = 600  # instantâneos mais velhos que isso (worker morto) saem de /metrics
+TAMANHO_MINIMO_GZIP = 1024  # bytes; respostas JSON e HTML menores vão sem compressão
+TIPOS_COMPRIMIDOS = ('application/json', 'text/html')  # comprimidos na hora; os estáticos já vêm prontos
+CACHE_ESTATICOS_SEGUNDOS = 365 * 24 * 3600  # static/dist: o nome muda quando o conteúdo muda
+LIMITE_CORRESPONDENCIAS_BUSCA = 5000  # linhas da busca textual ranqueadas por consulta
+DIAS_MAXIMOS_RESUMO = 366  # período mais longo aceito por /resumo e /api/resumo
+# Gravação agrupada das leituras (ver GravadorAgrupado); desligada por padrão
+GRAVACAO_AGRUPADA = os.environ.get('GRAVACAO_AGRUPADA', '0') == '1'
+LINHAS_POR_LOTE_EXPORTACAO = 1000  # linhas buscadas do cursor por vez em /exportar
+DIAS_PARA_ARQUIVAR = 90  # padrão de `flask arquivar`
+ROMANEIOS_POR_BLOCO_ARQUIVO = 500  # romaneios movidos por transação no arquivamento
+LIMITE_IN_DIMENSAO = 500  # valores por consulta IN ao cache das dimensões
+TAMANHO_GRUPO_COMMIT = 200  # gravações por commit, no máximo
+INTERVALO_GRUPO_COMMIT = 0.002  # segundos esperando mais gravações antes do commit
+# segundos que uma requisição espera a sua gravação começar na fila do gravador agrupado
+ESPERA_GRAVACAO = SQLITE_ESPERA_LOCK
+
 # --- Modelos ---
 
 class Transportadora(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(150), nullable=False)
+    # incrementada quando o conjunto de volumes pendentes muda de um jeito que o
+    # índice de leitura em memória não acompanha sozinho (ver IndiceLeitura)
+    versao_leitura = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # data de emissão mais nova já levada ao arquivo; o menu só consulta o arquivo
+    # quando o período pedido chega até ela
+    arquivado_ate = db.Column(db.Date)
+    # romaneios com status 'pendente', mantido pelos gatilhos de GATILHOS_PENDENTES
+    romaneios_pendentes = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
 class Usuario(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -41,6 +229,23 @@ class Romaneio(db.Model):
     transportadora_id = db.Column(db.Integer, db.ForeignKey('transportadora.id'), nullable=False)
     transportadora = db.relationship('Transportadora')
 
+    # Contadores desnormalizados, mantidos por alterar_status_volume() na mesma
+    # transação da mudança de status; `flask reconciliar-contadores` os reconstrói.
+    total_volumes = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    volumes_confirmados = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Revisão dos volumes do romaneio, incrementada junto com qualquer mudança neles
+    # (status, importação, reconciliação); vira o ETag das APIs de volumes e progresso.
+    revisao = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    alterado_em = db.Column(db.DateTime)
+    arquivado = False
+
+    __table_args__ = (
+        # listagem do menu: filtro por transportadora, ordenação/cursor por data e id
+        db.Index('ix_romaneio_transportadora_data', 'transportadora_id', 'data_emissao', 'id'),
+        # fallback da leitura de QR pela pré-nota
+        db.Index('ix_romaneio_transportadora_pre_nota', 'transportadora_id', 'pre_nota'),
+    )
+
 class Volume(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     tipo_caixa = db.Column(db.String(100))
@@ -49,28 +254,1042 @@ class Volume(db.Model):
     palete = db.Column(db.String(50))
     status = db.Column(db.String(50), default='pendente')
     codigo = db.Column(db.String(50))
-    
-    cod_regiao = db.Column(db.String(10))
-    regiao = db.Column(db.String(100))
-    cliente = db.Column(db.String(200))
-    produto = db.Column(db.String(200))
-    rota = db.Column(db.String(50))
+
+    # cliente, região, produto e rota ficam nas tabelas de dimensão; os nomes
+    # continuam acessíveis como atributos (volume.cliente), pelo cache `dimensoes`
+    cliente_id = db.Column(db.Integer, db.ForeignKey('cliente.id'))
+    regiao_id = db.Column(db.Integer, db.ForeignKey('regiao.id'))
+    produto_id = db.Column(db.Integer, db.ForeignKey('produto.id'))
+    rota_id = db.Column(db.Integer, db.ForeignKey('rota.id'))
     pre_nota = db.Column(db.String(50))
     numero_caixa = db.Column(db.String(50))
     chave_de_acesso = db.Column(db.String(200))
 
     romaneio_id = db.Column(db.Integer, db.ForeignKey('romaneio.id'))
     romaneio = db.relationship('Romaneio', backref=db.backref('volumes', lazy=True))
+    # revisão do romaneio em que o volume mudou pela última vez (sincronização por ?since=)
+    revisao = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        db.Index('ix_volume_chave_de_acesso', 'chave_de_acesso'),
+        # volumes de um romaneio e contagem de confirmados (índice de cobertura)
+        db.Index('ix_volume_romaneio_status', 'romaneio_id', 'status'),
+        # volumes alterados depois de uma revisão (/api/volumes/<id>?since=)
+        db.Index('ix_volume_romaneio_revisao', 'romaneio_id', 'revisao'),
+    )
+
+    def __init__(self, **campos):
+        # aceita os nomes (Volume(cliente='...')) no lugar dos ids
+        super().__init__(**trocar_por_ids([campos], DIMENSOES_VOLUME)[0])
 
 class Item(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     descricao = db.Column(db.String(200))
-    cliente = db.Column(db.String(200))   # ← Adicionado
-    destino = db.Column(db.String(200))   # ← Adicionado
-    regiao = db.Column(db.String(20))     # ← Adicionado
+    # cliente, e destino/região (nome/código da região), nas tabelas de dimensão
+    cliente_id = db.Column(db.Integer, db.ForeignKey('cliente.id'))
+    regiao_id = db.Column(db.Integer, db.ForeignKey('regiao.id'))
     volume_id = db.Column(db.Integer, db.ForeignKey('volume.id'))
     volume = db.relationship('Volume', backref=db.backref('itens', lazy=True))
 
+    __table_args__ = (
+        db.Index('ix_item_volume', 'volume_id'),
+    )
+
+    def __init__(self, **campos):
+        super().__init__(**trocar_por_ids([campos], DIMENSOES_ITEM)[0])
+
+# Tabelas de dimensão: cada nome de cliente, produto, rota e região é gravado uma
+# vez e os volumes e itens guardam só o id. As linhas nunca mudam depois de criadas.
+class Cliente(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    nome = db.Column(db.String(200), nullable=False, unique=True)
+
+class Produto(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    nome = db.Column(db.String(200), nullable=False, unique=True)
+
+class Rota(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    codigo = db.Column(db.String(50), nullable=False, unique=True)
+
+class Regiao(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    codigo = db.Column(db.String(20), nullable=False)  # vazio quando o WMS só manda o nome
+    nome = db.Column(db.String(100), nullable=False)
+
+    __table_args__ = (db.UniqueConstraint('codigo', 'nome'),)
+
+class Dimensao:
+    """Cache, por worker, de uma tabela de dimensão: id -> valor e valor -> id.
+
+    O valor é a tupla das colunas (('CLIENTE X',) ou ('18', 'E DIRETA')). Como
+    as linhas nunca mudam nem são apagadas, o cache só cresce e nunca precisa
+    ser invalidado entre workers.
+    """
+
+    def __init__(self, modelo, colunas):
+        self.modelo = modelo
+        self.colunas = [getattr(modelo, c) for c in colunas]
+        self._por_id = {}
+        self._por_valor = {}
+        self._trava = threading.Lock()
+
+    def _guardar(self, linhas):
+        with self._trava:
+            for id_, *valor in linhas:
+                self._por_id[id_] = tuple(valor)
+                self._por_valor[tuple(valor)] = id_
+
+    def _contem(self, valores):
+        if len(self.colunas) == 1:
+            return self.colunas[0].in_([v[0] for v in valores])
+        return db.tuple_(*self.colunas).in_(valores)
+
+    def valores(self, ids, conexao=None):
+        """Valores dos ids (None para id None), buscando de uma vez os que faltam no cache."""
+        faltando = list({i for i in ids if i is not None and i not in self._por_id})
+        conexao = conexao or db.session.connection()
+        for inicio in range(0, len(faltando), LIMITE_IN_DIMENSAO):
+            self._guardar(conexao.execute(db.select(self.modelo.id, *self.colunas).where(
+                self.modelo.id.in_(faltando[inicio:inicio + LIMITE_IN_DIMENSAO]))))
+        return [self._por_id.get(i) for i in ids]
+
+    def ids(self, valores):
+        """Ids dos valores (tuplas; None dá None), criando as linhas que não existem.
+
+        Grava numa transação própria, já confirmada quando volta: o cache nunca
+        guarda um id que um rollback de quem chamou desfaria. Por isso deve ser
+        chamado antes das gravações da transação de quem chama.
+        """
+        faltando = list({v for v in valores if v is not None and v not in self._por_valor})
+        if faltando:
+            nomes = [c.key for c in self.colunas]
+            with db.engine.begin() as conexao:
+                for inicio in range(0, len(faltando), LIMITE_IN_DIMENSAO):
+                    parte = faltando[inicio:inicio + LIMITE_IN_DIMENSAO]
+                    conexao.execute(sqlite_insert(self.modelo).on_conflict_do_nothing(),
+                                    [dict(zip(nomes, v)) for v in parte])
+                    self._guardar(conexao.execute(db.select(self.modelo.id, *self.colunas).where(
+                        self._contem(parte))))
+        return [self._por_valor.get(v) for v in valores]
+
+dimensoes = {
+    'cliente': Dimensao(Cliente, ('nome',)),
+    'produto': Dimensao(Produto, ('nome',)),
+    'rota': Dimensao(Rota, ('codigo',)),
+    'regiao': Dimensao(Regiao, ('codigo', 'nome')),
+}
+
+# coluna de id -> (dimensão, campos com os nomes, na ordem das colunas da dimensão)
+DIMENSOES_VOLUME = {
+    'cliente_id': ('cliente', ('cliente',)),
+    'regiao_id': ('regiao', ('cod_regiao', 'regiao')),
+    'produto_id': ('produto', ('produto',)),
+    'rota_id': ('rota', ('rota',)),
+}
+DIMENSOES_ITEM = {
+    'cliente_id': ('cliente', ('cliente',)),
+    'regiao_id': ('regiao', ('regiao', 'destino')),
+}
+
+def _valor_dimensao(campos):
+    valor = tuple(c or '' for c in campos)
+    return valor if any(valor) else None
+
+def trocar_por_ids(linhas, dimensoes_da_tabela):
+    """Troca, em cada dict de `linhas`, os campos com nomes pelos ids das dimensões.
+
+    Campos ausentes do dict não mexem no id. Altera os dicts e devolve a lista.
+    """
+    for coluna, (dimensao, campos) in dimensoes_da_tabela.items():
+        com_campo = [linha for linha in linhas if any(c in linha for c in campos)]
+        if not com_campo:
+            continue
+        valores = [_valor_dimensao([linha.pop(c, None) for c in campos]) for linha in com_campo]
+        for linha, id_ in zip(com_campo, dimensoes[dimensao].ids(valores)):
+            linha[coluna] = id_
+    return linhas
+
+def completar_nomes(linhas, dimensoes_da_tabela, conexao=None):
+    """O inverso de trocar_por_ids: acrescenta a cada dict os nomes dos ids."""
+    for coluna, (dimensao, campos) in dimensoes_da_tabela.items():
+        valores = dimensoes[dimensao].valores([linha[coluna] for linha in linhas], conexao)
+        for linha, valor in zip(linhas, valores):
+            linha.update(zip(campos, valor or (None,) * len(campos)))
+    return linhas
+
+def _expor_nomes(modelo, dimensoes_da_tabela):
+    """Atributos só de leitura com os nomes (volume.cliente, item.destino...)."""
+    for coluna, (dimensao, campos) in dimensoes_da_tabela.items():
+        for posicao, campo in enumerate(campos):
+            def ler(self, coluna=coluna, dimensao=dimensao, posicao=posicao):
+                valor = dimensoes[dimensao].valores([getattr(self, coluna)])[0]
+                return (valor[posicao] or None) if valor else None
+            setattr(modelo, campo, property(ler))
+
+_expor_nomes(Volume, DIMENSOES_VOLUME)
+_expor_nomes(Item, DIMENSOES_ITEM)
+
+class EventoVolume(db.Model):
+    """Mudança de status publicada em /eventos/<romaneio_id>.
+
+    Gravado na mesma transação da mudança, com os contadores do romaneio já
+    atualizados, então o cliente aplica cada evento como valor absoluto. Fica
+    no banco para alcançar os clientes ligados a qualquer worker.
+    volume_id nulo indica mudança de status do próprio romaneio.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    romaneio_id = db.Column(db.Integer, db.ForeignKey('romaneio.id'), nullable=False)
+    volume_id = db.Column(db.Integer)
+    status = db.Column(db.String(50))
+    confirmados = db.Column(db.Integer)
+    total = db.Column(db.Integer)
+    criado_em = db.Column(db.DateTime, nullable=False, server_default=func.current_timestamp())
+
+    __table_args__ = (
+        db.Index('ix_evento_volume_romaneio', 'romaneio_id', 'id'),
+    )
+
+class ResumoOperacao(db.Model):
+    """Totais da operação por transportadora e hora (horário local do servidor).
+
+    Somados por somar_resumo() na mesma transação de cada leitura, mudança de
+    status e finalização, para o painel de /resumo ler só esta tabela. Como são
+    contagens de acontecimentos, um volume desconfirmado e confirmado de novo
+    conta duas vezes. romaneios_pendentes é a exceção: não é somado, é o número
+    de romaneios pendentes da transportadora na última gravação da hora.
+    `flask reconstruir-resumo` refaz os dias ainda cobertos por EventoVolume.
+    """
+    transportadora_id = db.Column(db.Integer, db.ForeignKey('transportadora.id'), primary_key=True)
+    dia = db.Column(db.Date, primary_key=True)
+    hora = db.Column(db.Integer, primary_key=True)
+    leituras = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # QR lidos, achados ou não
+    volumes_confirmados = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    volumes_faltantes = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    romaneios_finalizados = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # passagens a finalizado
+    # romaneios pendentes ao fim da hora (cópia de Transportadora.romaneios_pendentes)
+    romaneios_pendentes = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+# Cópias de romaneio, volume e item no banco anexado `arquivo`, com as mesmas
+# colunas e índices. As chaves estrangeiras entre elas apontam para o arquivo;
+# a de transportadora continua no banco principal.
+def _tabela_no_arquivo(modelo):
+    return modelo.__table__.to_metadata(
+        db.metadata, schema=ESQUEMA_ARQUIVO,
+        referred_schema_fn=lambda tabela, esquema, restricao, esquema_ref:
+            ESQUEMA_ARQUIVO if restricao.referred_table.name in ('romaneio', 'volume') else esquema_ref)
+
+class RomaneioArquivado(db.Model):
+    __table__ = _tabela_no_arquivo(Romaneio)
+    volumes = db.relationship('VolumeArquivado', lazy=True)
+    arquivado = True
+
+class VolumeArquivado(db.Model):
+    __table__ = _tabela_no_arquivo(Volume)
+    itens = db.relationship('ItemArquivado', lazy=True)
+
+class ItemArquivado(db.Model):
+    __table__ = _tabela_no_arquivo(Item)
+
+_expor_nomes(VolumeArquivado, DIMENSOES_VOLUME)
+_expor_nomes(ItemArquivado, DIMENSOES_ITEM)
+
+# --- Consultas dos caminhos críticos ---
+# Compartilhadas entre as rotas e o comando `flask verificar-planos`, que confere
+# se cada uma continua usando índice.
+
+def consulta_romaneios_menu(transportadora_id, status=None, data_inicio=None, data_fim=None, modelo=Romaneio):
+    # modelo=RomaneioArquivado faz a mesma consulta no arquivo
+    romaneios = modelo.query.filter_by(transportadora_id=transportadora_id)
+    if status:
+        romaneios = romaneios.filter_by(status=status)
+    # data_emissao é comparada direto com a data (sem CAST) para o índice ser usado
+    if data_inicio:
+        romaneios = romaneios.filter(modelo.data_emissao >= data_inicio)
+    if data_fim:
+        romaneios = romaneios.filter(modelo.data_emissao <= data_fim)
+    return romaneios
+
+def consulta_volume_por_chave(chave, transportadora_id):
+    return Volume.query.join(Romaneio).filter(
+        Volume.chave_de_acesso == chave,
+        Volume.status != 'confirmado',
+        Romaneio.transportadora_id == transportadora_id
+    )
+
+def consulta_volume_por_pre_nota(pre_nota, transportadora_id):
+    return Volume.query.join(Romaneio).filter(
+        Romaneio.pre_nota == pre_nota,
+        Volume.status != 'confirmado',
+        Romaneio.transportadora_id == transportadora_id
+    )
+
+def pre_nota_do_qr(qr_code):
+    if len(qr_code) >= 18:
+        return qr_code[11:18]  # Ajuste conforme estrutura real do QR
+    return None
+
+# --- Busca textual (FTS5) ---
+# Uma tabela FTS5 com tokenizador trigram (casa qualquer trecho de 3+ caracteres,
+# como um LIKE '%...%', só que indexado). Cada romaneio tem uma linha com
+# pré-nota e nota e cada volume uma com cliente, produto e as descrições dos
+# itens. O rowid carrega o romaneio nos 32 bits altos (romaneio_id << 32, mais o
+# id do volume nas linhas de volume), então a busca chega ao romaneio sem ler o
+# conteúdo das linhas. Gatilhos no banco mantêm a tabela em dia com qualquer
+# caminho de gravação, inclusive a importação em massa; mudanças de status não
+# passam por eles.
+
+def _rowid_volume(v):
+    return f'((coalesce({v}.romaneio_id, 0) << 32) + {v}.id)'
+
+def _inserir_linha_volume(volume_id=None, esquema=''):
+    """INSERT ... SELECT da linha de busca do volume `volume_id` (expressão SQL), ou de todos.
+
+    `esquema` ('arquivo.') lê volumes e itens do arquivo; a tabela de busca fica
+    sempre no banco principal e cobre os dois.
+    """
+    sql = (f"INSERT INTO busca_romaneio(rowid, cliente, produto, itens) "
+           f"SELECT {_rowid_volume('v')}, (SELECT nome FROM cliente WHERE id = v.cliente_id), "
+           f"(SELECT nome FROM produto WHERE id = v.produto_id), "
+           f"(SELECT group_concat(descricao, ' ') FROM {esquema}item WHERE volume_id = v.id) FROM {esquema}volume v")
+    return sql if volume_id is None else f'{sql} WHERE v.id = {volume_id}'
+
+def _inserir_linha_romaneio(esquema=''):
+    return (f'INSERT INTO busca_romaneio(rowid, pre_nota, num_nota) '
+            f'SELECT id << 32, pre_nota, num_nota FROM {esquema}romaneio')
+
+DDL_BUSCA = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS busca_romaneio USING fts5(
+        pre_nota, num_nota, cliente, produto, itens, tokenize='trigram')""",
+    """CREATE TRIGGER busca_romaneio_ai AFTER INSERT ON romaneio BEGIN
+        INSERT INTO busca_romaneio(rowid, pre_nota, num_nota) VALUES (new.id << 32, new.pre_nota, new.num_nota);
+    END""",
+    """CREATE TRIGGER busca_romaneio_au AFTER UPDATE OF pre_nota, num_nota ON romaneio BEGIN
+        DELETE FROM busca_romaneio WHERE rowid = old.id << 32;
+        INSERT INTO busca_romaneio(rowid, pre_nota, num_nota) VALUES (new.id << 32, new.pre_nota, new.num_nota);
+    END""",
+    """CREATE TRIGGER busca_romaneio_ad AFTER DELETE ON romaneio BEGIN
+        DELETE FROM busca_romaneio WHERE rowid = old.id << 32;
+    END""",
+    f"""CREATE TRIGGER busca_volume_ai AFTER INSERT ON volume BEGIN
+        {_inserir_linha_volume('new.id')};
+    END""",
+    f"""CREATE TRIGGER busca_volume_au AFTER UPDATE OF cliente_id, produto_id, romaneio_id ON volume BEGIN
+        DELETE FROM busca_romaneio WHERE rowid = {_rowid_volume('old')};
+        {_inserir_linha_volume('new.id')};
+    END""",
+    f"""CREATE TRIGGER busca_volume_ad AFTER DELETE ON volume BEGIN
+        DELETE FROM busca_romaneio WHERE rowid = {_rowid_volume('old')};
+    END""",
+) + tuple(
+    f"""CREATE TRIGGER busca_item_{sufixo} AFTER {evento} ON item BEGIN
+        DELETE FROM busca_romaneio WHERE rowid = (
+            SELECT {_rowid_volume('v')} FROM volume v WHERE v.id = {linha}.volume_id);
+        {_inserir_linha_volume(linha + '.volume_id')};
+    END"""
+    for sufixo, evento, linha in (('ai', 'INSERT', 'new'), ('au', 'UPDATE OF descricao', 'new'),
+                                  ('ad', 'DELETE', 'old'))
+)
+_busca_disponivel = [None]
+busca_t = db.table('busca_romaneio', db.column('rowid', db.Integer))
+
+def apagar_gatilhos_busca(conexao):
+    for (nome,) in conexao.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'busca\\_%' ESCAPE '\\'").all():
+        conexao.exec_driver_sql(f'DROP TRIGGER {nome}')
+
+def criar_busca_textual():
+    """Cria a tabela de busca, preenchendo-a na primeira vez, e (re)cria os gatilhos.
+
+    Devolve False se o banco não for SQLite com FTS5; a busca cai então no
+    LIKE pela pré-nota.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    try:
+        with db.engine.begin() as conexao:
+            nova = not conexao.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE name = 'busca_romaneio'").first()
+            # gatilhos sempre recriados, para valerem os da versão atual
+            apagar_gatilhos_busca(conexao)
+            for ddl in DDL_BUSCA:
+                conexao.exec_driver_sql(ddl)
+            if nova:
+                reindexar_busca(conexao)
+    except OperationalError as erro:
+        app.logger.warning('Busca textual indisponível (SQLite sem FTS5?): %s', erro)
+        return False
+    _busca_disponivel[0] = True
+    return True
+
+def reindexar_busca(conexao):
+    """Reconstrói a tabela de busca a partir de romaneio, volume e item, do banco
+    principal e do arquivo."""
+    conexao.exec_driver_sql('DELETE FROM busca_romaneio')
+    for esquema in ('', f'{ESQUEMA_ARQUIVO}.') if arquivo_anexado(conexao) else ('',):
+        conexao.exec_driver_sql(_inserir_linha_romaneio(esquema))
+        conexao.exec_driver_sql(_inserir_linha_volume(esquema=esquema))
+    conexao.exec_driver_sql("INSERT INTO busca_romaneio(busca_romaneio) VALUES ('optimize')")
+
+def arquivo_anexado(conexao):
+    """True se as tabelas do arquivo já existem (criadas por migrar_banco)."""
+    return bool(conexao.exec_driver_sql(
+        f"SELECT 1 FROM {ESQUEMA_ARQUIVO}.sqlite_master WHERE name = 'romaneio'").first())
+
+def busca_textual_disponivel():
+    if _busca_disponivel[0] is None:
+        _busca_disponivel[0] = db.engine.dialect.name == 'sqlite' and bool(db.session.execute(db.text(
+            "SELECT 1 FROM sqlite_master WHERE name = 'busca_romaneio'")).first())
+    return _busca_disponivel[0]
+
+def expressao_busca(termo):
+    """Consulta FTS5 em que cada palavra digitada é uma frase exigida, ou None se
+    alguma palavra tiver menos de 3 caracteres (o trigram não a indexa)."""
+    palavras = termo.split()
+    if not palavras or any(len(p) < 3 for p in palavras):
+        return None
+    return ' '.join('"' + p.replace('"', '""') + '"' for p in palavras)
+
+def consulta_busca(transportadora_id, termo, status=None, data_inicio=None, data_fim=None, modelo=Romaneio):
+    """(romaneio, na_nota, volumes) dos romaneios que casam com `termo`, do mais
+    relevante ao menos; na_nota e volumes são a relevância (ver abaixo)."""
+    romaneios = consulta_romaneios_menu(transportadora_id, status, data_inicio, data_fim, modelo)
+    expressao = expressao_busca(termo)
+    if expressao is None or not busca_textual_disponivel():
+        return romaneios.filter(modelo.pre_nota.like(f'%{termo}%')) \
+            .add_columns(literal(0).label('na_nota'), literal(0).label('volumes')) \
+            .order_by(modelo.data_emissao.desc(), modelo.id.desc())
+    # Relevância: casar na pré-nota/nota (linha do próprio romaneio, rowid sem a parte
+    # do volume) vem antes, depois quantos volumes casaram, depois a data. Tudo sai
+    # do rowid; o bm25 do FTS5 custaria uma passada na lista inteira de cada termo
+    # comum. Só as LIMITE_CORRESPONDENCIAS_BUSCA linhas mais recentes são
+    # consideradas, então um termo que casa com o histórico inteiro continua rápido;
+    # transportadora, status e período são filtrados antes desse limite, para as
+    # linhas de outras transportadoras não tomarem o lugar das desta.
+    rowid = busca_t.c.rowid
+    correspondencias = db.select(rowid).select_from(busca_t).join(
+        modelo, modelo.id == rowid.op('>>')(32)
+    ).where(
+        db.text('busca_romaneio MATCH :expressao').bindparams(expressao=expressao), romaneios.whereclause
+    ).order_by(rowid.desc()).limit(LIMITE_CORRESPONDENCIAS_BUSCA).subquery()
+    romaneio_id = correspondencias.c.rowid.op('>>')(32)
+    encontrados = db.select(
+        romaneio_id.label('romaneio_id'),
+        func.max(correspondencias.c.rowid.op('&')(0xFFFFFFFF) == 0).label('na_nota'),
+        func.count().label('volumes'),
+    ).group_by(romaneio_id).subquery('busca')
+    return romaneios.join(encontrados, encontrados.c.romaneio_id == modelo.id) \
+        .add_columns(encontrados.c.na_nota, encontrados.c.volumes).order_by(
+            encontrados.c.na_nota.desc(), encontrados.c.volumes.desc(),
+            modelo.data_emissao.desc(), modelo.id.desc())
+
+def buscar_romaneios(transportadora_id, termo, status, data_inicio, data_fim, inicio, quantidade):
+    """Os romaneios de `inicio` a `inicio + quantidade` da busca, em ordem de
+    relevância, somando os do arquivo quando o período chega nele."""
+    filtros = (transportadora_id, termo, status, data_inicio, data_fim)
+    if not limite_do_arquivo(transportadora_id, data_inicio):
+        linhas = consulta_busca(*filtros).offset(inicio).limit(quantidade).all()
+        return [linha[0] for linha in linhas]
+    # a página pode vir de qualquer um dos dois: cada um dá as primeiras
+    # inicio + quantidade linhas e a junção escolhe
+    linhas = juntar_com_arquivo(
+        consulta_busca(*filtros).limit(inicio + quantidade).all(),
+        consulta_busca(*filtros, modelo=RomaneioArquivado).limit(inicio + quantidade).all(),
+        chave=lambda l: (l.na_nota, l.volumes, l[0].data_emissao, l[0].id),
+        romaneio_de=lambda l: l[0])
+    return [linha[0] for linha in linhas[inicio:inicio + quantidade]]
+
+# --- Contadores de conferência ---
+
+def alterar_status_volume(volume_id, romaneio_id, novo_status):
+    """Altera o status do volume e ajusta os contadores do romaneio, sem commit.
+
+    As atualizações são condicionais ao status anterior, então duas leituras
+    simultâneas do mesmo volume não contam duas vezes. Retorna False se o
+    volume já estava com esse status.
+    """
+    valores = {'status': novo_status, 'revisao': revisao_seguinte(romaneio_id)}
+    if novo_status == 'confirmado':
+        alterado = Volume.query.filter(
+            Volume.id == volume_id, or_(Volume.status != 'confirmado', Volume.status.is_(None))
+        ).update(valores, synchronize_session='fetch')
+        delta = alterado
+    else:
+        delta = -Volume.query.filter(
+            Volume.id == volume_id, Volume.status == 'confirmado'
+        ).update(valores, synchronize_session='fetch')
+        alterado = delta or Volume.query.filter(
+            Volume.id == volume_id, or_(Volume.status != novo_status, Volume.status.is_(None))
+        ).update(valores, synchronize_session='fetch')
+
+    if alterado:
+        valores = nova_revisao()
+        if delta:
+            valores['volumes_confirmados'] = Romaneio.volumes_confirmados + delta
+        Romaneio.query.filter_by(id=romaneio_id).update(valores, synchronize_session='fetch')
+        registrar_eventos(romaneio_id, [volume_id], novo_status)
+        if delta > 0:
+            somar_resumo(transportadora_do_romaneio(romaneio_id), volumes_confirmados=1)
+        elif novo_status == 'faltante':
+            somar_resumo(transportadora_do_romaneio(romaneio_id), volumes_faltantes=1)
+    return bool(alterado)
+
+def confirmar_volumes(volumes_por_romaneio):
+    """Versão em lote de alterar_status_volume() para confirmação, sem commit.
+
+    Recebe {romaneio_id: [volume_id, ...]} e faz um UPDATE de volumes e um de
+    contador por romaneio. Retorna quantos volumes mudaram de fato de status.
+    """
+    total = 0
+    for romaneio_id, volume_ids in volumes_por_romaneio.items():
+        alterados = Volume.query.filter(
+            Volume.id.in_(volume_ids), or_(Volume.status != 'confirmado', Volume.status.is_(None))
+        ).update({'status': 'confirmado', 'revisao': revisao_seguinte(romaneio_id)},
+                 synchronize_session=False)
+        if alterados:
+            Romaneio.query.filter_by(id=romaneio_id).update(
+                dict(nova_revisao(), volumes_confirmados=Romaneio.volumes_confirmados + alterados),
+                synchronize_session=False
+            )
+            registrar_eventos(romaneio_id, volume_ids, 'confirmado')
+            somar_resumo(transportadora_do_romaneio(romaneio_id), volumes_confirmados=alterados)
+        total += alterados
+    return total
+
+def nova_revisao():
+    """Valores do UPDATE de romaneio que publicam uma nova revisão dos seus volumes."""
+    return {'revisao': Romaneio.revisao + 1, 'alterado_em': func.current_timestamp()}
+
+def revisao_seguinte(romaneio_id):
+    """Subconsulta com a revisão que nova_revisao() vai publicar, para marcar os volumes
+    alterados antes do UPDATE do romaneio (romaneio_id pode ser uma coluna)."""
+    return db.select(Romaneio.revisao + 1).where(Romaneio.id == romaneio_id).scalar_subquery()
+
+def registrar_eventos(romaneio_id, volume_ids, status):
+    """Grava um EventoVolume por volume (ou um do romaneio, com [None]), sem commit.
+
+    Os contadores são copiados do romaneio no mesmo INSERT ... SELECT, já com o
+    valor posterior à mudança.
+    """
+    colunas = ['romaneio_id', 'volume_id', 'status', 'confirmados', 'total']
+    for volume_id in volume_ids:
+        db.session.execute(db.insert(EventoVolume).from_select(colunas, db.select(
+            Romaneio.id, literal(volume_id, db.Integer), literal(status),
+            Romaneio.volumes_confirmados, Romaneio.total_volumes
+        ).where(Romaneio.id == romaneio_id)))
+
+CONTADORES_RESUMO = ('leituras', 'volumes_confirmados', 'volumes_faltantes', 'romaneios_finalizados')
+
+def transportadora_do_romaneio(romaneio_id):
+    return db.select(Romaneio.transportadora_id).where(Romaneio.id == romaneio_id).scalar_subquery()
+
+def somar_resumo(transportadora_id, **contadores):
+    """Soma `contadores` à linha da hora atual em ResumoOperacao (upsert), sem commit.
+
+    A mesma gravação copia o número atual de romaneios pendentes. transportadora_id
+    pode ser o id ou transportadora_do_romaneio(...), para não precisar de uma
+    consulta antes.
+    """
+    agora = datetime.now()
+    pendentes = db.select(Transportadora.romaneios_pendentes).where(
+        Transportadora.id == transportadora_id).scalar_subquery()
+    insercao = sqlite_insert(ResumoOperacao).values(
+        transportadora_id=transportadora_id, dia=agora.date(), hora=agora.hour,
+        romaneios_pendentes=pendentes, **contadores)
+    db.session.execute(insercao.on_conflict_do_update(
+        index_elements=['transportadora_id', 'dia', 'hora'],
+        set_={c: getattr(ResumoOperacao, c) + insercao.excluded[c] for c in contadores}
+            | {'romaneios_pendentes': insercao.excluded.romaneios_pendentes},
+    ))
+
+def reconstruir_resumo():
+    """Refaz os contadores de ResumoOperacao a partir de EventoVolume, a partir do
+    dia do evento mais antigo ainda guardado (os dias anteriores ficam como estão).
+    Leituras não encontradas não geram evento, então nesses dias `leituras` passa
+    a contar só as confirmações. romaneios_pendentes, que não vem de eventos, é
+    mantido. Devolve quantas linhas foram gravadas.
+    """
+    inicio = db.session.query(func.min(func.date(EventoVolume.criado_em, 'localtime'))).scalar()
+    if inicio is None:
+        return 0
+    ResumoOperacao.query.filter(ResumoOperacao.dia >= date.fromisoformat(inicio)) \
+        .update(dict.fromkeys(CONTADORES_RESUMO, 0), synchronize_session=False)
+    local = func.datetime(EventoVolume.criado_em, 'localtime')
+    def quantos(condicao):
+        return func.sum(db.case((condicao, 1), else_=0))
+    confirmados = quantos(and_(EventoVolume.volume_id.isnot(None), EventoVolume.status == 'confirmado'))
+    insercao = sqlite_insert(ResumoOperacao).from_select(
+        ['transportadora_id', 'dia', 'hora'] + list(CONTADORES_RESUMO),
+        db.select(
+            Romaneio.transportadora_id, func.date(local), db.cast(func.strftime('%H', local), db.Integer),
+            confirmados, confirmados,
+            quantos(and_(EventoVolume.volume_id.isnot(None), EventoVolume.status == 'faltante')),
+            quantos(and_(EventoVolume.volume_id.is_(None), EventoVolume.status == 'finalizado')),
+        ).join(Romaneio, Romaneio.id == EventoVolume.romaneio_id)
+        # o WHERE evita a ambiguidade do SQLite entre o ON CONFLICT do upsert e um JOIN
+        .where(true())
+        .group_by(Romaneio.transportadora_id, func.date(local), func.strftime('%H', local))
+    )
+    resultado = db.session.execute(insercao.on_conflict_do_update(
+        index_elements=['transportadora_id', 'dia', 'hora'],
+        set_={c: insercao.excluded[c] for c in CONTADORES_RESUMO},
+    ))
+    db.session.commit()
+    return resultado.rowcount
+
+def reconciliar_contadores(romaneio_ids=None):
+    """Recalcula total_volumes/volumes_confirmados a partir da tabela volume (nova revisão)."""
+    total = db.select(func.count(Volume.id)).where(Volume.romaneio_id == Romaneio.id).scalar_subquery()
+    confirmados = db.select(func.count(Volume.id)).where(
+        Volume.romaneio_id == Romaneio.id, Volume.status == 'confirmado'
+    ).scalar_subquery()
+    atualizacao = db.update(Romaneio).values(total_volumes=total, volumes_confirmados=confirmados,
+                                             **nova_revisao())
+    if romaneio_ids is not None:
+        atualizacao = atualizacao.where(Romaneio.id.in_(romaneio_ids))
+    resultado = db.session.execute(atualizacao)
+    db.session.commit()
+    return resultado.rowcount
+
+# Transportadora.romaneios_pendentes acompanha qualquer caminho que cria, apaga ou
+# muda o status de um romaneio (importação, finalização, carga de dados em massa)
+# por gatilhos no banco, como a busca textual.
+GATILHOS_PENDENTES = (
+    """CREATE TRIGGER pendentes_romaneio_ai AFTER INSERT ON romaneio WHEN new.status = 'pendente' BEGIN
+        UPDATE transportadora SET romaneios_pendentes = romaneios_pendentes + 1 WHERE id = new.transportadora_id;
+    END""",
+    """CREATE TRIGGER pendentes_romaneio_ad AFTER DELETE ON romaneio WHEN old.status = 'pendente' BEGIN
+        UPDATE transportadora SET romaneios_pendentes = romaneios_pendentes - 1 WHERE id = old.transportadora_id;
+    END""",
+    """CREATE TRIGGER pendentes_romaneio_au AFTER UPDATE OF status, transportadora_id ON romaneio BEGIN
+        UPDATE transportadora SET romaneios_pendentes = romaneios_pendentes - 1
+            WHERE id = old.transportadora_id AND old.status = 'pendente';
+        UPDATE transportadora SET romaneios_pendentes = romaneios_pendentes + 1
+            WHERE id = new.transportadora_id AND new.status = 'pendente';
+    END""",
+)
+
+def criar_gatilhos_pendentes():
+    """(Re)cria os gatilhos que mantêm Transportadora.romaneios_pendentes."""
+    with db.engine.begin() as conexao:
+        for (nome,) in conexao.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'pendentes\\_%' ESCAPE '\\'"
+        ).all():
+            conexao.exec_driver_sql(f'DROP TRIGGER {nome}')
+        for ddl in GATILHOS_PENDENTES:
+            conexao.exec_driver_sql(ddl)
+
+def reconciliar_pendentes():
+    """Recalcula Transportadora.romaneios_pendentes contando os romaneios."""
+    pendentes = db.select(func.count(Romaneio.id)).where(
+        Romaneio.transportadora_id == Transportadora.id, Romaneio.status == 'pendente').scalar_subquery()
+    resultado = db.session.execute(db.update(Transportadora).values(romaneios_pendentes=pendentes))
+    db.session.commit()
+    return resultado.rowcount
+
+# --- Arquivo de romaneios finalizados ---
+
+def _copiar_para_arquivo(conexao, origem, destino, condicao):
+    colunas = [c.name for c in origem.columns]
+    conexao.execute(destino.insert().prefix_with('OR REPLACE').from_select(
+        colunas, db.select(*origem.columns).where(condicao)))
+
+def arquivar_romaneios(dias=DIAS_PARA_ARQUIVAR, bloco=ROMANEIOS_POR_BLOCO_ARQUIVO):
+    """Move romaneios finalizados com emissão há mais de `dias` dias, com volumes e
+    itens, para o banco de arquivo. Devolve quantos romaneios foram movidos.
+
+    Cada bloco é copiado numa transação e apagado do banco principal em outra:
+    o commit de dois bancos anexados em WAL não é atômico, e assim uma queda no
+    meio deixa o romaneio nos dois lugares (o menu mostra o do banco principal)
+    em vez de em nenhum. Rodar de novo conclui o que ficou.
+    """
+    limite = date.today() - timedelta(days=dias)
+    romaneio_t, volume_t, item_t = Romaneio.__table__, Volume.__table__, Item.__table__
+    # O SQLite reaproveita o maior id apagado; quem tem o maior id de romaneio,
+    # volume ou item fica no banco principal para nenhum id novo repetir um arquivado.
+    maiores = db.session.query(func.max(Romaneio.id)).union(
+        db.session.query(Volume.romaneio_id).filter(Volume.id == db.select(func.max(Volume.id)).scalar_subquery()),
+        db.session.query(Volume.romaneio_id).join(Item).filter(
+            Item.id == db.select(func.max(Item.id)).scalar_subquery()),
+    )
+    candidatos = db.session.query(Romaneio.id, Romaneio.transportadora_id, Romaneio.data_emissao).filter(
+        Romaneio.status == 'finalizado', Romaneio.data_emissao < limite, Romaneio.id.notin_(maiores)
+    ).order_by(Romaneio.id).all()
+    db.session.remove()
+
+    for inicio in range(0, len(candidatos), bloco):
+        parte = candidatos[inicio:inicio + bloco]
+        ids = [r.id for r in parte]
+        volumes_arquivados = db.select(VolumeArquivado.id).where(VolumeArquivado.romaneio_id.in_(ids))
+        with db.engine.begin() as conexao:
+            _copiar_para_arquivo(conexao, romaneio_t, RomaneioArquivado.__table__, romaneio_t.c.id.in_(ids))
+            _copiar_para_arquivo(conexao, volume_t, VolumeArquivado.__table__, volume_t.c.romaneio_id.in_(ids))
+            _copiar_para_arquivo(conexao, item_t, ItemArquivado.__table__, item_t.c.volume_id.in_(
+                db.select(volume_t.c.id).where(volume_t.c.romaneio_id.in_(ids))))
+        with db.engine.begin() as conexao:
+            conexao.execute(EventoVolume.__table__.delete().where(EventoVolume.romaneio_id.in_(ids)))
+            # volumes antes dos itens: os gatilhos de item não têm mais o que reindexar
+            conexao.execute(volume_t.delete().where(volume_t.c.romaneio_id.in_(ids)))
+            conexao.execute(item_t.delete().where(item_t.c.volume_id.in_(volumes_arquivados)))
+            conexao.execute(romaneio_t.delete().where(romaneio_t.c.id.in_(ids)))
+            if busca_textual_disponivel():
+                # os gatilhos tiraram as linhas da busca; voltam lidas do arquivo
+                lista = ', '.join(map(str, ids))
+                conexao.exec_driver_sql(
+                    f'{_inserir_linha_romaneio(ESQUEMA_ARQUIVO + ".")} WHERE id IN ({lista})')
+                conexao.exec_driver_sql(
+                    f'{_inserir_linha_volume(esquema=ESQUEMA_ARQUIVO + ".")} WHERE v.romaneio_id IN ({lista})')
+            ultimas = {}
+            for r in parte:
+                ultimas[r.transportadora_id] = max(r.data_emissao, ultimas.get(r.transportadora_id, r.data_emissao))
+            for transportadora_id, ultima in ultimas.items():
+                conexao.execute(db.update(Transportadora).where(
+                    Transportadora.id == transportadora_id,
+                    or_(Transportadora.arquivado_ate.is_(None), Transportadora.arquivado_ate < ultima)
+                ).values(arquivado_ate=ultima))
+    return len(candidatos)
+
+def limite_do_arquivo(transportadora_id, data_inicio):
+    """Data de emissão mais nova arquivada da transportadora, se o período que
+    começa em `data_inicio` (None: desde sempre) chegar até ela; senão None.
+
+    Também None se o banco de arquivo anexado não tiver as tabelas (arquivo
+    apagado ou não copiado junto com o principal): as consultas a ele falhariam.
+    """
+    arquivado_ate = db.session.query(Transportadora.arquivado_ate).filter_by(id=transportadora_id).scalar()
+    if arquivado_ate is None or (data_inicio is not None and data_inicio > arquivado_ate):
+        return None
+    if not arquivo_anexado(db.session.connection()):
+        app.logger.warning('Transportadora %s tem romaneios arquivados, mas o banco de arquivo está vazio',
+                           transportadora_id)
+        return None
+    return arquivado_ate
+
+def juntar_com_arquivo(linhas, arquivadas, chave, romaneio_de=lambda linha: linha):
+    """Junta resultados do banco principal e do arquivo na ordem decrescente de
+    `chave`; um romaneio nos dois (arquivamento interrompido) vale o do principal."""
+    ids = {romaneio_de(linha).id for linha in linhas}
+    return sorted(linhas + [a for a in arquivadas if romaneio_de(a).id not in ids], key=chave, reverse=True)
+
+# --- Índice de leitura em memória ---
+
+class IndiceLeitura:
+    """Volumes pendentes dos romaneios abertos de uma transportadora, por worker.
+
+    Uma entrada velha não confirma nada errado: o UPDATE de
+    alterar_status_volume() é condicional ao status.
+    """
+
+    def __init__(self, transportadora_id, versao):
+        self.transportadora_id = transportadora_id
+        self.versao = versao
+        self.verificado_em = time.monotonic()
+        self.volumes = {}      # volume_id -> (romaneio_id, tipo_caixa, matricula)
+        self.por_chave = {}    # chave_de_acesso -> [volume_id, ...]
+        self.por_pre_nota = {} # pre_nota do romaneio -> [volume_id, ...]
+
+    def carregar(self):
+        pendentes = db.session.query(
+            Volume.id, Volume.romaneio_id, Volume.tipo_caixa, Volume.matricula,
+            Volume.chave_de_acesso, Romaneio.pre_nota
+        ).join(Romaneio).filter(
+            Romaneio.transportadora_id == self.transportadora_id,
+            Romaneio.status == 'pendente',
+            or_(Volume.status != 'confirmado', Volume.status.is_(None))
+        ).order_by(Volume.id)
+        for v in pendentes:
+            self.volumes[v.id] = (v.romaneio_id, v.tipo_caixa, v.matricula)
+            if v.chave_de_acesso:
+                self.por_chave.setdefault(v.chave_de_acesso, []).append(v.id)
+            self.por_pre_nota.setdefault(v.pre_nota, []).append(v.id)
+        return self
+
+    def candidatos(self, chave, pre_nota):
+        """(volume_id, (romaneio_id, tipo_caixa, matricula)) pendentes para a leitura,
+        primeiro pela chave e depois pela pré-nota. Chamar com _trava_indices: outra
+        requisição pode descartar os mesmos volumes ao mesmo tempo."""
+        ids = list(self.por_chave.get(chave, ()))
+        if pre_nota:
+            ids += self.por_pre_nota.get(pre_nota, ())
+        return [(i, self.volumes[i]) for i in ids if i in self.volumes]
+
+    def descartar(self, volume_ids):
+        for volume_id in volume_ids:
+            self.volumes.pop(volume_id, None)
+
+    def remover_romaneio(self, romaneio_id):
+        self.descartar([i for i, v in self.volumes.items() if v[0] == romaneio_id])
+
+_indices_leitura = {}
+_trava_indices = threading.Lock()
+
+def indice_leitura(transportadora_id):
+    """Índice da transportadora neste worker, carregado na primeira leitura.
+
+    A versão em Transportadora.versao_leitura é conferida no máximo a cada
+    INTERVALO_VERSAO_INDICE segundos; se outro worker a incrementou, o índice
+    é recarregado.
+    """
+    with _trava_indices:
+        indice = _indices_leitura.get(transportadora_id)
+        agora = time.monotonic()
+        if indice and agora - indice.verificado_em < INTERVALO_VERSAO_INDICE:
+            return indice
+        versao = db.session.query(Transportadora.versao_leitura).filter_by(id=transportadora_id).scalar()
+        if indice and indice.versao == versao:
+            indice.verificado_em = agora
+            return indice
+        indice = IndiceLeitura(transportadora_id, versao).carregar()
+        _indices_leitura[transportadora_id] = indice
+        return indice
+
+def invalidar_indice_leitura(transportadora_id):
+    """Descarta o índice local e avisa os outros workers, sem commit."""
+    Transportadora.query.filter_by(id=transportadora_id).update(
+        {'versao_leitura': Transportadora.versao_leitura + 1}, synchronize_session=False
+    )
+    with _trava_indices:
+        _indices_leitura.pop(transportadora_id, None)
+
+def descartar_do_indice_leitura(transportadora_id, volume_ids):
+    indice = _indices_leitura.get(transportadora_id)
+    if indice:
+        with _trava_indices:
+            indice.descartar(volume_ids)
+
+class LeiturasRecentes:
+    """Últimas leituras confirmadas de cada sessão, para absorver repetições.
+
+    O leitor da câmera decodifica a mesma etiqueta várias vezes por segundo
+    enquanto ela está na frente dele. Uma leitura repetida pela mesma sessão
+    dentro de `janela` segundos da anterior é respondida daqui, sem consultar
+    o banco; cada repetição renova a janela. O cache é por worker: a repetição
+    que cair em outro worker só faz o caminho normal e recebe o 404 de antes.
+    """
+
+    def __init__(self, janela, max_itens):
+        self.janela = janela
+        self.max_itens = max_itens
+        self._leituras = OrderedDict()  # (sessão, qr) -> [visto_em, volume]
+        self._trava = threading.Lock()
+
+    def repetida(self, sessao, qr_code):
+        """Volume confirmado pela leitura anterior, se esta for uma repetição; senão None."""
+        agora = time.monotonic()
+        with self._trava:
+            leitura = self._leituras.get((sessao, qr_code))
+            if not leitura or agora - leitura[0] > self.janela:
+                return None
+            leitura[0] = agora
+            self._leituras.move_to_end((sessao, qr_code))
+            return leitura[1]
+
+    def lembrar(self, sessao, qr_code, volume):
+        with self._trava:
+            self._leituras[(sessao, qr_code)] = [time.monotonic(), volume]
+            self._leituras.move_to_end((sessao, qr_code))
+            while len(self._leituras) > self.max_itens:
+                self._leituras.popitem(last=False)
+
+leituras_recentes = LeiturasRecentes(JANELA_LEITURA_REPETIDA, MAXIMO_LEITURAS_RECENTES)
+
+# --- Gravação das leituras (commit direto ou em grupo) ---
+
+class GravadorAgrupado:
+    """Aplica as gravações das requisições numa thread só, em commits agrupados.
+
+    A requisição só recebe o resultado depois do commit do grupo. Se uma
+    função falhar, o grupo é refeito uma a uma para o erro voltar só a ela.
+    """
+
+    def __init__(self, tamanho_grupo, intervalo, espera=ESPERA_GRAVACAO):
+        self.tamanho_grupo = tamanho_grupo
+        self.intervalo = intervalo
+        self.espera = espera
+        self.fila = queue.Queue()
+        self._trava = threading.Lock()
+        self._pid = None
+        self._thread = None
+
+    def executar(self, funcao):
+        self._garantir_thread()
+        futuro = Future()
+        self.fila.put((funcao, futuro))
+        try:
+            return futuro.result(timeout=self.espera)
+        except FuturesTimeoutError:
+            if futuro.cancel():
+                registro_metricas.incrementar('romaneio_gravacoes_expiradas_total')
+                raise GravacaoIndisponivel(f'gravação não começou em {self.espera}s') from None
+            return futuro.result()
+
+    def _garantir_thread(self):
+        # a thread não sobrevive ao fork do gunicorn: cada worker inicia a sua; e é
+        # refeita se tiver morrido, para a fila não ficar sem ninguém que a esvazie
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._trava:
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._laco, name='gravador-agrupado', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _proximo_grupo(self):
+        grupo = [self.fila.get()]
+        # Pega o que já está na fila; só espera o intervalo por mais se houver
+        # concorrência, para uma leitura isolada não pagar a espera.
+        while len(grupo) < self.tamanho_grupo and not self.fila.empty():
+            grupo.append(self.fila.get_nowait())
+        prazo = time.monotonic() + self.intervalo
+        while 1 < len(grupo) < self.tamanho_grupo:
+            restante = prazo - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                grupo.append(self.fila.get(timeout=restante))
+            except queue.Empty:
+                break
+        return grupo
+
+    def _laco(self):
+        while True:
+            # as que expiraram na fila (canceladas) não rodam; as demais passam a
+            # "em execução" e não podem mais ser canceladas
+            grupo = [(f, futuro) for f, futuro in self._proximo_grupo() if futuro.set_running_or_notify_cancel()]
+            if not grupo:
+                continue
+            with app.app_context():
+                try:
+                    resultados = [funcao() for funcao, _ in grupo]
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    for funcao, futuro in grupo:
+                        self._executar_sozinha(funcao, futuro)
+                else:
+                    for (_, futuro), resultado in zip(grupo, resultados):
+                        futuro.set_result(resultado)
+                registro_metricas.incrementar('romaneio_grupos_commit_total')
+                registro_metricas.incrementar('romaneio_gravacoes_agrupadas_total', len(grupo))
+
+    @staticmethod
+    def _executar_sozinha(funcao, futuro):
+        try:
+            resultado = funcao()
+            db.session.commit()
+        except Exception as erro:
+            db.session.rollback()
+            futuro.set_exception(erro)
+        else:
+            futuro.set_result(resultado)
+
+class GravacaoIndisponivel(Exception):
+    """A gravação ficou na fila do GravadorAgrupado além de ESPERA_GRAVACAO e foi descartada."""
+
+@app.errorhandler(GravacaoIndisponivel)
+def gravacao_indisponivel(erro):
+    # nada foi gravado: o cliente pode repetir a requisição
+    return jsonify({'erro': 'Banco ocupado, tente de novo'}), 503, {'Retry-After': '1'}
+
+gravador_agrupado = GravadorAgrupado(TAMANHO_GRUPO_COMMIT, INTERVALO_GRUPO_COMMIT)
+
+def gravar(funcao):
+    """Executa `funcao` (que grava sem commit) e devolve o resultado já commitado.
+
+    Com GRAVACAO_AGRUPADA=1 a função roda na thread do GravadorAgrupado, junto
+    com as das outras requisições; sem, roda aqui com commit próprio. Ela deve
+    trabalhar com ids e não com objetos carregados pela sessão da requisição.
+    """
+    if GRAVACAO_AGRUPADA:
+        return gravador_agrupado.executar(funcao)
+    resultado = funcao()
+    db.session.commit()
+    return resultado
+
+# --- Respostas condicionais e compressão ---
+
+def resposta_condicional(romaneio, montar):
+    """JSON de `montar()` com ETag/Last-Modified da revisão do romaneio.
+
+    Se o cliente já tem a revisão atual (If-None-Match/If-Modified-Since),
+    responde 304 sem chamar `montar`, ou seja, sem ler nenhum volume. O ETag é
+    fraco porque o corpo pode ir com ou sem gzip.
+    """
+    etag = f'{romaneio.id}-{romaneio.revisao}'
+    if is_resource_modified(request.environ, etag=etag, last_modified=romaneio.alterado_em):
+        resposta = jsonify(montar())
+    else:
+        resposta = app.response_class(status=304)
+    resposta.set_etag(etag, weak=True)
+    if romaneio.alterado_em:
+        resposta.last_modified = romaneio.alterado_em
+    resposta.headers['Cache-Control'] = 'private, no-cache'  # sempre revalida, mas guarda a cópia
+    return resposta
+
+@app.after_request
+def _comprimir_resposta(resposta):
+    """gzip nas respostas JSON e HTML grandes, se o cliente aceitar."""
+    if (resposta.mimetype not in TIPOS_COMPRIMIDOS or resposta.is_streamed or resposta.direct_passthrough
+            or resposta.status_code != 200 or 'Content-Encoding' in resposta.headers):
+        return resposta
+    resposta.vary.add('Accept-Encoding')
+    corpo = resposta.get_data()
+    if len(corpo) < TAMANHO_MINIMO_GZIP or 'gzip' not in request.accept_encodings:
+        return resposta
+    resposta.set_data(gzip.compress(corpo, compresslevel=6))
+    resposta.headers['Content-Encoding'] = 'gzip'
+    return resposta
+
+# --- Arquivos estáticos e service worker ---
+
+_manifesto_estaticos = None
+_trava_estaticos = threading.Lock()
+
+def manifesto_estaticos():
+    """{caminho em static/: caminho em static/dist/}, compilado no primeiro uso (a cada uso com debug)."""
+    global _manifesto_estaticos
+    with _trava_estaticos:
+        if _manifesto_estaticos is None or app.debug:
+            _manifesto_estaticos = estaticos.compilar(app.static_folder)
+        return _manifesto_estaticos
+
+def url_estatico(nome):
+    """URL versionada de um arquivo de static/; se ele não existir, a URL comum."""
+    versionado = manifesto_estaticos().get(nome)
+    if versionado is None:
+        return url_for('static', filename=nome)
+    return url_for('estatico_compilado', nome=versionado)
+
+app.jinja_env.globals.update(url_estatico=url_estatico)
+
+@app.route('/static/dist/<path:nome>')
+def estatico_compilado(nome):
+    """Arquivo versionado, com cache imutável e a versão pré-comprimida que o cliente aceitar."""
+    pasta = os.path.join(app.static_folder, estaticos.PASTA_COMPILADOS)
+    for codificacao, extensao in (('br', '.br'), ('gzip', '.gz')):
+        comprimido = safe_join(pasta, nome + extensao)
+        if codificacao in request.accept_encodings and comprimido and os.path.isfile(comprimido):
+            resposta = send_from_directory(pasta, nome + extensao, mimetype=mimetypes.guess_type(nome)[0],
+                                           max_age=CACHE_ESTATICOS_SEGUNDOS)
+            resposta.headers['Content-Encoding'] = codificacao
+            break
+    else:
+        resposta = send_from_directory(pasta, nome, max_age=CACHE_ESTATICOS_SEGUNDOS)
+    resposta.vary.add('Accept-Encoding')
+    resposta.cache_control.public = True
+    resposta.cache_control.immutable = True
+    return resposta
+
+@app.route('/sw.js')
+def service_worker():
+    """Service worker da conferência offline; servido da raiz para valer para o site inteiro."""
+    arquivos = [url_estatico(nome) for nome in manifesto_estaticos()]
+    versao = hashlib.sha256('\n'.join(arquivos).encode('utf-8')).hexdigest()[:10]
+    resposta = app.response_class(render_template('sw.js', arquivos=arquivos, versao=versao),
+                                  mimetype='text/javascript')
+    resposta.headers['Cache-Control'] = 'no-cache'  # o navegador confere a cada navegação
+    return resposta
+
 # --- Rotas ---
 
 @app.route('/', methods=['GET', 'POST'])
@@ -95,20 +1314,12 @@ def menu():
         return redirect(url_for('login'))
     transportadora_id = session['transportadora_id']
 
-    pre_nota_filter = request.args.get('pre_nota')
+    # 'pre_nota' é o nome antigo do campo de busca
+    busca = (request.args.get('busca') or request.args.get('pre_nota') or '').strip()
     status_filter = request.args.get('status')
     data_inicio = request.args.get('data_inicio')
     data_fim = request.args.get('data_fim')
 
-    # Query base filtrando pela transportadora
-    romaneios = Romaneio.query.filter_by(transportadora_id=transportadora_id)
-
-    if pre_nota_filter:
-        romaneios = romaneios.filter(Romaneio.pre_nota.like(f'%{pre_nota_filter}%'))
-
-    if status_filter:
-        romaneios = romaneios.filter_by(status=status_filter)
-
     # Filtrar por data de emissão entre data_inicio e data_fim, convertendo string para date
     # Assumindo que data_emissao está no formato 'YYYY-MM-DD'
     def str_to_date(s):
@@ -120,24 +1331,99 @@ def menu():
     di = str_to_date(data_inicio) if data_inicio else None
     df = str_to_date(data_fim) if data_fim else None
 
-    # Para usar filtros com SQLAlchemy, converta a coluna para Date:
-    from sqlalchemy import cast, Date
-
-    if di:
-        romaneios = romaneios.filter(cast(Romaneio.data_emissao, Date) >= di)
-    if df:
-        romaneios = romaneios.filter(cast(Romaneio.data_emissao, Date) <= df)
-
-    romaneios = romaneios.all()
-
-    # calcula progresso por romaneio
-    progresso = {}
-    for r in romaneios:
-        total = len(r.volumes)
-        confirmados = sum(1 for v in r.volumes if v.status == 'confirmado')
-        progresso[r.id] = int(confirmados / total * 100) if total > 0 else 0
+    try:
+        por_pagina = min(max(int(request.args.get('por_pagina', POR_PAGINA_MENU)), 1), 200)
+    except ValueError:
+        por_pagina = POR_PAGINA_MENU
+
+    if busca:
+        # resultado da busca vem por relevância, paginado por número de página
+        pagina = max(request.args.get('pagina', 1, type=int), 1)
+        romaneios = buscar_romaneios(transportadora_id, busca, status_filter, di, df,
+                                     (pagina - 1) * por_pagina, por_pagina + 1)
+        proxima_pagina = pagina + 1 if len(romaneios) > por_pagina else None
+        return _renderizar_menu(romaneios[:por_pagina], proxima_pagina=proxima_pagina)
+
+    # Paginação por cursor (keyset) em (data_emissao, id), do mais recente ao mais antigo
+    cursor = None
+    if request.args.get('apos'):
+        try:
+            cursor_data, cursor_id = request.args['apos'].split('_')
+            cursor = (datetime.strptime(cursor_data, '%Y-%m-%d').date(), int(cursor_id))
+        except ValueError:
+            pass
+
+    def pagina_de(modelo):
+        # Query base filtrando pela transportadora, status e período
+        romaneios = consulta_romaneios_menu(transportadora_id, status_filter, di, df, modelo)
+        if cursor:
+            romaneios = romaneios.filter(or_(
+                modelo.data_emissao < cursor[0],
+                and_(modelo.data_emissao == cursor[0], modelo.id < cursor[1])
+            ))
+        return romaneios.order_by(modelo.data_emissao.desc(), modelo.id.desc()) \
+            .limit(por_pagina + 1).all()
+
+    romaneios = pagina_de(Romaneio)
+    # O arquivo só entra se o período pedido chega nele e a página ainda pode ter
+    # romaneios dele: com a página cheia de romaneios mais novos que o arquivo, não.
+    arquivado_ate = limite_do_arquivo(transportadora_id, di)
+    if arquivado_ate and (len(romaneios) <= por_pagina or romaneios[-1].data_emissao <= arquivado_ate):
+        romaneios = juntar_com_arquivo(romaneios, pagina_de(RomaneioArquivado),
+                                       chave=lambda r: (r.data_emissao, r.id))[:por_pagina + 1]
+
+    proximo_cursor = None
+    if len(romaneios) > por_pagina:
+        romaneios = romaneios[:por_pagina]
+        ultimo = romaneios[-1]
+        proximo_cursor = f'{ultimo.data_emissao.isoformat()}_{ultimo.id}'
+
+    return _renderizar_menu(romaneios, proximo_cursor=proximo_cursor)
+
+def porcentagem_conferida(romaneio):
+    # progresso vem dos contadores do próprio romaneio, sem consultar os volumes
+    total = romaneio.total_volumes
+    return int(romaneio.volumes_confirmados / total * 100) if total > 0 else 0
+
+def _renderizar_menu(romaneios, proximo_cursor=None, proxima_pagina=None):
+    progresso = {r.id: porcentagem_conferida(r) for r in romaneios}
+    return render_template('menu.html', romaneios=romaneios, progresso=progresso,
+                           proximo_cursor=proximo_cursor, proxima_pagina=proxima_pagina)
+
+@app.route('/api/busca')
+def api_busca():
+    """Busca romaneios por pré-nota, nota, cliente, produto ou descrição de item.
+
+    ?q= é obrigatório; status, data_inicio e data_fim (AAAA-MM-DD) filtram como
+    no menu. Resultado por relevância, paginado com ?pagina= e ?por_pagina=.
+    """
+    if 'user_id' not in session:
+        return jsonify({'erro': 'Não autenticado'}), 401
+    termo = request.args.get('q', '').strip()
+    if not termo:
+        return jsonify({'erro': 'Informe o texto da busca em ?q='}), 400
+    pagina = max(request.args.get('pagina', 1, type=int), 1)
+    por_pagina = min(max(request.args.get('por_pagina', POR_PAGINA_MENU, type=int), 1), 200)
+
+    romaneios = buscar_romaneios(
+        session['transportadora_id'], termo, request.args.get('status'),
+        request.args.get('data_inicio', type=date.fromisoformat),
+        request.args.get('data_fim', type=date.fromisoformat),
+        (pagina - 1) * por_pagina, por_pagina + 1,
+    )
 
-    return render_template('menu.html', romaneios=romaneios, progresso=progresso)
+    return jsonify({
+        'romaneios': [{
+            'id': r.id,
+            'pre_nota': r.pre_nota,
+            'num_nota': r.num_nota,
+            'data_emissao': r.data_emissao.isoformat(),
+            'status': r.status,
+            'progresso': porcentagem_conferida(r),
+        } for r in romaneios[:por_pagina]],
+        'pagina': pagina,
+        'proxima_pagina': pagina + 1 if len(romaneios) > por_pagina else None,
+    })
 
 
 @app.route('/romaneio/<int:id>')
@@ -147,21 +1433,112 @@ def romaneio(id):
     rom = Romaneio.query.get_or_404(id)
     if rom.transportadora_id != session['transportadora_id']:
         return "Acesso negado", 403
-    return render_template('romaneio.html', romaneio=rom)
+    # a página acompanha /eventos a partir do último evento já refletido no que ela carrega
+    ultimo_evento = db.session.query(func.max(EventoVolume.id)).filter_by(romaneio_id=id).scalar() or 0
+    return render_template('romaneio.html', romaneio=rom, ultimo_evento=ultimo_evento)
+
+vagas_eventos = threading.BoundedSemaphore(STREAMS_EVENTOS_POR_WORKER)
+
+@app.route('/eventos/<int:romaneio_id>')
+def eventos_conferencia(romaneio_id):
+    """Stream SSE com as mudanças de status dos volumes e do romaneio.
+
+    Retoma a partir do cabeçalho Last-Event-ID (reconexão do EventSource) ou
+    do parâmetro ?desde=. O stream prende uma thread do worker enquanto está
+    aberto, então há no máximo STREAMS_EVENTOS_POR_WORKER por worker; além
+    disso a resposta é 503, que o EventSource não tenta de novo, e a página
+    cai para consultas periódicas. Fecha após DURACAO_MAXIMA_EVENTOS; o
+    navegador reconecta sozinho.
+    """
+    if 'user_id' not in session:
+        return jsonify({'erro': 'Não autenticado'}), 401
+    romaneio = Romaneio.query.get_or_404(romaneio_id)
+    if romaneio.transportadora_id != session['transportadora_id']:
+        return jsonify({'erro': 'Acesso negado'}), 403
+
+    try:
+        desde = int(request.headers.get('Last-Event-ID') or request.args.get('desde') or 0)
+    except ValueError:
+        desde = 0
+    db.session.remove()
+    if not vagas_eventos.acquire(blocking=False):
+        registro_metricas.incrementar('romaneio_eventos_recusados_total')
+        return jsonify({'erro': 'Limite de streams atingido'}), 503
+
+    def gerar():
+        ultimo = desde
+        inicio = ultimo_envio = time.monotonic()
+        yield 'retry: 3000\n\n'
+        while time.monotonic() - inicio < DURACAO_MAXIMA_EVENTOS:
+            eventos = EventoVolume.query.filter(
+                EventoVolume.romaneio_id == romaneio_id, EventoVolume.id > ultimo
+            ).order_by(EventoVolume.id).limit(500).all()
+            db.session.remove()  # não segura conexão nem leitura aberta entre as consultas
+            for e in eventos:
+                dados = {'volume_id': e.volume_id, 'status': e.status,
+                         'confirmados': e.confirmados, 'total': e.total}
+                tipo = 'volume' if e.volume_id is not None else 'romaneio'
+                yield f'id: {e.id}\nevent: {tipo}\ndata: {json.dumps(dados)}\n\n'
+                ultimo = e.id
+            if eventos:
+                ultimo_envio = time.monotonic()
+            elif time.monotonic() - ultimo_envio > 15:
+                yield ': ping\n\n'
+                ultimo_envio = time.monotonic()
+            time.sleep(INTERVALO_EVENTOS)
+
+    resposta = Response(stream_with_context(gerar()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # chamado quando o servidor fecha a resposta, inclusive se o cliente caiu
+    resposta.call_on_close(vagas_eventos.release)
+    return resposta
 
 @app.route('/api/volumes/<int:romaneio_id>')
 def api_volumes(romaneio_id):
-    volumes = Volume.query.filter_by(romaneio_id=romaneio_id).all()
-    lista = []
-    for v in volumes:
-        lista.append({
-            'id': v.id,
-            'tipo_caixa': v.tipo_caixa,
-            'matricula': v.matricula,
-            'quantidade': v.quantidade,
-            'status': v.status
-        })
-    return jsonify(lista)
+    """Volumes do romaneio.
+
+    Sem parâmetros devolve a lista completa. Com ?since=<revisão> devolve
+    {'revisao', 'completo', 'volumes'} só com os volumes alterados depois dessa
+    revisão; since=0 (ou uma revisão que o servidor não conhece) traz todos,
+    com completo=true para o cliente refazer a tabela.
+
+    Com ?itens=1 a carga completa traz em cada volume a lista 'itens', lida
+    numa única consulta para o romaneio todo (selectinload), e a página não
+    precisa chamar /api/itens/<volume_id> por volume. Os deltas não repetem os
+    itens: eles não mudam com o status do volume.
+    """
+    romaneio = db.session.get(Romaneio, romaneio_id)
+    if not romaneio:
+        return jsonify({'erro': 'Romaneio não encontrado'}), 404
+    if romaneio.transportadora_id != session.get('transportadora_id'):
+        return jsonify({'erro': 'Acesso negado'}), 403
+    since = request.args.get('since', type=int)
+    com_itens = request.args.get('itens', type=int) == 1
+
+    def montar():
+        volumes = Volume.query.filter_by(romaneio_id=romaneio_id)
+        completo = not since or since > romaneio.revisao
+        if not completo:
+            volumes = volumes.filter(Volume.revisao > since)
+        elif com_itens:
+            volumes = volumes.options(selectinload(Volume.itens))
+        lista = []
+        for v in volumes:
+            dados = {
+                'id': v.id,
+                'tipo_caixa': v.tipo_caixa,
+                'matricula': v.matricula,
+                'quantidade': v.quantidade,
+                'status': v.status
+            }
+            if completo and com_itens:
+                dados['itens'] = [{'descricao': i.descricao} for i in v.itens]
+            lista.append(dados)
+        if since is None:
+            return lista
+        # a revisão foi lida antes dos volumes: o que mudar no meio volta no próximo delta
+        return {'revisao': romaneio.revisao, 'completo': completo, 'volumes': lista}
+    return resposta_condicional(romaneio, montar)
 
 @app.route('/api/itens/<int:volume_id>')
 def api_itens(volume_id):
@@ -174,19 +1551,59 @@ def confirmar_volume():
     data = request.json
     vol_id = data.get('volume_id')
     status = data.get('status')  # 'confirmado' ou 'faltante'
+    if status not in STATUS_VOLUME:
+        # o status alimenta contadores, revisão, eventos e resumo: só os conhecidos entram
+        return jsonify({'sucesso': False, 'erro': 'Status inválido'}), 400
     volume = Volume.query.get(vol_id)
     if volume and volume.romaneio.transportadora_id == session['transportadora_id']:
-        volume.status = status
-        db.session.commit()
+        volume_id, romaneio_id = volume.id, volume.romaneio_id
+        transportadora_id = volume.romaneio.transportadora_id
+
+        def aplicar():
+            estava_confirmado = db.session.get(Volume, volume_id).status == 'confirmado'
+            alterar_status_volume(volume_id, romaneio_id, status)
+            if estava_confirmado and status != 'confirmado':
+                # volume voltou a ficar pendente: os índices de leitura precisam recarregar
+                invalidar_indice_leitura(transportadora_id)
+        gravar(aplicar)
         return jsonify({'sucesso': True})
     return jsonify({'sucesso': False}), 403
 
 @app.route('/api/progresso/<int:romaneio_id>')
 def api_progresso(romaneio_id):
-    volumes = Volume.query.filter_by(romaneio_id=romaneio_id).all()
-    total = len(volumes)
-    confirmados = sum(1 for v in volumes if v.status == 'confirmado')
-    return jsonify({'total': total, 'confirmados': confirmados})
+    romaneio = db.session.get(Romaneio, romaneio_id)
+    if not romaneio:
+        return jsonify({'total': 0, 'confirmados': 0})
+    return jsonify({'total': romaneio.total_volumes, 'confirmados': romaneio.volumes_confirmados})
+
+def conferir_qr(qr_code, transportadora_id):
+    """Confirma o volume pendente lido no QR, sem commit.
+
+    Devolve {'volume_id', 'tipo_caixa', 'matricula'} ou None se não houver
+    volume pendente para a leitura.
+    """
+    pre_nota = pre_nota_do_qr(qr_code)
+
+    # Caminho rápido: índice em memória dos romaneios abertos + um UPDATE condicional
+    indice = indice_leitura(transportadora_id)
+    with _trava_indices:
+        candidatos = indice.candidatos(qr_code, pre_nota)
+    for volume_id, (romaneio_id, tipo_caixa, matricula) in candidatos:
+        confirmado = alterar_status_volume(volume_id, romaneio_id, 'confirmado')
+        descartar_do_indice_leitura(transportadora_id, [volume_id])
+        if confirmado:
+            return {'volume_id': volume_id, 'tipo_caixa': tipo_caixa, 'matricula': matricula}
+
+    # Busca primeiro pelo chave_de_acesso
+    volume = consulta_volume_por_chave(qr_code, transportadora_id).first()
+
+    # Se não encontrar, busca pelo pre_nota
+    if not volume and pre_nota:
+        volume = consulta_volume_por_pre_nota(pre_nota, transportadora_id).first()
+
+    if not volume or not alterar_status_volume(volume.id, volume.romaneio_id, 'confirmado'):
+        return None
+    return {'volume_id': volume.id, 'tipo_caixa': volume.tipo_caixa, 'matricula': volume.matricula}
 
 @app.route('/validar_volume', methods=['POST'])
 def validar_volume():
@@ -199,37 +1616,137 @@ def validar_volume():
     if not qr_code:
         return jsonify({'erro': 'QR code inválido'}), 400
 
-    pre_nota = None
-    if len(qr_code) >= 18:
-        pre_nota = qr_code[11:18]  # Ajuste conforme estrutura real do QR
+    transportadora_id = session['transportadora_id']
 
-    # Busca primeiro pelo chave_de_acesso
-    volume = Volume.query.join(Romaneio).filter(
-        Volume.chave_de_acesso == qr_code,
-        Volume.status != 'confirmado',
-        Romaneio.transportadora_id == session['transportadora_id']
-    ).first()
+    # a mesma etiqueta lida de novo logo depois de confirmada: responde sem ir ao banco
+    sessao = session.setdefault('sessao_leitura', secrets.token_hex(8))
+    volume = leituras_recentes.repetida(sessao, qr_code)
+    if volume:
+        registro_metricas.incrementar('romaneio_leituras_repetidas_total')
+        return jsonify(dict(volume, resultado='ja_conferido', mensagem='Volume já conferido'))
 
-    # Se não encontrar, busca pelo pre_nota
-    if not volume and pre_nota:
-        volume = Volume.query.join(Romaneio).filter(
-            Romaneio.pre_nota == pre_nota,
-            Volume.status != 'confirmado',
-            Romaneio.transportadora_id == session['transportadora_id']
-        ).first()
+    def conferir():
+        # a leitura é contada depois da busca, no mesmo commit da confirmação
+        volume = conferir_qr(qr_code, transportadora_id)
+        somar_resumo(transportadora_id, leituras=1)
+        return volume
+    volume = gravar(conferir)
 
     if not volume:
+        registro_metricas.incrementar('romaneio_leituras_total', resultado='nao_encontrado')
         return jsonify({'erro': 'Volume não encontrado ou já conferido'}), 404
 
-    volume.status = 'confirmado'
-    db.session.commit()
+    leituras_recentes.lembrar(sessao, qr_code, volume)
+    registro_metricas.incrementar('romaneio_leituras_total', resultado='confirmado')
+    return jsonify(dict(volume, resultado='confirmado', mensagem='Volume conferido com sucesso'))
 
-    return jsonify({
-        'mensagem': 'Volume conferido com sucesso',
-        'volume_id': volume.id,
-        'tipo_caixa': volume.tipo_caixa,
-        'matricula': volume.matricula
-    })
+
+@app.route('/validar_volume/lote', methods=['POST'])
+def validar_volume_lote():
+    """Confirma várias leituras de QR numa única transação.
+
+    Recebe {"chaves": [...]} na ordem em que foram lidas e devolve um resultado
+    por chave: 'confirmado', 'ja_conferido' ou 'nao_encontrado'. Cada ocorrência
+    de uma chave consome um volume pendente; a página já descarta as repetições
+    da câmera antes de enfileirar. Como em /validar_volume, a chave que esta
+    sessão confirmou há menos de JANELA_LEITURA_REPETIDA segundos volta como
+    'ja_conferido' sem ir ao banco: um lote reenviado porque a resposta se
+    perdeu não consome outros volumes pela pré-nota.
+    """
+    if 'user_id' not in session:
+        return jsonify({'erro': 'Não autenticado'}), 401
+
+    dados = request.get_json(silent=True) or {}
+    chaves = [c for c in dados.get('chaves') or [] if isinstance(c, str) and c]
+    if not chaves:
+        return jsonify({'erro': 'Nenhuma chave informada'}), 400
+    if len(chaves) > TAMANHO_MAXIMO_LOTE:
+        return jsonify({'erro': f'Máximo de {TAMANHO_MAXIMO_LOTE} chaves por lote'}), 400
+
+    transportadora_id = session['transportadora_id']
+    sessao = session.setdefault('sessao_leitura', secrets.token_hex(8))
+    repetidas = {}
+    for chave in set(chaves):
+        volume = leituras_recentes.repetida(sessao, chave)
+        if volume:
+            repetidas[chave] = volume
+    if repetidas:
+        registro_metricas.incrementar('romaneio_leituras_repetidas_total',
+                                      sum(1 for c in chaves if c in repetidas))
+    novas = [c for c in chaves if c not in repetidas]
+    # consulta e confirmação numa gravação só, como a leitura individual: com
+    # GRAVACAO_AGRUPADA=1 vai para o gravador, junto com as outras requisições
+    def conferir_lote():
+        pre_notas = {p for p in map(pre_nota_do_qr, novas) if p}
+
+        # Duas consultas para o lote inteiro: por chave de acesso e pela pré-nota
+        colunas = (Volume.id, Volume.romaneio_id, Volume.status, Volume.tipo_caixa,
+                   Volume.matricula, Volume.chave_de_acesso, Romaneio.pre_nota)
+        por_chave, por_pre_nota = {}, {}
+        ja_conferidas = set()
+        for v in db.session.query(*colunas).join(Romaneio).filter(
+            Volume.chave_de_acesso.in_(set(novas)),
+            Romaneio.transportadora_id == transportadora_id
+        ).order_by(Volume.id):
+            if v.status == 'confirmado':
+                ja_conferidas.add(v.chave_de_acesso)
+            else:
+                por_chave.setdefault(v.chave_de_acesso, []).append(v)
+        if pre_notas:
+            for v in db.session.query(*colunas).join(Romaneio).filter(
+                Romaneio.pre_nota.in_(pre_notas),
+                Romaneio.transportadora_id == transportadora_id
+            ).order_by(Volume.id):
+                if v.status == 'confirmado':
+                    ja_conferidas.add(v.pre_nota)
+                else:
+                    por_pre_nota.setdefault(v.pre_nota, []).append(v)
+
+        usados = set()
+        def proximo_pendente(candidatos):
+            while candidatos:
+                v = candidatos.pop(0)
+                if v.id not in usados:
+                    return v
+            return None
+
+        resultados = []
+        confirmar = {}
+        for chave in chaves:
+            if chave in repetidas:
+                resultados.append(dict(repetidas[chave], chave=chave, resultado='ja_conferido'))
+                continue
+            pre_nota = pre_nota_do_qr(chave)
+            volume = proximo_pendente(por_chave.get(chave, [])) or \
+                (proximo_pendente(por_pre_nota.get(pre_nota, [])) if pre_nota else None)
+            if volume:
+                usados.add(volume.id)
+                ja_conferidas.update((volume.chave_de_acesso, volume.pre_nota))
+                confirmar.setdefault(volume.romaneio_id, []).append(volume.id)
+                resultados.append({'chave': chave, 'resultado': 'confirmado', 'volume_id': volume.id,
+                                   'tipo_caixa': volume.tipo_caixa, 'matricula': volume.matricula})
+            elif chave in ja_conferidas or pre_nota in ja_conferidas:
+                resultados.append({'chave': chave, 'resultado': 'ja_conferido'})
+            else:
+                resultados.append({'chave': chave, 'resultado': 'nao_encontrado'})
+
+        confirmados = confirmar_volumes(confirmar)
+        if novas:
+            somar_resumo(transportadora_id, leituras=len(novas))
+        return resultados, confirmados, usados
+
+    resultados, confirmados, usados = gravar(conferir_lote)
+    descartar_do_indice_leitura(transportadora_id, usados)
+    for r in resultados:
+        if r['resultado'] == 'confirmado':
+            leituras_recentes.lembrar(sessao, r['chave'], {
+                'volume_id': r['volume_id'], 'tipo_caixa': r['tipo_caixa'], 'matricula': r['matricula']})
+    for resultado in ('confirmado', 'ja_conferido', 'nao_encontrado'):
+        quantidade = sum(1 for r in resultados if r['resultado'] == resultado)
+        if quantidade:
+            registro_metricas.incrementar('romaneio_leituras_total', quantidade, resultado=resultado)
+
+    return jsonify({'resultados': resultados, 'confirmados': confirmados})
 
 
 @app.route('/progresso/<int:romaneio_id>')
@@ -238,10 +1755,10 @@ def progresso_conferencia(romaneio_id):
     if romaneio.transportadora_id != session['transportadora_id']:
         return jsonify({'erro': 'Acesso negado'}), 403
 
-    total = len(romaneio.volumes)
-    conferidos = sum(1 for v in romaneio.volumes if v.status == 'confirmado')
+    total = romaneio.total_volumes
+    conferidos = romaneio.volumes_confirmados
 
-    return jsonify({
+    return resposta_condicional(romaneio, lambda: {
         'total': total,
         'conferidos': conferidos,
         'porcentagem': round((conferidos / total) * 100, 2) if total else 0
@@ -264,22 +1781,28 @@ def finalizar_conferencia():
     if romaneio.transportadora_id != session['transportadora_id']:
         return jsonify({'erro': 'Acesso negado'}), 403
 
-    volumes = romaneio.volumes
-    total = len(volumes)
-    conferidos = sum(1 for v in volumes if v.status == 'confirmado')
-
-    # Define status do romaneio
-    if total > 0 and conferidos == total:
-        romaneio.status = 'finalizado'
-    else:
-        romaneio.status = 'pendente'
+    total = romaneio.total_volumes
+    conferidos = romaneio.volumes_confirmados
 
+    # Define status do romaneio; só a mudança de status gera evento e entra no resumo
+    status = 'finalizado' if total > 0 and conferidos == total else 'pendente'
+    mudou = Romaneio.query.filter(Romaneio.id == romaneio.id, or_(
+        Romaneio.status != status, Romaneio.status.is_(None))).update({'status': status})
+    if mudou:
+        registrar_eventos(romaneio.id, [None], status)
+        somar_resumo(romaneio.transportadora_id, romaneios_finalizados=int(status == 'finalizado'))
     db.session.commit()
 
+    if status == 'finalizado':
+        indice = _indices_leitura.get(romaneio.transportadora_id)
+        if indice:
+            with _trava_indices:
+                indice.remover_romaneio(romaneio.id)
+
     return jsonify({
         'total': total,
         'conferidos': conferidos,
-        'status_romaneio': romaneio.status
+        'status_romaneio': status
     })
 
 
@@ -289,20 +1812,150 @@ def volumes_faltantes(romaneio_id):
     if romaneio.transportadora_id != session['transportadora_id']:
         return jsonify({'erro': 'Acesso negado'}), 403
 
-    volumes = [v for v in romaneio.volumes if v.status != 'confirmado']
-    resultado = [{
-        'id': v.id,
-        'tipo_caixa': v.tipo_caixa,
-        'matricula': v.matricula
-    } for v in volumes]
-
-    return jsonify({'faltantes': resultado})
+    def montar():
+        volumes = db.session.query(Volume.id, Volume.tipo_caixa, Volume.matricula).filter(
+            Volume.romaneio_id == romaneio.id, volume_nao_conferido(Volume)
+        ).order_by(Volume.id)
+        resultado = [{
+            'id': v.id,
+            'tipo_caixa': v.tipo_caixa,
+            'matricula': v.matricula
+        } for v in volumes]
+        return {'faltantes': resultado}
+    return resposta_condicional(romaneio, montar)
+
+COLUNAS_EXPORTACAO = (
+    ('pre_nota', 'Pré-nota'), ('num_nota', 'Nota'), ('data_emissao', 'Emissão'),
+    ('status_romaneio', 'Status do romaneio'), ('volume_id', 'Volume'), ('tipo_caixa', 'Tipo de caixa'),
+    ('matricula', 'Matrícula'), ('quantidade', 'Quantidade'), ('palete', 'Palete'), ('codigo', 'Código'),
+    ('cliente', 'Cliente'), ('cod_regiao', 'Cód. região'), ('regiao', 'Região'), ('produto', 'Produto'),
+    ('rota', 'Rota'), ('numero_caixa', 'Nº caixa'), ('chave_de_acesso', 'Chave de acesso'),
+    ('status', 'Status do volume'),
+)
+
+def volume_nao_conferido(modelo):
+    return or_(modelo.status != 'confirmado', modelo.status.is_(None))
+
+def consulta_exportacao(transportadora_id, status, data_inicio, data_fim, so_faltantes, modelo=Romaneio):
+    """Linhas da exportação (uma por volume), com os filtros do menu."""
+    volume = VolumeArquivado if modelo.arquivado else Volume
+    # os nomes de cliente, região, produto e rota saem como ids e são completados
+    # pelo cache das dimensões (completar_nomes)
+    nomes = {c for _, campos in DIMENSOES_VOLUME.values() for c in campos}
+    colunas = [modelo.status.label('status_romaneio'), volume.id.label('volume_id')]
+    colunas += [getattr(modelo if nome in ('pre_nota', 'num_nota', 'data_emissao') else volume, nome)
+                for nome, _ in COLUNAS_EXPORTACAO if nome not in {'status_romaneio', 'volume_id'} | nomes]
+    colunas += [getattr(volume, coluna) for coluna in DIMENSOES_VOLUME]
+    consulta = consulta_romaneios_menu(transportadora_id, status, data_inicio, data_fim, modelo) \
+        .join(volume, volume.romaneio_id == modelo.id)
+    if so_faltantes:
+        consulta = consulta.filter(volume_nao_conferido(volume))
+    if modelo.arquivado:
+        # romaneio nos dois bancos (arquivamento interrompido) sai só pelo principal
+        consulta = consulta.filter(~db.exists().where(Romaneio.id == modelo.id))
+    return consulta.with_entities(*colunas).order_by(modelo.data_emissao, modelo.id, volume.id)
+
+@app.route('/exportar/volumes.<formato>')
+def exportar_volumes(formato):
+    """Volumes dos romaneios filtrados como no menu, em CSV ou XLSX.
+
+    ?volumes=faltantes (padrão: os não conferidos) ou todos; status,
+    data_inicio e data_fim (AAAA-MM-DD) como no menu. A resposta sai em
+    streaming de um cursor no banco, então o tamanho do relatório não pesa na
+    memória do worker.
+    """
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    if formato not in ('csv', 'xlsx'):
+        abort(404)
+    transportadora_id = session['transportadora_id']
+    data_inicio = request.args.get('data_inicio', type=date.fromisoformat)
+    data_fim = request.args.get('data_fim', type=date.fromisoformat)
+    so_faltantes = request.args.get('volumes', 'faltantes') != 'todos'
+    filtros = (transportadora_id, request.args.get('status') or None, data_inicio, data_fim, so_faltantes)
+
+    consultas = [consulta_exportacao(*filtros).statement]
+    if limite_do_arquivo(transportadora_id, data_inicio):
+        # o arquivo tem os mais antigos, então vem primeiro
+        consultas.insert(0, consulta_exportacao(*filtros, modelo=RomaneioArquivado).statement)
+    motor = db.engine
+    db.session.remove()
+
+    def linhas():
+        with motor.connect() as conexao:
+            for consulta in consultas:
+                resultado = conexao.execution_options(yield_per=LINHAS_POR_LOTE_EXPORTACAO).execute(consulta)
+                for parte in resultado.mappings().partitions():
+                    for linha in completar_nomes([dict(linha) for linha in parte], DIMENSOES_VOLUME, conexao):
+                        yield tuple(linha[nome] for nome, _ in COLUNAS_EXPORTACAO)
+
+    cabecalho = [titulo for _, titulo in COLUNAS_EXPORTACAO]
+    nome = f"{'faltantes' if so_faltantes else 'volumes'}_{date.today().isoformat()}"
+    if formato == 'csv':
+        corpo, tipo = exportacao.gerar_csv(cabecalho, linhas()), 'text/csv; charset=utf-8'
+    else:
+        corpo = exportacao.gerar_xlsx(cabecalho, linhas(), nome_planilha='Faltantes' if so_faltantes else 'Volumes')
+        tipo = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    return Response(corpo, mimetype=tipo,
+                    headers={'Content-Disposition': f'attachment; filename={nome}.{formato}'})
+
+
+def resumo_por_dia(transportadora_id, data_inicio, data_fim):
+    """Totais de cada dia do período, com as leituras hora a hora, só de ResumoOperacao.
+
+    romaneios_pendentes de cada dia é o da última hora com atividade.
+    """
+    dias = {}
+    for linha in ResumoOperacao.query.filter(
+        ResumoOperacao.transportadora_id == transportadora_id,
+        ResumoOperacao.dia.between(data_inicio, data_fim)
+    ).order_by(ResumoOperacao.dia.desc(), ResumoOperacao.hora.desc()):
+        dia = dias.setdefault(linha.dia, dict.fromkeys(CONTADORES_RESUMO, 0) | {
+            'dia': linha.dia.isoformat(), 'leituras_por_hora': [0] * 24,
+            'romaneios_pendentes': linha.romaneios_pendentes})
+        for contador in CONTADORES_RESUMO:
+            dia[contador] += getattr(linha, contador)
+        dia['leituras_por_hora'][linha.hora] += linha.leituras
+    return list(dias.values())
+
+def romaneios_pendentes(transportadora_id):
+    return db.session.query(Transportadora.romaneios_pendentes).filter_by(id=transportadora_id).scalar() or 0
+
+def periodo_do_resumo():
+    """(data_inicio, data_fim) de ?data_inicio=&data_fim=, por padrão os últimos 7 dias."""
+    data_fim = request.args.get('data_fim', type=date.fromisoformat) or date.today()
+    data_inicio = request.args.get('data_inicio', type=date.fromisoformat) or data_fim - timedelta(days=6)
+    return max(data_inicio, data_fim - timedelta(days=DIAS_MAXIMOS_RESUMO - 1)), data_fim
+
+@app.route('/resumo')
+def resumo():
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    data_inicio, data_fim = periodo_do_resumo()
+    return render_template('resumo.html', dias=resumo_por_dia(session['transportadora_id'], data_inicio, data_fim),
+                           pendentes=romaneios_pendentes(session['transportadora_id']),
+                           data_inicio=data_inicio, data_fim=data_fim)
 
+@app.route('/api/resumo')
+def api_resumo():
+    if 'user_id' not in session:
+        return jsonify({'erro': 'Não autenticado'}), 401
+    data_inicio, data_fim = periodo_do_resumo()
+    return jsonify({
+        'data_inicio': data_inicio.isoformat(),
+        'data_fim': data_fim.isoformat(),
+        'romaneios_pendentes': romaneios_pendentes(session['transportadora_id']),
+        'dias': resumo_por_dia(session['transportadora_id'], data_inicio, data_fim),
+    })
 
 @app.route('/logout')
 def logout():
     session.clear()
-    return redirect(url_for('login'))
+    resposta = redirect(url_for('login'))
+    # cache HTTP do navegador; as páginas guardadas pelo service worker o menu.js
+    # manda apagar antes de chegar aqui ("storage" levaria também a fila de leituras)
+    resposta.headers['Clear-Site-Data'] = '"cache"'
+    return resposta
 
 # --- Inicialização banco (execução única) ---
 
@@ -527,27 +2180,360 @@ def criar_dados_iniciais():
             db.session.add_all(itens)
 
             db.session.commit()
+            reconciliar_contadores()
+
+
+
+# --- Importação de arquivos do WMS ---
+
+# colunas de volume gravadas a partir de um registro lido, já com os ids das dimensões
+CAMPOS_VOLUME_IMPORTADOS = [c for c in importacao.CAMPOS_VOLUME
+                            if not any(c in campos for _, campos in DIMENSOES_VOLUME.values())] \
+    + list(DIMENSOES_VOLUME)
+
+def _rejeitar(relatorio, linha, motivo):
+    relatorio['rejeitados'] += 1
+    if len(relatorio['erros']) < 100:
+        relatorio['erros'].append({'linha': linha, 'motivo': motivo})
+
+def _importar_bloco(registros, transportadora_id, romaneios_conhecidos, relatorio):
+    """Grava um bloco de registros numa transação, com executemany por tabela."""
+    romaneio_t, volume_t, item_t = Romaneio.__table__, Volume.__table__, Item.__table__
+    # só os volumes desta transportadora são atualizados, movidos ou têm itens trocados
+    da_transportadora = volume_t.c.romaneio_id.in_(
+        db.select(Romaneio.id).where(Romaneio.transportadora_id == transportadora_id))
+
+    # 0. Chave de acesso que já é volume de outra transportadora: a linha é rejeitada
+    alheias = {c for (c,) in db.session.query(Volume.chave_de_acesso).join(Romaneio).filter(
+        Volume.chave_de_acesso.in_([r['chave_de_acesso'] for r in registros]),
+        Romaneio.transportadora_id != transportadora_id
+    ).distinct()}
+    if alheias:
+        for r in registros:
+            if r['chave_de_acesso'] in alheias:
+                _rejeitar(relatorio, r['linha'], 'chave de acesso pertence a outra transportadora')
+        registros = [r for r in registros if r['chave_de_acesso'] not in alheias]
+        if not registros:
+            return
+
+    # Nomes de cliente, região, produto e rota viram ids (cria os novos antes da transação do bloco)
+    trocar_por_ids(registros, DIMENSOES_VOLUME)
+
+    # 1. Romaneios: os que ainda não conhecemos são buscados e, se preciso, criados
+    novos = {r['pre_nota']: r for r in registros if r['pre_nota'] not in romaneios_conhecidos}
+    if novos:
+        existentes = db.session.query(Romaneio.pre_nota, func.min(Romaneio.id)).filter(
+            Romaneio.transportadora_id == transportadora_id, Romaneio.pre_nota.in_(novos.keys())
+        ).group_by(Romaneio.pre_nota).all()
+        romaneios_conhecidos.update(existentes)
+        criar = [{'pre_nota': p, 'num_nota': r['num_nota'], 'data_emissao': r['data_emissao'],
+                  'status': 'pendente', 'transportadora_id': transportadora_id}
+                 for p, r in novos.items() if p not in romaneios_conhecidos]
+        if criar:
+            db.session.execute(romaneio_t.insert(), criar)
+            romaneios_conhecidos.update(db.session.query(Romaneio.pre_nota, func.min(Romaneio.id)).filter(
+                Romaneio.transportadora_id == transportadora_id,
+                Romaneio.pre_nota.in_([c['pre_nota'] for c in criar])
+            ).group_by(Romaneio.pre_nota).all())
+            relatorio['romaneios_criados'] += len(criar)
+
+    # 2. Volumes: upsert pela chave de acesso (a última linha do bloco vence)
+    por_chave = {}
+    for r in registros:
+        linha = {c: r[c] for c in CAMPOS_VOLUME_IMPORTADOS}
+        linha['romaneio_id'] = romaneios_conhecidos[r['pre_nota']]
+        linha['pre_nota'] = r['pre_nota']
+        por_chave[r['chave_de_acesso']] = (linha, r['itens'])
+    # romaneio atual de cada volume existente: se ele mudar de romaneio, os contadores
+    # do romaneio que ele deixou também são refeitos
+    ja_existentes, romaneios_anteriores = set(), set()
+    for chave, romaneio_id in db.session.query(Volume.chave_de_acesso, Volume.romaneio_id).join(Romaneio).filter(
+        Volume.chave_de_acesso.in_(por_chave.keys()), Romaneio.transportadora_id == transportadora_id
+    ):
+        ja_existentes.add(chave)
+        romaneios_anteriores.add(romaneio_id)
+
+    atualizar = [dict(linha, b_chave=chave) for chave, (linha, _) in por_chave.items() if chave in ja_existentes]
+    if atualizar:
+        # o status não é tocado: a conferência em andamento é preservada
+        db.session.execute(
+            volume_t.update().where(volume_t.c.chave_de_acesso == bindparam('b_chave'), da_transportadora),
+            atualizar
+        )
+    inserir = [dict(linha, status='pendente') for chave, (linha, _) in por_chave.items() if chave not in ja_existentes]
+    if inserir:
+        db.session.execute(volume_t.insert(), inserir)
+    relatorio['volumes_atualizados'] += len(atualizar)
+    relatorio['volumes_inseridos'] += len(inserir)
+    # a revisão que reconciliar_contadores() publica abaixo, para o ?since= dos clientes
+    db.session.execute(volume_t.update().where(volume_t.c.chave_de_acesso.in_(por_chave.keys()), da_transportadora)
+                       .values(revisao=revisao_seguinte(volume_t.c.romaneio_id)))
+
+    # 3. Itens: os volumes que trouxeram itens no arquivo têm a lista substituída
+    com_itens = {chave for chave, (_, itens) in por_chave.items() if itens}
+    if com_itens:
+        ids = db.session.query(Volume.id, Volume.chave_de_acesso).join(Romaneio).filter(
+            Volume.chave_de_acesso.in_(com_itens), Romaneio.transportadora_id == transportadora_id).all()
+        db.session.execute(item_t.delete().where(item_t.c.volume_id.in_([i for i, _ in ids])))
+        itens = [{'volume_id': volume_id, 'descricao': descricao, 'cliente_id': linha['cliente_id'],
+                  'regiao_id': linha['regiao_id']}
+                 for volume_id, chave in ids
+                 for linha, descricoes in [por_chave[chave]]
+                 for descricao in descricoes]
+        db.session.execute(item_t.insert(), itens)
+        relatorio['itens'] += len(itens)
+
+    # reconciliar_contadores faz o commit do bloco
+    reconciliar_contadores({linha['romaneio_id'] for linha, _ in por_chave.values()} | romaneios_anteriores)
+
+def importar_registros(registros, transportadora_id, tamanho_bloco=TAMANHO_BLOCO_IMPORTACAO):
+    """Grava os registros lidos por importacao.ler_csv/ler_nfe_xml em blocos.
+
+    Só um bloco fica em memória por vez. Devolve o relatório com contagens,
+    vazão e os primeiros registros rejeitados.
+    """
+    inicio = time.perf_counter()
+    relatorio = {'lidos': 0, 'rejeitados': 0, 'erros': [], 'romaneios_criados': 0,
+                 'volumes_inseridos': 0, 'volumes_atualizados': 0, 'itens': 0}
+    romaneios_conhecidos = {}
+    bloco = []
+    for registro in registros:
+        relatorio['lidos'] += 1
+        if isinstance(registro, importacao.RegistroRejeitado):
+            _rejeitar(relatorio, registro.linha, registro.motivo)
+            continue
+        bloco.append(registro)
+        if len(bloco) >= tamanho_bloco:
+            _importar_bloco(bloco, transportadora_id, romaneios_conhecidos, relatorio)
+            bloco = []
+    if bloco:
+        _importar_bloco(bloco, transportadora_id, romaneios_conhecidos, relatorio)
+
+    invalidar_indice_leitura(transportadora_id)
+    db.session.commit()
 
+    relatorio['segundos'] = round(time.perf_counter() - inicio, 3)
+    relatorio['volumes_por_segundo'] = round(
+        (relatorio['lidos'] - relatorio['rejeitados']) / relatorio['segundos']) if relatorio['segundos'] else 0
+    return relatorio
 
+def ler_arquivo_importacao(arquivo_binario, nome):
+    """Escolhe o leitor pela extensão: .xml é NF-e, o resto é CSV."""
+    if nome.lower().endswith('.xml'):
+        return importacao.ler_nfe_xml(arquivo_binario)
+    return importacao.ler_csv(io.TextIOWrapper(arquivo_binario, encoding='utf-8-sig', newline=''))
+
+@app.route('/importar', methods=['POST'])
+def importar_arquivo():
+    """Recebe um CSV ou XML de NF-e (campo 'arquivo') e importa para a transportadora logada."""
+    if 'user_id' not in session:
+        return jsonify({'erro': 'Não autenticado'}), 401
+    arquivo = request.files.get('arquivo')
+    if not arquivo or not arquivo.filename:
+        return jsonify({'erro': 'Arquivo é obrigatório'}), 400
+    # o werkzeug já gravou uploads grandes em arquivo temporário; lemos direto dele
+    relatorio = importar_registros(ler_arquivo_importacao(arquivo.stream, arquivo.filename),
+                                   session['transportadora_id'])
+    return jsonify(relatorio)
+
+@app.cli.command('importar')
+@click.argument('caminhos', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--transportadora', 'transportadora_id', type=int, required=True)
+@click.option('--bloco', default=TAMANHO_BLOCO_IMPORTACAO, show_default=True, help='Volumes por transação.')
+def importar_comando(caminhos, transportadora_id, bloco):
+    """Importa arquivos CSV ou XML de NF-e do WMS."""
+    for caminho in caminhos:
+        with open(caminho, 'rb') as arquivo:
+            relatorio = importar_registros(ler_arquivo_importacao(arquivo, caminho), transportadora_id, bloco)
+        print(f"{caminho}: {relatorio['lidos']} lidos, {relatorio['volumes_inseridos']} inseridos, "
+              f"{relatorio['volumes_atualizados']} atualizados, {relatorio['rejeitados']} rejeitados, "
+              f"{relatorio['itens']} itens em {relatorio['segundos']}s "
+              f"({relatorio['volumes_por_segundo']} volumes/s)")
+        for erro in relatorio['erros']:
+            print(f"  linha {erro['linha']}: {erro['motivo']}")
+
+def dados_pdf_romaneio(rom):
+    """Converte o romaneio (com volumes carregados) no dicionário usado por pdf_romaneio."""
+    return {
+        'id': rom.id,
+        'pre_nota': rom.pre_nota,
+        'num_nota': rom.num_nota,
+        'data_emissao': str(rom.data_emissao),
+        'status': rom.status,
+        'volumes': [(v.tipo_caixa, v.matricula, v.quantidade, v.status) for v in rom.volumes],
+    }
+
+_pool_pdf = None
+_trava_pool_pdf = threading.Lock()
+
+def pool_pdf():
+    """Pool de processos da renderização em lote, criado no primeiro uso em cada worker.
+
+    Usa 'spawn' porque o worker do gunicorn tem threads. Os filhos importam
+    pdf_romaneio e o módulo __main__ do processo pai: sob o gunicorn é o
+    script dele, mas com `python app.py` cada filho importa app.py inteiro de
+    novo (app, engine, modelos), o que só pesa na primeira renderização.
+    """
+    global _pool_pdf
+    with _trava_pool_pdf:
+        if _pool_pdf is None:
+            _pool_pdf = ProcessPoolExecutor(max_workers=PROCESSOS_PDF,
+                                            mp_context=multiprocessing.get_context('spawn'))
+        return _pool_pdf
+
+def descartar_pool_pdf(pool):
+    """Tira de uso um pool quebrado (um filho morreu, p. ex. pelo OOM killer).
+
+    Um ProcessPoolExecutor quebrado recusa toda tarefa nova; sem descartá-lo,
+    o lote de PDFs falharia em todas as requisições seguintes do worker.
+    """
+    global _pool_pdf
+    with _trava_pool_pdf:
+        if _pool_pdf is pool:
+            _pool_pdf = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def renderizar_em_paralelo(funcao, documentos):
+    """Aplica `funcao` a cada documento no pool e entrega (documento, resultado) à medida que ficam prontos.
+
+    No máximo 2 × PROCESSOS_PDF documentos ficam em andamento ao mesmo tempo,
+    o que limita a memória independente do tamanho do lote. Se o pool quebrar,
+    ele é trocado por um novo e os documentos em andamento são reenviados uma
+    vez; quebrando de novo, o erro sobe.
+    """
+    documentos = iter(documentos)
+    reenviar = []
+    for tentativa in range(2):
+        pool = pool_pdf()
+        em_andamento, enviando = {}, None
+        try:
+            for enviando in itertools.chain(reenviar, documentos):
+                em_andamento[pool.submit(funcao, enviando)] = enviando
+                enviando = None
+                if len(em_andamento) >= 2 * PROCESSOS_PDF:
+                    prontos, _ = wait(em_andamento, return_when=FIRST_COMPLETED)
+                    for futuro in prontos:
+                        resultado = futuro.result()
+                        yield em_andamento.pop(futuro), resultado
+            for futuro in as_completed(list(em_andamento)):
+                resultado = futuro.result()
+                yield em_andamento.pop(futuro), resultado
+            return
+        except BrokenProcessPool:
+            descartar_pool_pdf(pool)
+            if tentativa:
+                raise
+            app.logger.warning('Pool de PDFs quebrado; recriando e reenviando %d documentos',
+                               len(em_andamento) + (enviando is not None))
+            reenviar = list(em_andamento.values()) + ([enviando] if enviando is not None else [])
+
+class CachePdf:
+    """Cache de PDFs endereçado pelo conteúdo: LRU em memória na frente de um diretório limitado.
+
+    Qualquer mudança no que vai impresso gera uma chave nova, então nada
+    precisa ser invalidado.
+    """
+
+    def __init__(self, diretorio, max_itens_memoria, max_bytes_disco):
+        self.diretorio = diretorio
+        self.max_itens_memoria = max_itens_memoria
+        self.max_bytes_disco = max_bytes_disco
+        self._memoria = OrderedDict()
+        self._trava = threading.Lock()
+        self._bytes_disco = None  # estimativa; recalculada a cada limpeza
+        os.makedirs(diretorio, exist_ok=True)
+
+    @staticmethod
+    def chave(layout, dados):
+        conteudo = json.dumps(dados, sort_keys=True, default=str).encode('utf-8')
+        return f"{dados['id']}-{layout}-{hashlib.sha256(conteudo).hexdigest()[:32]}"
+
+    def _caminho(self, chave):
+        return os.path.join(self.diretorio, chave + '.pdf')
+
+    def obter(self, chave):
+        with self._trava:
+            if chave in self._memoria:
+                self._memoria.move_to_end(chave)
+                return self._memoria[chave]
+        caminho = self._caminho(chave)
+        try:
+            with open(caminho, 'rb') as arquivo:
+                pdf_bytes = arquivo.read()
+            os.utime(caminho)  # marca como usado recentemente
+        except FileNotFoundError:
+            return None
+        self._lembrar(chave, pdf_bytes)
+        return pdf_bytes
+
+    def guardar(self, chave, pdf_bytes):
+        self._lembrar(chave, pdf_bytes)
+        temporario = f'{self._caminho(chave)}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temporario, 'wb') as arquivo:
+            arquivo.write(pdf_bytes)
+        os.replace(temporario, self._caminho(chave))
+        if self._bytes_disco is None:
+            self._limitar_disco()
+        else:
+            self._bytes_disco += len(pdf_bytes)
+            if self._bytes_disco > self.max_bytes_disco:
+                self._limitar_disco()
+
+    def _lembrar(self, chave, pdf_bytes):
+        with self._trava:
+            self._memoria[chave] = pdf_bytes
+            self._memoria.move_to_end(chave)
+            while len(self._memoria) > self.max_itens_memoria:
+                self._memoria.popitem(last=False)
+
+    def _remover(self, caminho):
+        try:
+            os.remove(caminho)
+        except FileNotFoundError:
+            pass  # outro worker já removeu
+
+    def _limitar_disco(self):
+        arquivos = []
+        with os.scandir(self.diretorio) as entradas:
+            for entrada in entradas:
+                if entrada.name.endswith('.pdf'):
+                    info = entrada.stat()
+                    arquivos.append((info.st_mtime, info.st_size, entrada.path))
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        if total > self.max_bytes_disco:
+            for _, tamanho, caminho in sorted(arquivos):
+                if total <= self.max_bytes_disco * 0.9:
+                    break
+                self._remover(caminho)
+                total -= tamanho
+        self._bytes_disco = total
+
+cache_pdf = CachePdf(os.path.join(app.instance_path, 'cache_pdf'),
+                     max_itens_memoria=CACHE_PDF_ITENS_MEMORIA,
+                     max_bytes_disco=CACHE_PDF_BYTES_DISCO)
 
 @app.route('/pdf/<int:romaneio_id>')
 def gerar_pdf(romaneio_id):
-    rom = Romaneio.query.get_or_404(romaneio_id)
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    rom = db.session.get(Romaneio, romaneio_id)
+    # o arquivo só é consultado se a transportadora tem romaneios nele
+    if rom is None and limite_do_arquivo(session['transportadora_id'], None):
+        rom = db.session.get(RomaneioArquivado, romaneio_id)
+    if rom is None:
+        abort(404)
     if rom.transportadora_id != session['transportadora_id']:
         return "Acesso negado", 403
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-    pdf.cell(200, 10, txt=f"Romaneio Pré-Nota: {rom.pre_nota}", ln=True)
-    pdf.cell(200, 10, txt=f"Nota Fiscal: {rom.num_nota}", ln=True)
-    pdf.cell(200, 10, txt=f"Data de Emissão: {rom.data_emissao}", ln=True)
-    pdf.cell(200, 10, txt="Volumes:", ln=True)
-    for v in rom.volumes:
-        pdf.cell(200, 10, txt=f" - {v.tipo_caixa} ({v.matricula}) - Quantidade: {v.quantidade} - Status: {v.status}", ln=True)
-    
-    pdf_bytes = pdf.output(dest='S').encode('latin1')  # gera PDF em bytes
+
+    dados = dados_pdf_romaneio(rom)
+    chave = cache_pdf.chave('simples', dados)
+    pdf_bytes = cache_pdf.obter(chave)
+    if pdf_bytes is None:
+        import pdf_romaneio  # FPDF só é carregado quando um PDF precisa ser gerado
+        pdf_bytes = pdf_romaneio.pdf_romaneio(dados)
+        cache_pdf.guardar(chave, pdf_bytes)
     pdf_buffer = BytesIO(pdf_bytes)
-    
+
     return send_file(pdf_buffer,
                      download_name=f'romaneio_{rom.pre_nota}.pdf',
                      as_attachment=True,
@@ -555,62 +2541,248 @@ def gerar_pdf(romaneio_id):
 
 @app.route('/gerar_pdf_lote')
 def gerar_pdf_lote():
-    ids = request.args.getlist('ids')
-
-    zip_buffer = BytesIO()
-
-    with zipfile.ZipFile(zip_buffer, 'w') as zip_file:
-        for romaneio_id in ids:
-            romaneio = Romaneio.query.get(romaneio_id)
-            if not romaneio:
-                continue
-
-            pdf = FPDF()
-            pdf.add_page()
-            pdf.set_font("Arial", size=12)
-
-            # Cabeçalho
-            pdf.set_font("Arial", 'B', 14)
-            pdf.cell(200, 10, txt=f"Romaneio: {romaneio.pre_nota}", ln=True)
-            pdf.set_font("Arial", size=12)
-            pdf.cell(200, 10, txt=f"Nota Fiscal: {romaneio.num_nota}", ln=True)
-            pdf.cell(200, 10, txt=f"Data de Emissão: {romaneio.data_emissao}", ln=True)
-            pdf.cell(200, 10, txt=f"Status Geral: {romaneio.status}", ln=True)
-            pdf.ln(10)
-
-            # Tabela de volumes
-            pdf.set_font("Arial", 'B', 12)
-            pdf.cell(50, 10, "Tipo de Caixa", 1)
-            pdf.cell(50, 10, "Matrícula", 1)
-            pdf.cell(40, 10, "Quantidade", 1)
-            pdf.cell(40, 10, "Status", 1)
-            pdf.ln()
-
-            pdf.set_font("Arial", size=11)
-            for v in romaneio.volumes:
-                pdf.cell(50, 10, v.tipo_caixa, 1)
-                pdf.cell(50, 10, v.matricula, 1)
-                pdf.cell(40, 10, str(v.quantidade), 1)
-                pdf.cell(40, 10, v.status, 1)
-                pdf.ln()
-
-            # Salvar PDF na memória
-            pdf_bytes = pdf.output(dest='S').encode('latin-1')
-            nome_pdf = f"romaneio_{romaneio.pre_nota or romaneio.id}.pdf"
-            zip_file.writestr(nome_pdf, pdf_bytes)
-
-    zip_buffer.seek(0)
-
-    return send_file(
-        zip_buffer,
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    ids = [int(i) for i in request.args.getlist('ids') if i.isdigit()]
+
+    # Todos os romaneios e volumes de uma vez, já convertidos para os processos de renderização
+    romaneios = []
+    com_arquivo = limite_do_arquivo(session['transportadora_id'], None)
+    for modelo in (Romaneio, RomaneioArquivado) if com_arquivo else (Romaneio,):
+        romaneios += modelo.query.options(selectinload(modelo.volumes)).filter(
+            modelo.id.in_(ids),
+            modelo.transportadora_id == session['transportadora_id']
+        ).order_by(modelo.id).all()
+    # um romaneio nos dois bancos (arquivamento interrompido) sai uma vez só
+    romaneios = list({r.id: r for r in reversed(romaneios)}.values())
+    romaneios.sort(key=lambda r: r.id)
+    documentos = [dados_pdf_romaneio(r) for r in romaneios]
+    db.session.remove()
+
+    def gerar_zip():
+        import pdf_romaneio
+        saida = exportacao.SaidaStream()
+        faltando = []
+        with zipfile.ZipFile(saida, 'w') as zip_file:
+            # o que já está no cache vai primeiro; só o resto passa pelo pool
+            for dados in documentos:
+                pdf_bytes = cache_pdf.obter(cache_pdf.chave('lote', dados))
+                if pdf_bytes is None:
+                    faltando.append(dados)
+                    continue
+                zip_file.writestr(pdf_romaneio.nome_pdf_lote(dados), pdf_bytes)
+                yield saida.esvaziar()
+            for dados, (nome_pdf, pdf_bytes) in renderizar_em_paralelo(pdf_romaneio.pdf_romaneio_lote, faltando):
+                cache_pdf.guardar(cache_pdf.chave('lote', dados), pdf_bytes)
+                zip_file.writestr(nome_pdf, pdf_bytes)
+                yield saida.esvaziar()
+        yield saida.esvaziar()
+
+    return Response(
+        gerar_zip(),
         mimetype='application/zip',
-        as_attachment=True,
-        download_name='romaneios_completos.zip'
+        headers={'Content-Disposition': 'attachment; filename=romaneios_completos.zip'}
     )
 
 
+# --- Migração de schema ---
+
+def _adicionar_colunas_faltantes():
+    """ALTER TABLE ADD COLUMN para colunas do modelo que o banco ainda não tem."""
+    inspetor = db.inspect(db.engine)
+    adicionadas = []
+    for tabela in db.metadata.sorted_tables:
+        existentes = {c['name'] for c in inspetor.get_columns(tabela.name, schema=tabela.schema)}
+        for coluna in tabela.columns:
+            if coluna.name in existentes:
+                continue
+            ddl = f'ALTER TABLE {tabela.fullname} ADD COLUMN {coluna.name} {coluna.type.compile(db.engine.dialect)}'
+            if coluna.server_default is not None:
+                ddl += f" NOT NULL DEFAULT {coluna.server_default.arg}" if not coluna.nullable \
+                    else f" DEFAULT {coluna.server_default.arg}"
+            with db.engine.begin() as conexao:
+                conexao.exec_driver_sql(ddl)
+            adicionadas.append(f'{tabela.fullname}.{coluna.name}')
+    return adicionadas
+
+def _normalizar_dimensoes():
+    """Passa para as tabelas de dimensão os nomes que bancos antigos guardam como
+    texto em volume e item (também no arquivo) e apaga essas colunas."""
+    inspetor = db.inspect(db.engine)
+    tabelas = [(esquema, tabela, dimensoes_da_tabela) for esquema in (None, ESQUEMA_ARQUIVO)
+               for tabela, dimensoes_da_tabela in (('volume', DIMENSOES_VOLUME), ('item', DIMENSOES_ITEM))]
+    for esquema, tabela, dimensoes_da_tabela in tabelas:
+        existentes = {c['name'] for c in inspetor.get_columns(tabela, schema=esquema)}
+        legadas = [c for _, campos in dimensoes_da_tabela.values() for c in campos if c in existentes]
+        if not legadas:
+            continue
+        nome = f'{esquema}.{tabela}' if esquema else tabela
+        with db.engine.begin() as conexao:
+            if not esquema:
+                apagar_gatilhos_busca(conexao)  # leem as colunas antigas; criar_busca_textual os refaz
+            for coluna, (dimensao, campos) in dimensoes_da_tabela.items():
+                destino = dimensoes[dimensao].modelo.__table__
+                textos = [f"coalesce({tabela}.{c}, '')" for c in campos]
+                conexao.exec_driver_sql(
+                    f"INSERT OR IGNORE INTO {destino.name}({', '.join(c.key for c in dimensoes[dimensao].colunas)}) "
+                    f"SELECT DISTINCT {', '.join(textos)} FROM {nome} WHERE {' || '.join(textos)} <> ''")
+                igualdades = ' AND '.join(f'd.{c.key} = {t}' for c, t in zip(dimensoes[dimensao].colunas, textos))
+                conexao.exec_driver_sql(
+                    f'UPDATE {nome} SET {coluna} = (SELECT d.id FROM {destino.name} d WHERE {igualdades})')
+            for coluna in legadas:
+                conexao.exec_driver_sql(f'ALTER TABLE {nome} DROP COLUMN {coluna}')
+        app.logger.info('%s: %s passaram para as tabelas de dimensão', nome, ', '.join(legadas))
+
+def migrar_banco():
+    """Leva um romaneio.db existente ao schema atual (tabelas, colunas e índices que faltarem)."""
+    db.create_all()
+    adicionadas = _adicionar_colunas_faltantes()
+    if 'romaneio.total_volumes' in adicionadas:
+        reconciliar_contadores()
+    criar_gatilhos_pendentes()
+    if 'transportadora.romaneios_pendentes' in adicionadas:
+        reconciliar_pendentes()
+    _normalizar_dimensoes()
+    # create_all só cria índices junto com tabelas novas; nas antigas, cria um a um
+    for tabela in db.metadata.sorted_tables:
+        for indice in tabela.indexes:
+            indice.create(bind=db.engine, checkfirst=True)
+    criar_busca_textual()
+
+@app.cli.command('migrar')
+def migrar_comando():
+    """Aplica as migrações de schema ao banco configurado."""
+    migrar_banco()
+    print('Schema atualizado.')
+
+@app.cli.command('reconciliar-contadores')
+def reconciliar_contadores_comando():
+    """Reconstrói os contadores de volumes dos romaneios e de pendentes das transportadoras."""
+    print(f'{reconciliar_contadores()} romaneios reconciliados.')
+    print(f'{reconciliar_pendentes()} transportadoras reconciliadas.')
+
+@app.cli.command('reindexar-busca')
+def reindexar_busca_comando():
+    """Reconstrói a tabela de busca textual a partir dos romaneios e volumes."""
+    if not criar_busca_textual():
+        raise SystemExit('Busca textual indisponível neste banco.')
+    with db.engine.begin() as conexao:
+        reindexar_busca(conexao)
+    print('Busca textual reindexada.')
+
+@app.cli.command('reconstruir-resumo')
+def reconstruir_resumo_comando():
+    """Refaz o resumo diário dos dias ainda cobertos pelos eventos de conferência."""
+    print(f'{reconstruir_resumo()} linhas de resumo gravadas.')
+
+@app.cli.command('arquivar')
+@click.option('--dias', default=DIAS_PARA_ARQUIVAR, show_default=True,
+              help='Arquiva os finalizados com emissão há mais dias que isso.')
+def arquivar_comando(dias):
+    """Move romaneios finalizados antigos para o banco de arquivo (<banco>_arquivo.db)."""
+    print(f'{arquivar_romaneios(dias)} romaneios arquivados.')
+
+@app.cli.command('limpar-eventos')
+@click.option('--dias', default=2, show_default=True, help='Mantém os eventos mais novos que isso.')
+def limpar_eventos_comando(dias):
+    """Apaga eventos de conferência antigos, que nenhum cliente vai mais pedir."""
+    limite = datetime.utcnow() - timedelta(days=dias)
+    apagados = EventoVolume.query.filter(EventoVolume.criado_em < limite).delete(synchronize_session=False)
+    db.session.commit()
+    print(f'{apagados} eventos apagados.')
+
+def planos_das_consultas_criticas():
+    """Retorna {nome: [linhas do EXPLAIN QUERY PLAN]} para cada consulta crítica."""
+    hoje = date.today()
+    consultas = {
+        'menu': consulta_romaneios_menu(1, 'pendente', hoje, hoje)
+            .order_by(Romaneio.data_emissao.desc(), Romaneio.id.desc()).limit(POR_PAGINA_MENU + 1),
+        'validar_chave': consulta_volume_por_chave('0' * 44, 1).limit(1),
+        'validar_pre_nota': consulta_volume_por_pre_nota('0000000', 1).limit(1),
+        'api_volumes': Volume.query.filter_by(romaneio_id=1),
+        'api_volumes_delta': Volume.query.filter(Volume.romaneio_id == 1, Volume.revisao > 0),
+        'api_itens': Item.query.filter_by(volume_id=1),
+        'api_volumes_itens': Item.query.filter(Item.volume_id.in_([1, 2])),
+        'exportar_faltantes': consulta_exportacao(1, None, hoje - timedelta(days=30), hoje, True),
+        'menu_arquivo': consulta_romaneios_menu(1, 'finalizado', hoje, hoje, RomaneioArquivado)
+            .order_by(RomaneioArquivado.data_emissao.desc(), RomaneioArquivado.id.desc())
+            .limit(POR_PAGINA_MENU + 1),
+        'busca': consulta_busca(1, 'cliente').limit(POR_PAGINA_MENU + 1),
+        'busca_arquivo': consulta_busca(1, 'cliente', modelo=RomaneioArquivado).limit(POR_PAGINA_MENU + 1),
+        'resumo': ResumoOperacao.query.filter(ResumoOperacao.transportadora_id == 1,
+                                              ResumoOperacao.dia.between(hoje - timedelta(days=6), hoje)),
+        'eventos': EventoVolume.query.filter(EventoVolume.romaneio_id == 1, EventoVolume.id > 0)
+            .order_by(EventoVolume.id).limit(500),
+    }
+    conexao = db.session.connection()
+    planos = {}
+    for nome, consulta in consultas.items():
+        sql = consulta.statement.compile(
+            dialect=db.engine.dialect,
+            compile_kwargs={'literal_binds': True, 'render_postcompile': True}
+        ).string
+        linhas = conexao.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql).fetchall()
+        planos[nome] = [linha[-1] for linha in linhas]
+    return planos
+
+def varreduras_completas(detalhes):
+    """Linhas do plano que percorrem uma tabela inteira (SCAN sem índice)."""
+    # SCAN de subconsulta materializada percorre só o resultado dela, não uma tabela
+    materializadas = {d.split()[1] for d in detalhes if d.startswith(('MATERIALIZE ', 'CO-ROUTINE '))}
+    return [d for d in detalhes if d.startswith('SCAN ') and 'INDEX' not in d
+            and d.split()[1] not in materializadas]
+
+@app.cli.command('verificar-planos')
+def verificar_planos_comando():
+    """Falha (código 1) se alguma consulta crítica voltar a varrer a tabela inteira."""
+    migrar_banco()
+    falhas = 0
+    for nome, detalhes in planos_das_consultas_criticas().items():
+        varreduras = varreduras_completas(detalhes)
+        print(f"{'FALHA' if varreduras else 'ok   '} {nome}: {' | '.join(detalhes)}")
+        falhas += bool(varreduras)
+    if falhas:
+        raise SystemExit(1)
+
+@app.cli.command('compilar-estaticos')
+def compilar_estaticos_comando():
+    """Gera static/dist (nomes versionados, .gz e .br); o create_app() faz o mesmo ao subir."""
+    manifesto = estaticos.compilar(app.static_folder)
+    print(f'{len(manifesto)} arquivos em static/{estaticos.PASTA_COMPILADOS}.')
+
+
+# --- Inicialização (gunicorn --preload) ---
+
+MODULOS_PRE_CARREGADOS = ('pdf_romaneio',)  # importados pelo create_app, fora do caminho da requisição
+
+def create_app(dados_iniciais=False):
+    """Prepara o app para servir e o devolve: `gunicorn 'app:create_app()' --preload`.
+
+    Com --preload roda uma vez no processo mestre, antes do fork: aplica as
+    migrações, configura os mappers do SQLAlchemy, gera static/dist, compila
+    os templates e as regras de URL e importa os módulos pesados, e os workers
+    já nascem prontos, sem a primeira requisição pagar por isso. Sem --preload
+    cada worker faz o mesmo ao subir. O `flask` da linha de comando usa `app` direto, sem isso.
+    """
+    with app.app_context():
+        migrar_banco()
+        if dados_iniciais:
+            criar_dados_iniciais()
+    configure_mappers()
+    manifesto_estaticos()
+    for nome in app.jinja_env.list_templates():
+        app.jinja_env.get_template(nome)
+    app.url_map.bind('localhost').match('/')  # monta o roteador das regras
+    for modulo in MODULOS_PRE_CARREGADOS:
+        importlib.import_module(modulo)
+    app.test_client().get('/')  # tela de login: passa uma vez pelo ciclo da requisição
+    # os workers não herdam conexões SQLite abertas no mestre nem a contagem das migrações
+    with app.app_context():
+        db.engine.dispose()
+    registro_metricas.zerar()
+    registro_metricas.gravar(PASTA_METRICAS)  # o instantâneo deste processo fica vazio
+    return app
+
 if __name__ == '__main__':
-    if not os.path.exists('romaneio.db'):
-        criar_dados_iniciais()
-    app.run(debug=True, host='0.0.0.0')
+    create_app(dados_iniciais=True).run(debug=True, host='0.0.0.0')
 
@@ -0,0 +1,117 @@
+"""Benchmark de contenção de escrita: N processos conferindo volumes no mesmo SQLite.
+
+Cada processo faz o papel de um worker do gunicorn: importa o app, faz login e
+chama /validar_volume para a sua fatia de volumes, medindo a latência de cada
+leitura. Roda a mesma carga com os ajustes do SQLite desligados (linha de base:
+journal padrão, sem pool configurado) e ligados (WAL, busy timeout, pragmas).
+
+    python benchmarks/contencao_escrita.py --workers 1 2 4 8 --leituras 500
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CNPJ, SENHA = '00000000000100', 'bench'
+
+
+def preparar_banco(total_volumes):
+    """Cria o banco com uma transportadora e `total_volumes` volumes pendentes."""
+    import app as m
+    with m.app.app_context():
+        m.db.create_all()
+        t = m.Transportadora(nome='Bench')
+        u = m.Usuario(cnpj=CNPJ, transportadora=t)
+        u.set_senha(SENHA)
+        m.db.session.add_all([t, u])
+        m.db.session.flush()
+        por_romaneio = 200
+        for inicio in range(0, total_volumes, por_romaneio):
+            r = m.Romaneio(pre_nota=f'B{inicio:07d}', num_nota=f'N{inicio}', data_emissao=m.date.today(),
+                           transportadora_id=t.id)
+            m.db.session.add(r)
+            m.db.session.flush()
+            m.db.session.execute(m.Volume.__table__.insert(), [
+                {'romaneio_id': r.id, 'status': 'pendente', 'tipo_caixa': 'Caixa', 'matricula': f'M{i}',
+                 'quantidade': 1, 'chave_de_acesso': chave(i)}
+                for i in range(inicio, min(inicio + por_romaneio, total_volumes))
+            ])
+        m.db.session.commit()
+        m.reconciliar_contadores()
+
+
+def chave(i):
+    return f'BENCH{i:037d}'
+
+
+def worker(fatia, barreira, fila):
+    sys.path.insert(0, RAIZ)
+    import app as m
+    cliente = m.app.test_client()
+    cliente.post('/', data={'cnpj': CNPJ, 'senha': SENHA})
+    barreira.wait()  # todos começam juntos, já importados e logados
+    latencias, erros = [], 0
+    inicio_total = time.time()
+    for i in fatia:
+        inicio = time.perf_counter()
+        resposta = cliente.post('/validar_volume', json={'chave': chave(i)})
+        latencias.append(time.perf_counter() - inicio)
+        erros += resposta.status_code != 200
+    fila.put((latencias, erros, inicio_total, time.time()))
+
+
+def rodar(otimizado, workers, leituras):
+    pasta = tempfile.mkdtemp(prefix='bench_contencao_')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(pasta, 'bench.db')
+    os.environ['SQLITE_OTIMIZADO'] = '1' if otimizado else '0'
+    contexto = multiprocessing.get_context('spawn')
+
+    processo = contexto.Process(target=_preparar, args=(workers * leituras,))
+    processo.start()
+    processo.join()
+
+    fila = contexto.Queue()
+    barreira = contexto.Barrier(workers)
+    processos = [contexto.Process(target=worker, args=(range(w * leituras, (w + 1) * leituras), barreira, fila))
+                 for w in range(workers)]
+    for p in processos:
+        p.start()
+    resultados = [fila.get() for _ in processos]
+    for p in processos:
+        p.join()
+
+    duracao = max(r[3] for r in resultados) - min(r[2] for r in resultados)
+    latencias = sorted(l for r in resultados for l in r[0])
+    erros = sum(r[1] for r in resultados)
+    return {
+        'leituras_por_s': len(latencias) / duracao,
+        'p50_ms': latencias[len(latencias) // 2] * 1000,
+        'p99_ms': latencias[int(len(latencias) * 0.99) - 1] * 1000,
+        'erros': erros,
+    }
+
+
+def _preparar(total):
+    sys.path.insert(0, RAIZ)
+    preparar_banco(total)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--leituras', type=int, default=500, help='leituras por worker')
+    args = parser.parse_args()
+
+    print(f"{'modo':<10} {'workers':>7} {'leituras/s':>11} {'p50 ms':>8} {'p99 ms':>8} {'erros':>6}")
+    for otimizado in (False, True):
+        for workers in args.workers:
+            r = rodar(otimizado, workers, args.leituras)
+            print(f"{'ajustado' if otimizado else 'padrão':<10} {workers:>7} {r['leituras_por_s']:>11.0f} "
+                  f"{r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['erros']:>6}")
+
+
+if __name__ == '__main__':
+    main()
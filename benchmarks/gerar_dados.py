@@ -0,0 +1,146 @@
+"""Gera um banco sintético no tamanho da produção para os benchmarks.
+
+Cria transportadoras (cada uma com um usuário CNPJ 0000000000000N / senha
+'bench'), romaneios distribuídos pelos últimos `--dias` dias, volumes por
+romaneio e itens por volume. Romaneios mais antigos que `--dias-abertos` saem
+finalizados, com todos os volumes confirmados; os recentes ficam pendentes com
+parte dos volumes conferida. Grava direto pela tabela, com executemany em
+blocos, então milhões de linhas cabem em poucos minutos.
+
+    python benchmarks/gerar_dados.py /tmp/grande.db --transportadoras 3 \\
+        --romaneios 20000 --volumes 40 --itens 3
+
+A chave de acesso de cada volume tem 44 dígitos com a pré-nota do romaneio
+nas posições 11-18, como o fallback de /validar_volume espera.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SENHA = 'bench'
+TIPOS_CAIXA = ('Caixa Mista', 'Caixa Padrão', 'Caixa Indústria', 'Caixa Especial')
+CLIENTES = [f'CLIENTE {i:04d} LTDA' for i in range(500)]
+PRODUTOS = [f'PRODUTO {i:05d}' for i in range(5000)]
+REGIOES = [(f'{i:02d}', f'REGIÃO {i:02d}') for i in range(30)]
+
+
+def cnpj(transportadora):
+    return f'{transportadora:014d}'
+
+
+def chave(pre_nota, volume):
+    return f'{0:011d}{pre_nota}{volume:026d}'
+
+
+def gerar(args):
+    import app as m
+    from sqlalchemy import func, text
+
+    aleatorio = random.Random(args.semente)
+    hoje = date.today()
+    inicio = time.perf_counter()
+    contagem = {'romaneios': 0, 'volumes': 0, 'itens': 0}
+
+    with m.app.app_context():
+        m.db.create_all()
+        # nomes de cliente, produto, região e rota viram ids das tabelas de dimensão
+        clientes = m.dimensoes['cliente'].ids([(c,) for c in CLIENTES])
+        produtos = m.dimensoes['produto'].ids([(p,) for p in PRODUTOS])
+        regioes = m.dimensoes['regiao'].ids(REGIOES)
+        rotas = m.dimensoes['rota'].ids([(f'{t:04d}',) for t in range(1, args.transportadoras + 1)])
+        conexao = m.db.session.connection()
+        conexao.exec_driver_sql('PRAGMA synchronous=OFF')
+
+        proximo = {t: (m.db.session.query(func.max(t.c.id)).scalar() or 0) + 1
+                   for t in (m.Romaneio.__table__, m.Volume.__table__, m.Item.__table__)}
+        romaneio_id = proximo[m.Romaneio.__table__]
+        volume_id = proximo[m.Volume.__table__]
+        item_id = proximo[m.Item.__table__]
+
+        for t in range(1, args.transportadoras + 1):
+            transportadora = m.Transportadora(nome=f'Transportadora Bench {t}')
+            usuario = m.Usuario(cnpj=cnpj(t), transportadora=transportadora)
+            usuario.set_senha(SENHA)
+            m.db.session.add_all([transportadora, usuario])
+            m.db.session.flush()
+
+            romaneios, volumes, itens = [], [], []
+            for r in range(args.romaneios):
+                pre_nota = f'{romaneio_id:07d}'
+                dias_atras = aleatorio.randrange(args.dias)
+                aberto = dias_atras < args.dias_abertos
+                confirmados = aleatorio.randrange(args.volumes + 1) if aberto else args.volumes
+                romaneios.append({
+                    'id': romaneio_id, 'pre_nota': pre_nota, 'num_nota': f'NF{romaneio_id}',
+                    'data_emissao': hoje - timedelta(days=dias_atras),
+                    'status': 'pendente' if aberto else 'finalizado',
+                    'transportadora_id': transportadora.id,
+                    'total_volumes': args.volumes, 'volumes_confirmados': confirmados,
+                })
+                for v in range(args.volumes):
+                    regiao = aleatorio.choice(regioes)
+                    cliente = aleatorio.choice(clientes)
+                    volumes.append({
+                        'id': volume_id, 'romaneio_id': romaneio_id, 'pre_nota': pre_nota,
+                        'tipo_caixa': aleatorio.choice(TIPOS_CAIXA), 'matricula': f'MTR{volume_id}',
+                        'quantidade': aleatorio.randint(1, 20), 'palete': f'{v // 20:04d}',
+                        'status': 'confirmado' if v < confirmados else 'pendente',
+                        'codigo': f'{volume_id % 1000000:06d}', 'regiao_id': regiao,
+                        'cliente_id': cliente, 'produto_id': aleatorio.choice(produtos), 'rota_id': rotas[t - 1],
+                        'numero_caixa': f'{v:04d}', 'chave_de_acesso': chave(pre_nota, v),
+                    })
+                    for _ in range(args.itens):
+                        itens.append({'id': item_id, 'volume_id': volume_id, 'descricao': aleatorio.choice(PRODUTOS),
+                                      'cliente_id': cliente, 'regiao_id': regiao})
+                        item_id += 1
+                    volume_id += 1
+                romaneio_id += 1
+
+                if len(volumes) >= args.bloco or r == args.romaneios - 1:
+                    conexao.execute(m.Romaneio.__table__.insert(), romaneios)
+                    conexao.execute(m.Volume.__table__.insert(), volumes)
+                    if itens:
+                        conexao.execute(m.Item.__table__.insert(), itens)
+                    m.db.session.commit()
+                    conexao = m.db.session.connection()
+                    contagem['romaneios'] += len(romaneios)
+                    contagem['volumes'] += len(volumes)
+                    contagem['itens'] += len(itens)
+                    romaneios, volumes, itens = [], [], []
+                    print(f"\r{contagem['romaneios']} romaneios, {contagem['volumes']} volumes, "
+                          f"{contagem['itens']} itens", end='', flush=True)
+
+        m.db.session.commit()
+        m.migrar_banco()
+        m.reconciliar_pendentes()  # os romaneios entraram antes dos gatilhos existirem
+        m.db.session.execute(text('ANALYZE'))
+        m.db.session.commit()
+
+    print(f"\nconcluído em {time.perf_counter() - inicio:.1f}s")
+    return contagem
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('banco', help='arquivo SQLite a criar (ou completar)')
+    parser.add_argument('--transportadoras', type=int, default=2)
+    parser.add_argument('--romaneios', type=int, default=5000, help='romaneios por transportadora')
+    parser.add_argument('--volumes', type=int, default=30, help='volumes por romaneio')
+    parser.add_argument('--itens', type=int, default=2, help='itens por volume')
+    parser.add_argument('--dias', type=int, default=365, help='período coberto pelas datas de emissão')
+    parser.add_argument('--dias-abertos', type=int, default=3, help='romaneios mais novos que isso ficam pendentes')
+    parser.add_argument('--bloco', type=int, default=50000, help='volumes por transação')
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(args.banco)
+    sys.path.insert(0, RAIZ)
+    gerar(args)
+
+
+if __name__ == '__main__':
+    main()
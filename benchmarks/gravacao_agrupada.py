@@ -0,0 +1,107 @@
+"""Benchmark da gravação agrupada: leituras/s sustentadas com e sem GRAVACAO_AGRUPADA.
+
+Um processo faz o papel de um worker gthread do gunicorn: T threads, cada uma
+com seu test client logado, chamam /validar_volume sem pausa para a sua fatia
+de volumes. Roda a mesma carga com commit por requisição (padrão) e com o
+GravadorAgrupado, num banco novo a cada rodada, e mostra quantos commits o
+modo agrupado fez. --sincrono FULL mede com fsync a cada commit, o cenário em
+que agrupar commits mais rende.
+
+    python benchmarks/gravacao_agrupada.py --threads 1 4 16 --leituras 500 --sincrono FULL
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from contencao_escrita import CNPJ, SENHA, chave, preparar_banco
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _preparar(total):
+    sys.path.insert(0, RAIZ)
+    preparar_banco(total)
+
+
+def _medir(threads, leituras, fila):
+    sys.path.insert(0, RAIZ)
+    import app as m
+
+    clientes = []
+    for _ in range(threads):
+        cliente = m.app.test_client()
+        cliente.post('/', data={'cnpj': CNPJ, 'senha': SENHA})
+        clientes.append(cliente)
+    barreira = threading.Barrier(threads + 1)
+    latencias, erros = [], [0]
+
+    def conferir(cliente, fatia):
+        barreira.wait()
+        for i in fatia:
+            inicio = time.perf_counter()
+            resposta = cliente.post('/validar_volume', json={'chave': chave(i)})
+            latencias.append(time.perf_counter() - inicio)
+            erros[0] += resposta.status_code != 200
+
+    trabalhadores = [threading.Thread(target=conferir, args=(c, range(t * leituras, (t + 1) * leituras)))
+                     for t, c in enumerate(clientes)]
+    for t in trabalhadores:
+        t.start()
+    barreira.wait()
+    inicio = time.perf_counter()
+    for t in trabalhadores:
+        t.join()
+    duracao = time.perf_counter() - inicio
+
+    grupos = sum(v for n, _, v in m.registro_metricas.instantaneo()['contadores']
+                 if n == 'romaneio_grupos_commit_total')
+    latencias.sort()
+    fila.put({
+        'leituras_por_s': len(latencias) / duracao,
+        'p50_ms': latencias[len(latencias) // 2] * 1000,
+        'p99_ms': latencias[int(len(latencias) * 0.99) - 1] * 1000,
+        'commits': grupos or len(latencias),
+        'erros': erros[0],
+    })
+
+
+def rodar(agrupada, threads, leituras, sincrono):
+    pasta = tempfile.mkdtemp(prefix='bench_agrupada_')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(pasta, 'bench.db')
+    os.environ['SQLITE_SINCRONO'] = sincrono
+    os.environ['GRAVACAO_AGRUPADA'] = '1' if agrupada else '0'
+    contexto = multiprocessing.get_context('spawn')
+
+    processo = contexto.Process(target=_preparar, args=(threads * leituras,))
+    processo.start()
+    processo.join()
+
+    fila = contexto.Queue()
+    processo = contexto.Process(target=_medir, args=(threads, leituras, fila))
+    processo.start()
+    resultado = fila.get()
+    processo.join()
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--leituras', type=int, default=500, help='leituras por thread')
+    parser.add_argument('--sincrono', default='NORMAL', choices=['NORMAL', 'FULL'], help='PRAGMA synchronous')
+    args = parser.parse_args()
+
+    print(f"{'modo':<10} {'threads':>7} {'leituras/s':>11} {'p50 ms':>8} {'p99 ms':>8} {'commits':>8} {'erros':>6}")
+    for agrupada in (False, True):
+        for threads in args.threads:
+            r = rodar(agrupada, threads, args.leituras, args.sincrono)
+            print(f"{'agrupada' if agrupada else 'direta':<10} {threads:>7} {r['leituras_por_s']:>11.0f} "
+                  f"{r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['commits']:>8} {r['erros']:>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+"""Benchmark das rotas principais pelo test client do Flask.
+
+Roda cada cenário várias vezes contra um banco gerado por gerar_dados.py e
+mede latência (p50/p95/p99) e quantidade de comandos SQL por requisição. O
+resultado é gravado em benchmarks/resultados/ com o commit do git, para
+comparar versões:
+
+    python benchmarks/gerar_dados.py /tmp/grande.db --romaneios 20000
+    python benchmarks/rotas.py /tmp/grande.db --repeticoes 50
+    python benchmarks/rotas.py /tmp/grande.db --comparar benchmarks/resultados/<anterior>.json
+
+As leituras de QR alteram o banco, então por padrão o benchmark roda numa
+cópia temporária dele e do banco de arquivo ao lado (<banco>_arquivo.db), se
+existir (--sem-copia usa os originais). Antes de medir, o schema é levado à
+versão atual, como `flask migrar` faria.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASTA_RESULTADOS = os.path.join(RAIZ, 'benchmarks', 'resultados')
+
+
+def copiar_banco(origem, destino):
+    """Copia um banco SQLite pela API de backup, que inclui o que ainda está no WAL."""
+    fonte, copia = sqlite3.connect(origem), sqlite3.connect(destino)
+    try:
+        fonte.backup(copia)
+    finally:
+        fonte.close()
+        copia.close()
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def preparar_cenarios(m, transportadora_id, repeticoes):
+    """Monta a lista de (nome, método, url, json, status esperado) com ids reais do banco."""
+    Romaneio, Volume = m.Romaneio, m.Volume
+    abertos = Romaneio.query.filter_by(transportadora_id=transportadora_id, status='pendente') \
+        .order_by(Romaneio.total_volumes.desc()).limit(20).all()
+    finalizados = Romaneio.query.filter_by(transportadora_id=transportadora_id, status='finalizado') \
+        .order_by(Romaneio.id).limit(20).all()
+    pendentes = [c for (c,) in m.db.session.query(Volume.chave_de_acesso).join(Romaneio).filter(
+        Romaneio.transportadora_id == transportadora_id, Romaneio.status == 'pendente',
+        Volume.status != 'confirmado'
+    ).limit(repeticoes * 51)]
+    if len(pendentes) < repeticoes * 51:
+        print(f'aviso: só {len(pendentes)} volumes pendentes para {repeticoes * 51} leituras; '
+              'gere o banco com mais --dias-abertos', file=sys.stderr)
+    hoje = date.today()
+    mes = f'data_inicio={(hoje - timedelta(days=30)).isoformat()}&data_fim={hoje.isoformat()}'
+
+    unitarias = iter(pendentes[:repeticoes])
+    lotes = [pendentes[repeticoes + i * 50: repeticoes + (i + 1) * 50] for i in range(repeticoes)]
+    cenarios = [
+        ('menu', 'GET', lambda: '/menu', None, 200),
+        ('menu_30_dias', 'GET', lambda: f'/menu?{mes}', None, 200),
+        ('menu_status_pendente', 'GET', lambda: '/menu?status=pendente', None, 200),
+        ('api_busca_cliente', 'GET', lambda: '/api/busca?q=CLIENTE+0042', None, 200),
+        ('validar_volume', 'POST', lambda: '/validar_volume', lambda: {'chave': next(unitarias, 'X' * 44)}, 200),
+        ('validar_volume_inexistente', 'POST', lambda: '/validar_volume', lambda: {'chave': '9' * 44}, 404),
+    ]
+    # lote vazio é recusado com 400: sem chaves para todas as repetições o cenário mediria o erro
+    if all(lotes):
+        lotes = iter(lotes)
+        cenarios.append(('validar_volume_lote_50', 'POST', lambda: '/validar_volume/lote',
+                         lambda: {'chaves': next(lotes)}, 200))
+    else:
+        print('aviso: volumes pendentes insuficientes; validar_volume_lote_50 não será medido',
+              file=sys.stderr)
+    if abertos:
+        aberto = abertos[0]
+        cenarios += [
+            ('menu_busca_pre_nota', 'GET', lambda: f'/menu?busca={aberto.pre_nota}', None, 200),
+            ('romaneio', 'GET', lambda: f'/romaneio/{aberto.id}', None, 200),
+            ('api_volumes', 'GET', lambda: f'/api/volumes/{aberto.id}', None, 200),
+            ('api_volumes_itens', 'GET', lambda: f'/api/volumes/{aberto.id}?since=0&itens=1', None, 200),
+            ('progresso', 'GET', lambda: f'/progresso/{aberto.id}', None, 200),
+            ('faltantes', 'GET', lambda: f'/faltantes/{aberto.id}', None, 200),
+        ]
+    else:
+        print('aviso: nenhum romaneio pendente; cenários de romaneio aberto não serão medidos',
+              file=sys.stderr)
+    if finalizados:
+        cenarios += [
+            ('pdf', 'GET', lambda: f'/pdf/{finalizados[0].id}', None, 200),
+            ('pdf_lote_20', 'GET', lambda: '/gerar_pdf_lote?' + '&'.join(f'ids={r.id}' for r in finalizados),
+             None, 200),
+        ]
+    else:
+        print('aviso: nenhum romaneio finalizado; cenários de PDF não serão medidos', file=sys.stderr)
+    return cenarios
+
+
+def rodar(args):
+    import app as m
+    from sqlalchemy import event
+
+    comandos = [0]
+    with m.app.app_context():
+        m.migrar_banco()
+        event.listen(m.db.engine, 'before_cursor_execute', lambda *a, **k: comandos.__setitem__(0, comandos[0] + 1))
+        usuario = m.Usuario.query.filter_by(cnpj=args.cnpj).first()
+        if not usuario:
+            sys.exit(f'usuário {args.cnpj} não existe no banco; gere com benchmarks/gerar_dados.py')
+        cenarios = preparar_cenarios(m, usuario.transportadora_id, args.repeticoes)
+        tamanho = {'romaneios': m.Romaneio.query.count(), 'volumes': m.Volume.query.count(),
+                   'itens': m.Item.query.count()}
+        m.db.session.remove()
+
+    cliente = m.app.test_client()
+    cliente.post('/', data={'cnpj': args.cnpj, 'senha': args.senha})
+    with cliente.session_transaction() as sessao:
+        if 'user_id' not in sessao:
+            sys.exit(f'não foi possível entrar como {args.cnpj}; confira --senha')
+
+    resultados = {}
+    for nome, metodo, url, corpo, esperado in cenarios:
+        if args.cenarios and nome not in args.cenarios:
+            continue
+        latencias, consultas, erros = [], [], 0
+        for _ in range(args.repeticoes):
+            comandos[0] = 0
+            inicio = time.perf_counter()
+            resposta = cliente.open(url(), method=metodo, json=corpo() if corpo else None)
+            resposta.get_data()  # consome respostas em streaming (PDF em lote)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            consultas.append(comandos[0])
+            erros += resposta.status_code != esperado
+        resultados[nome] = {
+            'p50_ms': round(percentil(latencias, 50), 2),
+            'p95_ms': round(percentil(latencias, 95), 2),
+            'p99_ms': round(percentil(latencias, 99), 2),
+            'media_ms': round(statistics.fmean(latencias), 2),
+            'consultas_por_requisicao': round(statistics.fmean(consultas), 1),
+            'erros': erros,
+        }
+    return tamanho, resultados
+
+
+def commit_atual():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'desconhecido'
+
+
+def imprimir(resultados, anterior=None):
+    print(f"{'cenário':<28} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'SQL/req':>8} {'erros':>6}")
+    for nome, r in resultados.items():
+        linha = (f"{nome:<28} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} "
+                 f"{r['consultas_por_requisicao']:>8.1f} {r['erros']:>6}")
+        if anterior and nome in anterior:
+            a = anterior[nome]
+            variacao = (r['p50_ms'] - a['p50_ms']) / a['p50_ms'] * 100 if a['p50_ms'] else 0
+            linha += f"   p50 {variacao:+.0f}%  SQL {a['consultas_por_requisicao']:.1f}→{r['consultas_por_requisicao']:.1f}"
+        print(linha)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('banco', help='banco gerado por gerar_dados.py')
+    parser.add_argument('--repeticoes', type=int, default=30)
+    parser.add_argument('--cnpj', default='00000000000001')
+    parser.add_argument('--senha', default='bench')
+    parser.add_argument('--cenarios', nargs='*', help='roda só estes cenários')
+    parser.add_argument('--comparar', help='resultado anterior (JSON) para mostrar a variação')
+    parser.add_argument('--sem-copia', action='store_true', help='roda direto no banco informado')
+    args = parser.parse_args()
+
+    banco = os.path.abspath(args.banco)
+    if not args.sem_copia:
+        copia = os.path.join(tempfile.mkdtemp(prefix='bench_rotas_'), 'bench.db')
+        copiar_banco(banco, copia)
+        # o app anexa <banco>_arquivo.db ao lado do principal; sem a cópia dele,
+        # as rotas que consultam o arquivo achariam um banco vazio
+        arquivo = os.path.splitext(banco)[0] + '_arquivo.db'
+        if os.path.exists(arquivo):
+            copiar_banco(arquivo, os.path.splitext(copia)[0] + '_arquivo.db')
+        banco = copia
+    os.environ['DATABASE_URL'] = 'sqlite:///' + banco
+    sys.path.insert(0, RAIZ)
+
+    tamanho, resultados = rodar(args)
+    anterior = None
+    if args.comparar:
+        with open(args.comparar) as arquivo:
+            anterior = json.load(arquivo)['resultados']
+    imprimir(resultados, anterior)
+
+    # um cenário com erros mede a página de erro, não a rota: o resultado não serve de referência
+    com_erro = [nome for nome, r in resultados.items() if r['erros']]
+    if com_erro:
+        sys.exit(f"\nresultado não gravado: cenários com erro: {', '.join(com_erro)}")
+
+    os.makedirs(PASTA_RESULTADOS, exist_ok=True)
+    commit = commit_atual()
+    saida = os.path.join(PASTA_RESULTADOS, f"{datetime.now():%Y%m%d-%H%M%S}-{commit}.json")
+    with open(saida, 'w') as arquivo:
+        json.dump({'commit': commit, 'data': datetime.now().isoformat(timespec='seconds'),
+                   'repeticoes': args.repeticoes, 'banco': tamanho, 'resultados': resultados},
+                  arquivo, indent=2, ensure_ascii=False)
+    print(f'\nresultado gravado em {os.path.relpath(saida, RAIZ)}')
+
+
+if __name__ == '__main__':
+    main()
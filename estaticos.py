@@ -0,0 +1,60 @@
+"""Arquivos estáticos versionados pelo conteúdo e pré-comprimidos.
+
+`compilar` copia cada arquivo de static/ para static/dist/ com um hash do
+conteúdo no nome (css/menu.css -> css/menu.3f2a91c04b.css) e grava ao lado
+as versões .gz e, com o brotli instalado, .br dos arquivos de texto.
+"""
+import gzip
+import hashlib
+import os
+
+try:
+    import brotli
+except ImportError:  # opcional: sem ele só há a versão .gz
+    brotli = None
+
+PASTA_COMPILADOS = 'dist'
+EXTENSOES_COMPRIMIDAS = ('.css', '.js', '.svg', '.json', '.txt')
+TAMANHO_MINIMO_COMPRESSAO = 512  # bytes; abaixo disso a versão comprimida não compensa
+
+
+def nome_versionado(caminho, dados):
+    raiz, extensao = os.path.splitext(caminho)
+    return f'{raiz}.{hashlib.sha256(dados).hexdigest()[:10]}{extensao}'
+
+
+def _gravar(caminho, dados):
+    if os.path.exists(caminho):
+        return  # nome endereçado pelo conteúdo: se existe, já é este conteúdo
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = f'{caminho}.{os.getpid()}.tmp'
+    with open(temporario, 'wb') as arquivo:
+        arquivo.write(dados)
+    os.replace(temporario, caminho)
+
+
+def compilar(pasta_static):
+    """Gera static/dist/ e devolve o manifesto {caminho em static/: caminho em static/dist/}.
+
+    Só escreve o que ainda não existe, então pode rodar a cada início do app;
+    versões antigas ficam na pasta para as páginas que ainda as referenciam.
+    """
+    destino = os.path.join(pasta_static, PASTA_COMPILADOS)
+    manifesto = {}
+    for raiz, pastas, arquivos in os.walk(pasta_static):
+        pastas[:] = sorted(p for p in pastas if os.path.join(raiz, p) != destino)
+        for nome in sorted(arquivos):
+            caminho = os.path.join(raiz, nome)
+            relativo = os.path.relpath(caminho, pasta_static).replace(os.sep, '/')
+            with open(caminho, 'rb') as arquivo:
+                dados = arquivo.read()
+            versionado = nome_versionado(relativo, dados)
+            saida = os.path.join(destino, versionado)
+            _gravar(saida, dados)
+            if relativo.endswith(EXTENSOES_COMPRIMIDAS) and len(dados) >= TAMANHO_MINIMO_COMPRESSAO:
+                if not os.path.exists(saida + '.gz'):
+                    _gravar(saida + '.gz', gzip.compress(dados, compresslevel=9, mtime=0))
+                if brotli and not os.path.exists(saida + '.br'):
+                    _gravar(saida + '.br', brotli.compress(dados, quality=11))
+            manifesto[relativo] = versionado
+    return manifesto
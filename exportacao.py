@@ -0,0 +1,128 @@
+"""Exportação de relatórios em CSV e XLSX, em streaming.
+
+O XLSX é escrito à mão: um ZIP com o mínimo de partes XML que Excel e
+LibreOffice aceitam, células com texto inline.
+"""
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime
+from xml.sax.saxutils import escape
+
+LINHAS_POR_PEDACO = 1000
+
+# caracteres de controle que o XML 1.0 não aceita
+_INVALIDOS_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class SaidaStream:
+    """Destino sem seek para o zipfile; o que foi escrito é drenado a cada pedaço da resposta."""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def esvaziar(self):
+        dados = b''.join(self._partes)
+        self._partes.clear()
+        return dados
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return str(valor)
+
+
+def gerar_csv(cabecalho, linhas, por_pedaco=LINHAS_POR_PEDACO):
+    """CSV com ';' e BOM UTF-8, que o Excel em português abre direto."""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=';', lineterminator='\r\n')
+    escritor.writerow(cabecalho)
+    yield '\ufeff'.encode('utf-8') + buffer.getvalue().encode('utf-8')
+    buffer.seek(0)
+    buffer.truncate()
+    for n, linha in enumerate(linhas, 1):
+        escritor.writerow([_texto(v) for v in linha])
+        if n % por_pedaco == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+_PARTES_FIXAS_XLSX = {
+    '[Content_Types].xml':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>',
+    '_rels/.rels':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>',
+    'xl/_rels/workbook.xml.rels':
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>',
+}
+
+
+def _celula(valor):
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return f'<c><v>{valor}</v></c>'
+    texto = escape(_INVALIDOS_XML.sub('', _texto(valor)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _linha_xlsx(valores):
+    return '<row>' + ''.join(_celula(v) for v in valores) + '</row>'
+
+
+def gerar_xlsx(cabecalho, linhas, nome_planilha='Planilha1', por_pedaco=LINHAS_POR_PEDACO):
+    """Planilha única com o cabeçalho na primeira linha."""
+    saida = SaidaStream()
+    with zipfile.ZipFile(saida, 'w', zipfile.ZIP_DEFLATED) as arquivo_zip:
+        for nome, conteudo in _PARTES_FIXAS_XLSX.items():
+            arquivo_zip.writestr(nome, conteudo)
+        arquivo_zip.writestr(
+            'xl/workbook.xml',
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(nome_planilha[:31])}" sheetId="1" r:id="rId1"/></sheets>'
+            '</workbook>')
+        yield saida.esvaziar()
+        # force_zip64: o tamanho da planilha não é conhecido antes de terminar
+        with arquivo_zip.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as planilha:
+            planilha.write(
+                ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                 '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                 '<sheetData>' + _linha_xlsx(cabecalho)).encode('utf-8'))
+            pedaco = []
+            for linha in linhas:
+                pedaco.append(_linha_xlsx(linha))
+                if len(pedaco) == por_pedaco:
+                    planilha.write(''.join(pedaco).encode('utf-8'))
+                    pedaco.clear()
+                    yield saida.esvaziar()
+            planilha.write((''.join(pedaco) + '</sheetData></worksheet>').encode('utf-8'))
+    yield saida.esvaziar()
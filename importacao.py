@@ -0,0 +1,114 @@
+"""Leitura dos arquivos de carga do WMS (CSV e XML de NF-e).
+
+Os leitores percorrem o arquivo em streaming e entregam um registro (dict)
+por volume, sem carregar o arquivo inteiro. Registros inválidos saem como
+RegistroRejeitado, para o relatório da importação. A gravação no banco fica
+em app.importar_registros().
+
+CSV (separador ';' ou ',', cabeçalho obrigatório), uma linha por volume:
+    pre_nota, num_nota, data_emissao (AAAA-MM-DD ou DD/MM/AAAA), chave_de_acesso
+    e, opcionais, tipo_caixa, matricula, quantidade, palete, codigo, cod_regiao,
+    regiao, cliente, produto, rota, numero_caixa e itens (descrições separadas por '|').
+
+XML de NF-e (nfeProc/NFe, um ou vários no mesmo arquivo), um volume por nota:
+    chave_de_acesso = Id do infNFe sem o prefixo 'NFe'; num_nota = ide/nNF;
+    pre_nota = xPed do primeiro produto (ou nNF); data_emissao = ide/dhEmi;
+    cliente = dest/xNome; cod_regiao = dest/enderDest/UF; regiao = dest/enderDest/xMun;
+    quantidade = soma de transp/vol/qVol; tipo_caixa = esp do primeiro vol;
+    produto = primeiro xProd; itens = todos os det/prod/xProd.
+"""
+import csv
+import itertools
+from datetime import datetime
+from xml.etree import ElementTree
+
+CAMPOS_VOLUME = ('tipo_caixa', 'matricula', 'quantidade', 'palete', 'codigo', 'cod_regiao',
+                 'regiao', 'cliente', 'produto', 'rota', 'numero_caixa', 'chave_de_acesso')
+CAMPOS_OBRIGATORIOS = ('pre_nota', 'num_nota', 'data_emissao', 'chave_de_acesso')
+
+NS_NFE = '{http://www.portalfiscal.inf.br/nfe}'
+
+
+class RegistroRejeitado:
+    def __init__(self, linha, motivo):
+        self.linha = linha
+        self.motivo = motivo
+
+
+def _data(texto):
+    texto = texto.strip()[:10]
+    for formato in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            pass
+    raise ValueError(f'data inválida: {texto!r}')
+
+
+def normalizar(bruto, linha):
+    """Valida e converte um registro lido; devolve dict ou RegistroRejeitado."""
+    faltando = [c for c in CAMPOS_OBRIGATORIOS if not (bruto.get(c) or '').strip()]
+    if faltando:
+        return RegistroRejeitado(linha, 'campos obrigatórios vazios: ' + ', '.join(faltando))
+    try:
+        registro = {c: (bruto.get(c) or '').strip() or None for c in CAMPOS_VOLUME}
+        registro['quantidade'] = int(registro['quantidade']) if registro['quantidade'] else None
+        registro['pre_nota'] = bruto['pre_nota'].strip()
+        registro['num_nota'] = bruto['num_nota'].strip()
+        registro['data_emissao'] = _data(bruto['data_emissao'])
+    except ValueError as erro:
+        return RegistroRejeitado(linha, str(erro))
+    registro['linha'] = linha
+    itens = bruto.get('itens') or ''
+    registro['itens'] = itens if isinstance(itens, list) else [i.strip() for i in itens.split('|') if i.strip()]
+    return registro
+
+
+def ler_csv(arquivo_texto):
+    """Registros de um CSV aberto em modo texto (pode ser um stream sem seek)."""
+    cabecalho = arquivo_texto.readline()
+    try:
+        dialeto = csv.Sniffer().sniff(cabecalho, delimiters=';,')
+    except csv.Error:
+        dialeto = csv.excel
+    leitor = csv.DictReader(itertools.chain([cabecalho], arquivo_texto), dialect=dialeto)
+    for bruto in leitor:
+        yield normalizar({(k or '').strip().lower(): v for k, v in bruto.items()}, leitor.line_num)
+
+
+def _texto(elemento, caminho):
+    encontrado = elemento.find('/'.join(NS_NFE + parte for parte in caminho.split('/')))
+    return encontrado.text.strip() if encontrado is not None and encontrado.text else None
+
+
+def ler_nfe_xml(arquivo_binario):
+    """Registros de um XML com uma ou várias NF-e; cada infNFe é descartado após lido."""
+    numero = 0
+    for evento, elemento in ElementTree.iterparse(arquivo_binario, events=('end',)):
+        if elemento.tag != NS_NFE + 'infNFe':
+            continue
+        numero += 1
+        produtos = elemento.findall(f'{NS_NFE}det/{NS_NFE}prod')
+        volumes = elemento.findall(f'{NS_NFE}transp/{NS_NFE}vol')
+        num_nota = _texto(elemento, 'ide/nNF')
+        pedido = _texto(produtos[0], 'xPed') if produtos else None
+        quantidades = [q for q in (_texto(v, 'qVol') for v in volumes) if q]
+        try:
+            quantidade = str(sum(int(float(q)) for q in quantidades)) if quantidades else None
+        except ValueError:
+            quantidade = ' '.join(quantidades)  # normalizar() rejeita com a mensagem do int()
+        bruto = {
+            'chave_de_acesso': (elemento.get('Id') or '').removeprefix('NFe'),
+            'num_nota': num_nota,
+            'pre_nota': pedido or num_nota,
+            'data_emissao': _texto(elemento, 'ide/dhEmi') or _texto(elemento, 'ide/dEmi'),
+            'cliente': _texto(elemento, 'dest/xNome'),
+            'cod_regiao': _texto(elemento, 'dest/enderDest/UF'),
+            'regiao': _texto(elemento, 'dest/enderDest/xMun'),
+            'tipo_caixa': _texto(volumes[0], 'esp') if volumes else None,
+            'quantidade': quantidade,
+            'produto': _texto(produtos[0], 'xProd') if produtos else None,
+            'itens': [d for d in (_texto(p, 'xProd') for p in produtos) if d],
+        }
+        yield normalizar(bruto, numero)
+        elemento.clear()
@@ -0,0 +1,120 @@
+"""Métricas de requisições, SQL e leituras de QR no formato texto do Prometheus.
+
+Cada worker grava de tempos em tempos um instantâneo JSON numa pasta
+compartilhada; /metrics soma os instantâneos dos workers vivos.
+"""
+import json
+import os
+import threading
+import time
+
+LIMITES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Metricas:
+    def __init__(self, limites=LIMITES_SEGUNDOS):
+        self.limites = limites
+        self._trava = threading.Lock()
+        self._contadores = {}   # (nome, rótulos) -> valor
+        self._histogramas = {}  # (nome, rótulos) -> [contagem por faixa..., soma, total]
+
+    @staticmethod
+    def _chave(nome, rotulos):
+        return nome, tuple(sorted(rotulos.items()))
+
+    def incrementar(self, nome, valor=1, **rotulos):
+        chave = self._chave(nome, rotulos)
+        with self._trava:
+            self._contadores[chave] = self._contadores.get(chave, 0) + valor
+
+    def observar(self, nome, valor, **rotulos):
+        chave = self._chave(nome, rotulos)
+        with self._trava:
+            faixas = self._histogramas.get(chave)
+            if faixas is None:
+                faixas = self._histogramas[chave] = [0] * (len(self.limites) + 2)
+            for i, limite in enumerate(self.limites):
+                if valor <= limite:
+                    faixas[i] += 1
+                    break
+            faixas[-2] += valor
+            faixas[-1] += 1
+
+    def zerar(self):
+        with self._trava:
+            self._contadores.clear()
+            self._histogramas.clear()
+
+    def instantaneo(self):
+        with self._trava:
+            return {
+                'contadores': [[n, dict(r), v] for (n, r), v in self._contadores.items()],
+                'histogramas': [[n, dict(r), list(f)] for (n, r), f in self._histogramas.items()],
+            }
+
+    def gravar(self, pasta):
+        """Grava o instantâneo deste processo em `pasta`/<pid>.json (troca atômica)."""
+        os.makedirs(pasta, exist_ok=True)
+        destino = os.path.join(pasta, f'{os.getpid()}.json')
+        temporario = destino + '.tmp'
+        with open(temporario, 'w') as arquivo:
+            json.dump(self.instantaneo(), arquivo)
+        os.replace(temporario, destino)
+
+
+def somar_instantaneos(pasta, validade_segundos):
+    """Soma os instantâneos gravados na pasta nos últimos `validade_segundos`."""
+    contadores, histogramas = {}, {}
+    limite = time.time() - validade_segundos
+    for nome_arquivo in os.listdir(pasta) if os.path.isdir(pasta) else ():
+        caminho = os.path.join(pasta, nome_arquivo)
+        if not nome_arquivo.endswith('.json') or os.path.getmtime(caminho) < limite:
+            continue
+        try:
+            with open(caminho) as arquivo:
+                dados = json.load(arquivo)
+        except (OSError, ValueError):
+            continue  # worker regravando o arquivo agora
+        for nome, rotulos, valor in dados['contadores']:
+            chave = Metricas._chave(nome, rotulos)
+            contadores[chave] = contadores.get(chave, 0) + valor
+        for nome, rotulos, faixas in dados['histogramas']:
+            chave = Metricas._chave(nome, rotulos)
+            atual = histogramas.setdefault(chave, [0] * len(faixas))
+            histogramas[chave] = [a + b for a, b in zip(atual, faixas)]
+    return contadores, histogramas
+
+
+def _rotulos(rotulos, extra=()):
+    pares = list(rotulos) + list(extra)
+    if not pares:
+        return ''
+    texto = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pares)
+    return '{' + texto + '}'
+
+
+def _numero(valor):
+    """Valor de amostra sem perder precisão: '{:g}' corta em 6 dígitos (1234567 -> 1.23457e+06)."""
+    return repr(valor) if isinstance(valor, float) else str(int(valor))
+
+
+def formatar_prometheus(contadores, histogramas, descricoes, limites=LIMITES_SEGUNDOS):
+    linhas = []
+    for tipo, series in (('counter', contadores), ('histogram', histogramas)):
+        for nome in sorted({n for n, _ in series}):
+            linhas.append(f'# HELP {nome} {descricoes.get(nome, nome)}')
+            linhas.append(f'# TYPE {nome} {tipo}')
+            for (n, rotulos), valor in sorted(series.items()):
+                if n != nome:
+                    continue
+                if tipo == 'counter':
+                    linhas.append(f'{nome}{_rotulos(rotulos)} {_numero(valor)}')
+                    continue
+                acumulado = 0
+                for limite, contagem in zip(limites, valor):
+                    acumulado += contagem
+                    linhas.append(f'{nome}_bucket{_rotulos(rotulos, [("le", f"{limite:g}")])} {acumulado}')
+                linhas.append(f'{nome}_bucket{_rotulos(rotulos, [("le", "+Inf")])} {valor[-1]}')
+                linhas.append(f'{nome}_sum{_rotulos(rotulos)} {_numero(valor[-2])}')
+                linhas.append(f'{nome}_count{_rotulos(rotulos)} {valor[-1]}')
+    return '\n'.join(linhas) + '\n'
@@ -0,0 +1,60 @@
+"""Geração dos PDFs de romaneio.
+
+Fica fora do app.py para que os processos de renderização em paralelo
+(gerar_pdf_lote) importem só o FPDF, sem Flask nem banco. As funções recebem
+o romaneio já convertido em dicionário por app.dados_pdf_romaneio().
+"""
+from fpdf import FPDF
+
+
+def pdf_romaneio(dados):
+    """PDF simples de um romaneio (rota /pdf/<id>). Retorna os bytes."""
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+    pdf.cell(200, 10, txt=f"Romaneio Pré-Nota: {dados['pre_nota']}", ln=True)
+    pdf.cell(200, 10, txt=f"Nota Fiscal: {dados['num_nota']}", ln=True)
+    pdf.cell(200, 10, txt=f"Data de Emissão: {dados['data_emissao']}", ln=True)
+    pdf.cell(200, 10, txt="Volumes:", ln=True)
+    for tipo_caixa, matricula, quantidade, status in dados['volumes']:
+        pdf.cell(200, 10, txt=f" - {tipo_caixa} ({matricula}) - Quantidade: {quantidade} - Status: {status}", ln=True)
+
+    return pdf.output(dest='S').encode('latin1')  # gera PDF em bytes
+
+
+def pdf_romaneio_lote(dados):
+    """PDF com tabela de volumes usado no ZIP do lote. Retorna (nome, bytes)."""
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+
+    # Cabeçalho
+    pdf.set_font("Arial", 'B', 14)
+    pdf.cell(200, 10, txt=f"Romaneio: {dados['pre_nota']}", ln=True)
+    pdf.set_font("Arial", size=12)
+    pdf.cell(200, 10, txt=f"Nota Fiscal: {dados['num_nota']}", ln=True)
+    pdf.cell(200, 10, txt=f"Data de Emissão: {dados['data_emissao']}", ln=True)
+    pdf.cell(200, 10, txt=f"Status Geral: {dados['status']}", ln=True)
+    pdf.ln(10)
+
+    # Tabela de volumes
+    pdf.set_font("Arial", 'B', 12)
+    pdf.cell(50, 10, "Tipo de Caixa", 1)
+    pdf.cell(50, 10, "Matrícula", 1)
+    pdf.cell(40, 10, "Quantidade", 1)
+    pdf.cell(40, 10, "Status", 1)
+    pdf.ln()
+
+    pdf.set_font("Arial", size=11)
+    for tipo_caixa, matricula, quantidade, status in dados['volumes']:
+        pdf.cell(50, 10, tipo_caixa, 1)
+        pdf.cell(50, 10, matricula, 1)
+        pdf.cell(40, 10, str(quantidade), 1)
+        pdf.cell(40, 10, status, 1)
+        pdf.ln()
+
+    return nome_pdf_lote(dados), pdf.output(dest='S').encode('latin-1')
+
+
+def nome_pdf_lote(dados):
+    return f"romaneio_{dados['pre_nota'] or dados['id']}.pdf"
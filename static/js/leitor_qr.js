@@ -0,0 +1,61 @@
+// Leitor de QR da conferência: vídeo da câmera num elemento da página e o
+// BarcodeDetector do navegador (Chrome e Edge, inclusive no Android) procurando
+// QR codes em cada quadro. Não depende de biblioteca de fora.
+class LeitorQr {
+  constructor(idElemento) {
+    this.elemento = document.getElementById(idElemento);
+    this.video = null;
+    this.temporizador = null;
+  }
+
+  static disponivel() {
+    return 'BarcodeDetector' in window && !!navigator.mediaDevices;
+  }
+
+  // Câmeras de vídeo como [{id, label}]. Os nomes só vêm depois de o usuário
+  // liberar a câmera, então pede acesso uma vez antes de listar.
+  static async cameras() {
+    const fluxo = await navigator.mediaDevices.getUserMedia({ video: true });
+    fluxo.getTracks().forEach(trilha => trilha.stop());
+    const dispositivos = await navigator.mediaDevices.enumerateDevices();
+    return dispositivos
+      .filter(d => d.kind === 'videoinput')
+      .map(d => ({ id: d.deviceId, label: d.label }));
+  }
+
+  // Começa a ler; aoLer recebe o texto de cada QR encontrado (o mesmo QR
+  // aparece em vários quadros seguidos: quem chama descarta as repetições).
+  async iniciar(cameraId, aoLer, { fps = 15 } = {}) {
+    const formatos = await BarcodeDetector.getSupportedFormats();
+    if (!formatos.includes('qr_code')) throw new Error('BarcodeDetector sem suporte a QR code');
+    const detector = new BarcodeDetector({ formats: ['qr_code'] });
+
+    this.video = document.createElement('video');
+    this.video.muted = true;
+    this.video.playsInline = true;
+    this.video.srcObject = await navigator.mediaDevices.getUserMedia({
+      video: cameraId ? { deviceId: { exact: cameraId } } : { facingMode: 'environment' },
+    });
+    this.elemento.appendChild(this.video);
+    await this.video.play();
+
+    const procurar = async () => {
+      if (!this.video) return;
+      try {
+        for (const codigo of await detector.detect(this.video)) aoLer(codigo.rawValue);
+      } catch (erro) {
+        // quadro ainda sem imagem (câmera iniciando): tenta no próximo
+      }
+      if (this.video) this.temporizador = setTimeout(procurar, 1000 / fps);
+    };
+    procurar();
+  }
+
+  async parar() {
+    clearTimeout(this.temporizador);
+    if (!this.video) return;
+    this.video.srcObject.getTracks().forEach(trilha => trilha.stop());
+    this.video.remove();
+    this.video = null;
+  }
+}
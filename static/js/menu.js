@@ -0,0 +1,52 @@
+function selecionarTodos() {
+  const checkboxes = document.querySelectorAll('.checkbox-romaneio');
+  const todosMarcados = Array.from(checkboxes).every(cb => cb.checked);
+  checkboxes.forEach(cb => cb.checked = !todosMarcados);
+  atualizarBotaoPDF();
+}
+
+function atualizarBotaoPDF() {
+  const checkboxes = document.querySelectorAll('.checkbox-romaneio:checked');
+  const botaoPDF = document.getElementById('gerarPdfLote');
+  botaoPDF.style.display = checkboxes.length > 0 ? 'inline-block' : 'none';
+}
+
+function gerarPDFs() {
+  const selecionados = Array.from(document.querySelectorAll('.checkbox-romaneio:checked'))
+    .map(cb => cb.value);
+
+  if (selecionados.length === 0) return;
+
+  // Redirecionar para rota de geração em lote com IDs como query string
+  const query = selecionados.map(id => 'ids=' + encodeURIComponent(id)).join('&');
+  window.location.href = `/gerar_pdf_lote?${query}`;
+}
+
+// registra já no menu, para os arquivos da conferência estarem guardados antes de ela abrir
+if ('serviceWorker' in navigator) navigator.serviceWorker.register('/sw.js');
+
+// Ao sair, o service worker apaga as páginas e volumes guardados para uso offline
+// antes de a sessão acabar. A fila de leituras (localStorage) fica: são leituras
+// ainda não enviadas.
+const ESPERA_LIMPEZA_MS = 2000;
+
+function limparPaginasGuardadas(sw) {
+  return new Promise(resolve => {
+    const canal = new MessageChannel();
+    canal.port1.onmessage = () => resolve();
+    setTimeout(resolve, ESPERA_LIMPEZA_MS);  // sem resposta do service worker, sai assim mesmo
+    sw.postMessage({ tipo: 'limpar-paginas' }, [canal.port2]);
+  });
+}
+
+// o script vem antes do link "Sair" na página
+document.addEventListener('DOMContentLoaded', () => {
+  document.getElementById('sair').addEventListener('click', async evento => {
+    const sw = 'serviceWorker' in navigator && navigator.serviceWorker.controller;
+    if (!sw) return;
+    evento.preventDefault();
+    const destino = evento.currentTarget.href;
+    await limparPaginasGuardadas(sw);
+    window.location.href = destino;
+  });
+});
@@ -0,0 +1,339 @@
+const romaneioId = Number(document.body.dataset.romaneioId);
+let ultimoEvento = Number(document.body.dataset.ultimoEvento);
+let volumesLidos = new Set();
+let leitor;
+let leituraAtiva = false;
+
+// Leituras ficam numa fila local (sobrevive a queda de rede e recarga da página)
+// e são enviadas em lote para /validar_volume/lote.
+const TAMANHO_LOTE = 50;
+const INTERVALO_LOTE_MS = 1000;
+const chaveFila = 'fila_leituras_' + romaneioId;
+let filaLeituras = JSON.parse(localStorage.getItem(chaveFila) || '[]');
+// Promessa do envio em andamento (null se nenhum): quem precisa da fila vazia
+// espera por ela em vez de mandar o mesmo lote de novo.
+let envioLote = null;
+
+// O leitor decodifica a mesma etiqueta várias vezes por segundo enquanto ela
+// está na frente da câmera: a mesma leitura dentro de JANELA_REPETIDA_MS da
+// anterior é descartada (cada repetição renova a janela).
+const JANELA_REPETIDA_MS = 2000;
+const ultimasLeituras = new Map();
+
+// Revisão dos volumes já refletida na tabela; as próximas cargas pedem só o que
+// mudou depois dela (?since=), e não o caminhão inteiro.
+let revisaoVolumes = 0;
+// Itens de cada volume, vindos junto na carga completa (?itens=1): "Ver Itens"
+// não vai ao servidor.
+let itensPorVolume = new Map();
+
+async function carregarVolumes() {
+  const res = await fetch(`/api/volumes/${romaneioId}?since=${revisaoVolumes}&itens=1`);
+  if (!res.ok) return;
+  const data = await res.json();
+  const tabela = document.getElementById('volumes_tbody');
+  if (data.completo) {
+    tabela.innerHTML = '';
+    itensPorVolume = new Map(data.volumes.map(v => [v.id, v.itens]));
+  }
+  for (let v of data.volumes) {
+    if (!data.completo && document.getElementById(`volume-${v.id}`)) {
+      aplicarStatusVolume(v.id, v.status);
+      continue;
+    }
+    let tr = document.createElement('tr');
+    tr.id = `volume-${v.id}`;
+    tr.className = '';
+    if (v.status === 'confirmado') tr.classList.add('confirmado');
+    else if (v.status === 'faltante') tr.classList.add('faltante');
+
+    tr.innerHTML = `
+      <td>${v.tipo_caixa}</td>
+      <td>${v.matricula}</td>
+      <td>${v.quantidade}</td>
+      <td id="status-${v.id}">${v.status}</td>
+      <td><button onclick="verItens(${v.id})">Ver Itens</button></td>
+    `;
+    tabela.appendChild(tr);
+  }
+  revisaoVolumes = data.revisao;
+  atualizarProgresso();
+}
+
+async function atualizarProgresso() {
+  const res = await fetch('/progresso/' + romaneioId);
+  const data = await res.json();
+  mostrarProgresso(data.conferidos, data.total);
+}
+
+function mostrarProgresso(conferidos, total) {
+  const prog = total > 0 ? Math.round(conferidos / total * 100) : 0;
+  document.getElementById('barra_progresso').value = prog;
+  document.getElementById('txt_progresso').innerText = prog + '%';
+  document.getElementById('btn_falta').style.display = prog < 100 ? 'inline-block' : 'none';
+}
+
+function aplicarStatusVolume(volumeId, status) {
+  const tr = document.getElementById(`volume-${volumeId}`);
+  if (!tr) return;
+  document.getElementById(`status-${volumeId}`).innerText = status;
+  tr.classList.remove('confirmado', 'faltante');
+  if (status === 'confirmado' || status === 'faltante') tr.classList.add(status);
+}
+
+// Mudanças feitas por qualquer conferente chegam por SSE; cada evento traz o
+// status do volume e os contadores já atualizados.
+// Se o servidor recusar o stream (503: streams demais abertos no worker), a
+// página consulta /api/volumes a cada INTERVALO_CONSULTA_MS e tenta o SSE de
+// novo depois de NOVA_TENTATIVA_EVENTOS_MS.
+const INTERVALO_CONSULTA_MS = 5000;
+const NOVA_TENTATIVA_EVENTOS_MS = 60000;
+
+function acompanharEventos() {
+  const eventos = new EventSource(`/eventos/${romaneioId}?desde=${ultimoEvento}`);
+  eventos.addEventListener('volume', e => {
+    const d = JSON.parse(e.data);
+    ultimoEvento = Number(e.lastEventId);
+    aplicarStatusVolume(d.volume_id, d.status);
+    mostrarProgresso(d.confirmados, d.total);
+  });
+  eventos.addEventListener('romaneio', e => {
+    const d = JSON.parse(e.data);
+    ultimoEvento = Number(e.lastEventId);
+    mostrarProgresso(d.confirmados, d.total);
+  });
+  eventos.addEventListener('error', () => {
+    // queda de rede deixa o EventSource reconectando; resposta de erro o fecha de vez
+    if (eventos.readyState === EventSource.CLOSED) acompanharPorConsulta();
+  });
+}
+
+function acompanharPorConsulta() {
+  const consulta = setInterval(carregarVolumes, INTERVALO_CONSULTA_MS);
+  setTimeout(() => {
+    clearInterval(consulta);
+    acompanharEventos();
+  }, NOVA_TENTATIVA_EVENTOS_MS);
+}
+
+async function verItens(volume_id) {
+  let itens = itensPorVolume.get(volume_id);
+  if (!itens) {
+    const res = await fetch('/api/itens/' + volume_id);
+    itens = await res.json();
+    itensPorVolume.set(volume_id, itens);
+  }
+  alert('Itens no volume:\n' + itens.map(i => i.descricao).join('\n'));
+}
+
+async function iniciarLeitor() {
+  const cameraId = document.getElementById('cameraSelect').value;
+  const container = document.getElementById('qr-reader-container');
+  container.style.display = 'flex';
+
+  if (leituraAtiva) return;
+
+  leitor = new LeitorQr("qr-reader");
+
+  try {
+    await leitor.iniciar(cameraId, qrCodeMessage => validarVolume(qrCodeMessage), { fps: 15 });
+
+    leituraAtiva = true;
+    document.getElementById('btn_parar').style.display = 'inline-block';
+
+  } catch (err) {
+    console.error("Erro ao iniciar leitor:", err);
+    leitor.parar();
+    alert("Erro ao iniciar a câmera. Tente novamente ou escolha outra.");
+  }
+}
+
+function pararLeitor() {
+  if (leitor && leituraAtiva) {
+    leitor.parar().then(() => {
+      leituraAtiva = false;
+      document.getElementById('qr-reader-container').style.display = 'none';
+      document.getElementById('btn_iniciar').disabled = false;
+      document.getElementById('btn_parar').style.display = 'none';
+    });
+  }
+}
+
+function salvarFila() {
+  localStorage.setItem(chaveFila, JSON.stringify(filaLeituras));
+  mostrarEnvio();
+}
+
+// Situação da fila na tela: leituras ainda não enviadas e o último erro de envio.
+function mostrarEnvio(erro) {
+  const aviso = document.getElementById('envio_leituras');
+  if (!aviso) return;
+  if (erro) {
+    aviso.textContent = `${erro} (${filaLeituras.length} leitura(s) aguardando envio)`;
+    aviso.classList.add('erro');
+  } else {
+    aviso.textContent = filaLeituras.length ? `${filaLeituras.length} leitura(s) aguardando envio` : '';
+    aviso.classList.remove('erro');
+  }
+}
+
+function leituraRepetida(qrCodeMessage) {
+  const agora = Date.now();
+  const anterior = ultimasLeituras.get(qrCodeMessage);
+  ultimasLeituras.set(qrCodeMessage, agora);
+  for (const [chave, momento] of ultimasLeituras) {
+    if (agora - momento > JANELA_REPETIDA_MS) ultimasLeituras.delete(chave);
+  }
+  return anterior !== undefined && agora - anterior <= JANELA_REPETIDA_MS;
+}
+
+function validarVolume(qrCodeMessage) {
+  if (leituraRepetida(qrCodeMessage)) return;
+  filaLeituras.push(qrCodeMessage);
+  salvarFila();
+  if (filaLeituras.length >= TAMANHO_LOTE) enviarLote();
+}
+
+// Envia o próximo lote da fila; devolve true se o servidor o processou. Com um
+// envio já em andamento, devolve a promessa dele.
+function enviarLote() {
+  if (envioLote) return envioLote;
+  if (filaLeituras.length === 0) return Promise.resolve(true);
+  if (!navigator.onLine) {
+    mostrarEnvio('Sem conexão');
+    return Promise.resolve(false);
+  }
+  envioLote = enviarProximoLote().finally(() => { envioLote = null; });
+  return envioLote;
+}
+
+async function enviarProximoLote() {
+  const lote = filaLeituras.slice(0, TAMANHO_LOTE);
+  let res;
+  try {
+    res = await fetch('/validar_volume/lote', {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json'
+      },
+      body: JSON.stringify({ chaves: lote })
+    });
+  } catch (err) {
+    // sem conexão: as leituras continuam na fila para a próxima tentativa
+    console.error("Erro na validação em lote:", err);
+    mostrarEnvio('Sem conexão com o servidor');
+    return false;
+  }
+
+  const data = await res.json().catch(() => ({}));
+  if (res.status === 401) {
+    // a fila fica no navegador: é enviada quando a página abrir de novo, já logado
+    mostrarEnvio('Sessão expirada');
+    alert("Sua sessão expirou. Entre de novo para enviar as leituras pendentes.");
+    window.location.href = '/';
+    return false;
+  }
+  if (!res.ok) {
+    console.error("Erro no envio do lote:", res.status, data.erro);
+    mostrarEnvio(`Erro do servidor ao enviar leituras: ${data.erro || res.status}`);
+    return false;
+  }
+
+  // só sai da fila o que o servidor processou
+  filaLeituras.splice(0, lote.length);
+  salvarFila();
+
+  const erros = [];
+  for (const r of data.resultados) {
+    if (r.resultado === 'confirmado') {
+      aplicarStatusVolume(r.volume_id, 'confirmado');
+    } else if (r.resultado === 'nao_encontrado') {
+      erros.push(r.chave);
+    }
+  }
+  if (erros.length) alert("Volume não encontrado:\n" + erros.join('\n'));
+  return true;
+}
+
+// Envia lote após lote até a fila esvaziar; false se algum envio falhar.
+async function esvaziarFila() {
+  // o lote em andamento só sai da fila quando o servidor responde, então fila
+  // vazia quer dizer tudo enviado
+  while (filaLeituras.length) {
+    if (!await enviarLote()) return false;
+  }
+  return true;
+}
+
+setInterval(enviarLote, INTERVALO_LOTE_MS);
+window.addEventListener('online', enviarLote);
+// ao reconectar, traz o que os outros conferentes mudaram enquanto estava fora
+window.addEventListener('online', carregarVolumes);
+
+async function reportarFaltantes() {
+  const res = await fetch('/faltantes/' + romaneioId);
+  const json = await res.json();
+  const nomes = json.faltantes.map(v => `Caixa: ${v.tipo_caixa}, Matrícula: ${v.matricula}`).join('\n');
+  alert("Volumes faltantes:\n" + nomes);
+}
+
+async function finalizarConferencia() {
+  if (!confirm('Tem certeza que deseja finalizar a conferência?')) return;
+  pararLeitor();
+  if (!await esvaziarFila()) {
+    alert(`Ainda há ${filaLeituras.length} leitura(s) não enviada(s) ao servidor. ` +
+          "Verifique a conexão e tente finalizar de novo.");
+    return;
+  }
+
+  const response = await fetch('/finalizar_conferencia', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ romaneio_id: romaneioId })
+  });
+
+  const data = await response.json();
+
+  if (response.ok) {
+    alert(`Conferência finalizada com ${data.conferidos} de ${data.total} volumes.\nStatus do romaneio: ${data.status_romaneio}`);
+    mostrarProgresso(data.conferidos, data.total);
+    carregarVolumes();
+  } else {
+    alert("Erro ao finalizar conferência: " + (data.erro || "Erro desconhecido"));
+  }
+}
+async function listarCameras() {
+  const select = document.getElementById('cameraSelect');
+  if (!LeitorQr.disponivel()) {
+    select.innerHTML = '<option>Este navegador não lê QR code (use Chrome ou Edge)</option>';
+    return;
+  }
+  try {
+    const devices = await LeitorQr.cameras();
+    if (devices && devices.length) {
+      select.innerHTML = '';
+      devices.forEach(device => {
+        const option = document.createElement('option');
+        option.value = device.id;
+        option.text = device.label || `Câmera ${select.length + 1}`;
+        select.appendChild(option);
+      });
+    } else {
+      select.innerHTML = '<option>Nenhuma câmera encontrada</option>';
+    }
+  } catch (err) {
+    console.error("Erro ao listar câmeras:", err);
+    select.innerHTML = '<option>Erro ao acessar câmeras</option>';
+  }
+}
+
+window.onload = async () => {
+  mostrarEnvio();
+  await carregarVolumes();
+  acompanharEventos();
+  listarCameras();
+};
+
+// O service worker guarda esta página, os arquivos estáticos e a última carga dos
+// volumes, para a conferência abrir mesmo sem rede.
+if ('serviceWorker' in navigator) navigator.serviceWorker.register('/sw.js');
@@ -0,0 +1,61 @@
+// Service worker da conferência. Os arquivos de static/dist (nomes versionados,
+// nunca mudam) vêm do cache; as páginas e APIs da conferência vêm da rede e, sem
+// rede, da última resposta guardada, para a página do romaneio abrir offline.
+// As leituras feitas offline já ficam na fila local da página (localStorage).
+const VERSAO = {{ versao|tojson }};
+const ARQUIVOS = {{ arquivos|tojson }};
+const CACHE_ARQUIVOS = 'estaticos-' + VERSAO;
+const CACHE_PAGINAS = 'paginas';
+const ROTAS_OFFLINE = /^\/(romaneio|api\/volumes|progresso)\//;
+
+self.addEventListener('install', evento => {
+  evento.waitUntil(
+    caches.open(CACHE_ARQUIVOS)
+      // um arquivo que falhar não impede a instalação; ele é buscado de novo no uso
+      .then(cache => Promise.all(ARQUIVOS.map(url => cache.add(url).catch(() => null))))
+      .then(() => self.skipWaiting())
+  );
+});
+
+self.addEventListener('activate', evento => {
+  evento.waitUntil(
+    caches.keys()
+      .then(nomes => Promise.all(nomes
+        .filter(nome => nome.startsWith('estaticos-') && nome !== CACHE_ARQUIVOS)
+        .map(nome => caches.delete(nome))))
+      .then(() => self.clients.claim())
+  );
+});
+
+self.addEventListener('fetch', evento => {
+  const pedido = evento.request;
+  if (pedido.method !== 'GET') return;
+  const url = new URL(pedido.url);
+  if (ARQUIVOS.includes(url.pathname) || ARQUIVOS.includes(url.href)) {
+    evento.respondWith(caches.match(pedido).then(guardada => guardada || fetch(pedido)));
+  } else if (url.origin === self.location.origin && ROTAS_OFFLINE.test(url.pathname)) {
+    evento.respondWith(redeOuCopia(pedido));
+  }
+});
+
+// Pedido do menu.js ao sair: as cópias guardadas são da sessão que está acabando.
+self.addEventListener('message', evento => {
+  if (!evento.data || evento.data.tipo !== 'limpar-paginas') return;
+  evento.waitUntil(caches.delete(CACHE_PAGINAS).then(() => {
+    if (evento.ports[0]) evento.ports[0].postMessage('ok');
+  }));
+});
+
+async function redeOuCopia(pedido) {
+  const cache = await caches.open(CACHE_PAGINAS);
+  try {
+    const resposta = await fetch(pedido);
+    // sessão expirada redireciona para o login: isso não substitui a cópia guardada
+    if (resposta.ok && !resposta.redirected) cache.put(pedido, resposta.clone());
+    return resposta;
+  } catch (erro) {
+    const guardada = await cache.match(pedido);
+    if (guardada) return guardada;
+    throw erro;
+  }
+}
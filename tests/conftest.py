@@ -0,0 +1,96 @@
+"""Fixtures dos testes: cada teste roda num banco SQLite novo, num diretório temporário.
+
+O app lê DATABASE_URL ao ser importado, então o banco de teste é configurado
+antes do import; entre um teste e outro os arquivos são apagados e os caches
+do processo (dimensões, índice de leitura, leituras recentes) esvaziados.
+"""
+import os
+import sys
+import tempfile
+from datetime import date
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASTA = tempfile.mkdtemp(prefix='testes_romaneio_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(PASTA, 'teste.db')
+sys.path.insert(0, RAIZ)
+
+import app as modulo_app  # noqa: E402  (depende do DATABASE_URL acima)
+
+modulo_app.PASTA_METRICAS = os.path.join(PASTA, 'metricas')
+modulo_app.cache_pdf = modulo_app.CachePdf(os.path.join(PASTA, 'cache_pdf'), max_itens_memoria=8,
+                                           max_bytes_disco=16 * 1024 * 1024)
+
+
+def _apagar_banco():
+    with modulo_app.app.app_context():
+        modulo_app.db.session.remove()
+        modulo_app.db.engine.dispose()
+    for nome in os.listdir(PASTA):
+        if nome.startswith('teste'):
+            os.remove(os.path.join(PASTA, nome))
+    for dimensao in modulo_app.dimensoes.values():
+        dimensao._por_id.clear()
+        dimensao._por_valor.clear()
+    modulo_app._indices_leitura.clear()
+    modulo_app.leituras_recentes._leituras.clear()
+    modulo_app._busca_disponivel[0] = None
+
+
+@pytest.fixture
+def banco_vazio():
+    """Contexto do app sobre um banco sem nenhuma tabela."""
+    _apagar_banco()
+    with modulo_app.app.app_context():
+        yield modulo_app
+        modulo_app.db.session.remove()
+
+
+@pytest.fixture
+def m(banco_vazio):
+    """O módulo app, dentro de um contexto, com o banco novo já migrado."""
+    banco_vazio.migrar_banco()
+    return banco_vazio
+
+
+@pytest.fixture
+def nova_transportadora(m):
+    """Cria transportadora e usuário e devolve (transportadora_id, test client já logado)."""
+    def criar(nome, cnpj, senha='senha'):
+        transportadora = m.Transportadora(nome=nome)
+        usuario = m.Usuario(cnpj=cnpj, transportadora=transportadora)
+        usuario.set_senha(senha)
+        m.db.session.add_all([transportadora, usuario])
+        m.db.session.commit()
+        cliente = m.app.test_client()
+        cliente.post('/', data={'cnpj': cnpj, 'senha': senha})
+        return transportadora.id, cliente
+    return criar
+
+
+@pytest.fixture
+def transportadora(nova_transportadora):
+    return nova_transportadora('Transportadora A', '11111111000111')
+
+
+@pytest.fixture
+def criar_romaneio(m):
+    """Cria um romaneio com `volumes` volumes pendentes (chaves '<pre_nota>-<n>') e devolve o id."""
+    def criar(transportadora_id, pre_nota, volumes=2, status='pendente', data_emissao=None,
+              cliente='CLIENTE PADRAO', itens=()):
+        # objetos montados antes de qualquer flush: criar as dimensões usa outra conexão
+        romaneio = m.Romaneio(pre_nota=pre_nota, num_nota='NF' + pre_nota, status=status,
+                              data_emissao=data_emissao or date.today(), transportadora_id=transportadora_id)
+        for n in range(volumes):
+            volume = m.Volume(romaneio=romaneio, pre_nota=pre_nota, chave_de_acesso=f'{pre_nota}-{n}',
+                              status='confirmado' if status == 'finalizado' else 'pendente',
+                              tipo_caixa='Caixa', matricula=f'M{n}', quantidade=1, cliente=cliente,
+                              regiao='CENTRO', cod_regiao='01', produto='PRODUTO', rota='R1')
+            for descricao in itens:
+                m.Item(volume=volume, descricao=descricao, cliente=cliente)
+        m.db.session.add(romaneio)
+        m.db.session.commit()
+        m.reconciliar_contadores({romaneio.id})
+        return romaneio.id
+    return criar
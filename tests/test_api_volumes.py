@@ -0,0 +1,88 @@
+"""APIs da página de conferência: revalidação por ETag e compressão."""
+import gzip
+import json
+
+
+def test_etag_da_revisao_responde_304(m, transportadora, criar_romaneio):
+    transportadora_id, cliente = transportadora
+    romaneio_id = criar_romaneio(transportadora_id, '1000001')
+
+    primeira = cliente.get(f'/progresso/{romaneio_id}')
+    etag = primeira.headers['ETag']
+    repetida = cliente.get(f'/progresso/{romaneio_id}', headers={'If-None-Match': etag})
+
+    assert primeira.status_code == 200 and etag.startswith('W/"')
+    assert repetida.status_code == 304 and repetida.data == b''
+
+
+def test_mudanca_de_status_gera_novo_etag(m, transportadora, criar_romaneio):
+    transportadora_id, cliente = transportadora
+    romaneio_id = criar_romaneio(transportadora_id, '1000001')
+    etag = cliente.get(f'/api/volumes/{romaneio_id}').headers['ETag']
+    volume_id = m.Volume.query.filter_by(romaneio_id=romaneio_id).first().id
+
+    m.alterar_status_volume(volume_id, romaneio_id, 'confirmado')
+    m.db.session.commit()
+    resposta = cliente.get(f'/api/volumes/{romaneio_id}', headers={'If-None-Match': etag})
+
+    assert resposta.status_code == 200 and resposta.headers['ETag'] != etag
+    assert [v['status'] for v in resposta.get_json() if v['id'] == volume_id] == ['confirmado']
+
+
+def test_gzip_so_quando_o_cliente_aceita(m, transportadora, criar_romaneio):
+    transportadora_id, cliente = transportadora
+    romaneio_id = criar_romaneio(transportadora_id, '1000001', volumes=30)  # corpo acima de 1 KB
+
+    sem_gzip = cliente.get(f'/api/volumes/{romaneio_id}')
+    com_gzip = cliente.get(f'/api/volumes/{romaneio_id}', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in sem_gzip.headers and len(sem_gzip.get_json()) == 30
+    assert com_gzip.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(com_gzip.data)) == sem_gzip.get_json()
+    assert 'Accept-Encoding' in com_gzip.headers['Vary']
+    pequena = cliente.get(f'/progresso/{romaneio_id}', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in pequena.headers  # abaixo de TAMANHO_MINIMO_GZIP
+
+
+def test_since_traz_so_os_volumes_alterados_depois_da_revisao(m, transportadora, criar_romaneio):
+    transportadora_id, cliente = transportadora
+    romaneio_id = criar_romaneio(transportadora_id, '1000001', volumes=3)
+    completa = cliente.get(f'/api/volumes/{romaneio_id}?since=0').get_json()
+
+    cliente.post('/validar_volume', json={'chave': '1000001-1'})
+    delta = cliente.get(f'/api/volumes/{romaneio_id}?since={completa["revisao"]}').get_json()
+    sem_mudanca = cliente.get(f'/api/volumes/{romaneio_id}?since={delta["revisao"]}').get_json()
+
+    assert completa['completo'] and len(completa['volumes']) == 3
+    assert not delta['completo'] and delta['revisao'] > completa['revisao']
+    assert [(v['matricula'], v['status']) for v in delta['volumes']] == [('M1', 'confirmado')]
+    assert sem_mudanca == {'revisao': delta['revisao'], 'completo': False, 'volumes': []}
+
+
+def test_romaneio_inexistente_ou_de_outra_transportadora(m, transportadora, nova_transportadora, criar_romaneio):
+    _, cliente = transportadora
+    outra_id, _ = nova_transportadora('Transportadora B', '22222222000122')
+    alheio = criar_romaneio(outra_id, '1000001')
+
+    assert cliente.get(f'/api/volumes/{alheio + 100}?since=0').status_code == 404
+    assert cliente.get(f'/api/volumes/{alheio}?since=0').status_code == 403
+
+
+def test_itens_vem_junto_so_na_carga_completa(m, transportadora, criar_romaneio):
+    transportadora_id, cliente = transportadora
+    romaneio_id = criar_romaneio(transportadora_id, '1000001', itens=['ARROZ 5KG', 'FEIJAO 1KG'])
+    extra = m.Volume.query.filter_by(chave_de_acesso='1000001-1').one()
+    m.db.session.add(m.Item(volume=extra, descricao='OLEO 900ML'))
+    m.db.session.commit()
+
+    volumes = {v['matricula']: v for v in cliente.get(f'/api/volumes/{romaneio_id}?itens=1').get_json()}
+    delta = cliente.get(f'/api/volumes/{romaneio_id}?itens=1&since=0').get_json()
+    cliente.post('/validar_volume', json={'chave': '1000001-0'})
+    depois = cliente.get(f'/api/volumes/{romaneio_id}?itens=1&since={delta["revisao"]}').get_json()
+
+    assert volumes['M0']['itens'] == [{'descricao': 'ARROZ 5KG'}, {'descricao': 'FEIJAO 1KG'}]
+    assert sorted(i['descricao'] for i in volumes['M1']['itens']) == ['ARROZ 5KG', 'FEIJAO 1KG', 'OLEO 900ML']
+    assert volumes['M1']['itens'] == cliente.get(f'/api/itens/{extra.id}').get_json()
+    assert all('itens' in v for v in delta['volumes'])
+    assert [v['matricula'] for v in depois['volumes']] == ['M0'] and 'itens' not in depois['volumes'][0]
+    assert all('itens' not in v for v in cliente.get(f'/api/volumes/{romaneio_id}').get_json())
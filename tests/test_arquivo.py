@@ -0,0 +1,88 @@
+"""Arquivamento: finalizados antigos vão para o banco de arquivo e continuam consultáveis."""
+from datetime import date, timedelta
+
+import pytest
+
+ANTIGA = date.today() - timedelta(days=200)
+
+
+@pytest.fixture
+def arquivado(m, transportadora, criar_romaneio):
+    """Um romaneio finalizado antigo já arquivado; devolve (transportadora_id, cliente, romaneio_id)."""
+    transportadora_id, cliente = transportadora
+    romaneio_id = criar_romaneio(transportadora_id, '1000001', volumes=2, status='finalizado',
+                                 data_emissao=ANTIGA, cliente='MERCADO AZUL', itens=['ARRUELA LISA'])
+    criar_romaneio(transportadora_id, '1000002', itens=['PREGO'])  # dono dos maiores ids: fica no principal
+    assert m.arquivar_romaneios(dias=90) == 1
+    return transportadora_id, cliente, romaneio_id
+
+
+def test_romaneio_sai_do_principal_com_volumes_e_itens(m, arquivado):
+    transportadora_id, _, romaneio_id = arquivado
+
+    assert m.db.session.get(m.Romaneio, romaneio_id) is None
+    assert m.Volume.query.filter_by(romaneio_id=romaneio_id).count() == 0
+    assert m.Item.query.filter_by(descricao='ARRUELA LISA').count() == 0
+    romaneio = m.db.session.get(m.RomaneioArquivado, romaneio_id)
+    assert romaneio.pre_nota == '1000001' and romaneio.arquivado
+    assert {v.cliente for v in romaneio.volumes} == {'MERCADO AZUL'}
+    assert m.ItemArquivado.query.count() == 2
+    assert m.db.session.get(m.Transportadora, transportadora_id).arquivado_ate == ANTIGA
+
+
+def test_arquivar_de_novo_nao_move_nada(m, arquivado):
+    assert m.arquivar_romaneios(dias=90) == 0
+
+
+def test_pendentes_e_recentes_ficam_no_principal(m, transportadora, criar_romaneio):
+    transportadora_id, _ = transportadora
+    pendente = criar_romaneio(transportadora_id, '1000001', data_emissao=ANTIGA)
+    recente = criar_romaneio(transportadora_id, '1000002', status='finalizado')
+    criar_romaneio(transportadora_id, '1000003')
+
+    assert m.arquivar_romaneios(dias=90) == 0
+    assert m.db.session.get(m.Romaneio, pendente) and m.db.session.get(m.Romaneio, recente)
+
+
+def test_menu_e_busca_mostram_o_arquivado(arquivado):
+    _, cliente, romaneio_id = arquivado
+
+    menu = cliente.get(f'/menu?data_inicio={ANTIGA.isoformat()}')
+    assert menu.status_code == 200 and b'1000001' in menu.data
+    busca = cliente.get('/api/busca?q=ARRUELA').get_json()
+    assert [r['id'] for r in busca['romaneios']] == [romaneio_id]
+
+
+def test_menu_so_com_periodo_recente_nao_lista_o_arquivado(arquivado):
+    _, cliente, _ = arquivado
+
+    menu = cliente.get(f'/menu?data_inicio={date.today().isoformat()}')
+    assert b'1000002' in menu.data and b'1000001' not in menu.data
+
+
+def test_pdf_do_arquivado(arquivado):
+    _, cliente, romaneio_id = arquivado
+
+    resposta = cliente.get(f'/pdf/{romaneio_id}')
+    assert resposta.status_code == 200 and resposta.data.startswith(b'%PDF')
+
+
+@pytest.fixture
+def arquivo_sem_tabelas(m):
+    """Banco de arquivo anexado vazio, como numa cópia só do banco principal."""
+    with m.db.engine.begin() as conexao:
+        for tabela in ('item', 'volume', 'romaneio'):
+            conexao.exec_driver_sql(f'DROP TABLE {m.ESQUEMA_ARQUIVO}.{tabela}')
+
+
+def test_pdf_com_arquivo_vazio(m, transportadora, criar_romaneio, arquivo_sem_tabelas):
+    transportadora_id, cliente = transportadora
+    romaneio_id = criar_romaneio(transportadora_id, '1000001', itens=['PREGO'])
+    m.Transportadora.query.update({'arquivado_ate': ANTIGA})
+    m.db.session.commit()
+
+    assert cliente.get(f'/pdf/{romaneio_id}').status_code == 200
+    assert cliente.get(f'/pdf/{romaneio_id + 100}').status_code == 404
+    lote = cliente.get(f'/gerar_pdf_lote?ids={romaneio_id}&ids={romaneio_id + 100}')
+    assert lote.status_code == 200 and lote.data.startswith(b'PK')
+    assert cliente.get(f'/menu?data_inicio={ANTIGA.isoformat()}').status_code == 200
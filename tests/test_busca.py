@@ -0,0 +1,94 @@
+"""Busca textual: os gatilhos mantêm a tabela FTS5 em dia com romaneios, volumes e itens."""
+import pytest
+
+
+@pytest.fixture
+def buscar(m):
+    def buscar(transportadora_id, termo, **filtros):
+        return {r.id for r in m.buscar_romaneios(transportadora_id, termo, filtros.get('status'),
+                                                 filtros.get('data_inicio'), filtros.get('data_fim'), 0, 50)}
+    return buscar
+
+
+def test_romaneio_novo_entra_na_busca(m, transportadora, criar_romaneio, buscar):
+    transportadora_id, _ = transportadora
+    romaneio_id = criar_romaneio(transportadora_id, '7788123', cliente='MERCADO AZUL', itens=['PARAFUSO SEXTAVADO'])
+
+    assert m.busca_textual_disponivel()
+    for termo in ('7788', 'NF7788', 'azul', 'SEXTAV', 'PRODUTO'):
+        assert buscar(transportadora_id, termo) == {romaneio_id}, termo
+    assert buscar(transportadora_id, 'inexistente') == set()
+
+
+def test_busca_nao_mostra_romaneios_de_outra_transportadora(transportadora, nova_transportadora,
+                                                            criar_romaneio, buscar):
+    transportadora_id, _ = transportadora
+    outra_id, _ = nova_transportadora('Transportadora B', '22222222000122')
+    criar_romaneio(outra_id, '5550001', cliente='MERCADO AZUL')
+
+    assert buscar(transportadora_id, 'AZUL') == set()
+    assert len(buscar(outra_id, 'AZUL')) == 1
+
+
+def test_troca_de_cliente_reindexa_o_volume(m, transportadora, criar_romaneio, buscar):
+    transportadora_id, _ = transportadora
+    romaneio_id = criar_romaneio(transportadora_id, '1000001', volumes=1, cliente='MERCADO AZUL')
+    [novo_cliente] = m.dimensoes['cliente'].ids([('PADARIA VERDE',)])
+
+    m.Volume.query.filter_by(romaneio_id=romaneio_id).update({'cliente_id': novo_cliente})
+    m.db.session.commit()
+
+    assert buscar(transportadora_id, 'AZUL') == set()
+    assert buscar(transportadora_id, 'VERDE') == {romaneio_id}
+
+
+def test_itens_incluidos_e_apagados_reindexam_o_volume(m, transportadora, criar_romaneio, buscar):
+    transportadora_id, _ = transportadora
+    romaneio_id = criar_romaneio(transportadora_id, '1000001', volumes=1)
+    volume = m.Volume.query.filter_by(romaneio_id=romaneio_id).one()
+
+    m.db.session.add(m.Item(volume_id=volume.id, descricao='ARRUELA LISA'))
+    m.db.session.commit()
+    assert buscar(transportadora_id, 'ARRUELA') == {romaneio_id}
+
+    m.Item.query.filter_by(volume_id=volume.id).delete()
+    m.db.session.commit()
+    assert buscar(transportadora_id, 'ARRUELA') == set()
+
+
+def test_volume_movido_passa_para_o_outro_romaneio(m, transportadora, criar_romaneio, buscar):
+    transportadora_id, _ = transportadora
+    origem = criar_romaneio(transportadora_id, '1000001', volumes=1, cliente='MERCADO AZUL')
+    destino = criar_romaneio(transportadora_id, '1000002', volumes=1, cliente='PADARIA VERDE')
+
+    m.Volume.query.filter_by(romaneio_id=origem).update({'romaneio_id': destino})
+    m.db.session.commit()
+
+    assert buscar(transportadora_id, 'AZUL') == {destino}
+
+
+def test_romaneio_apagado_sai_da_busca(m, transportadora, criar_romaneio, buscar):
+    transportadora_id, _ = transportadora
+    romaneio_id = criar_romaneio(transportadora_id, '1000001', volumes=2, itens=['ARRUELA LISA'])
+
+    volumes = m.db.select(m.Volume.id).where(m.Volume.romaneio_id == romaneio_id)
+    m.Item.query.filter(m.Item.volume_id.in_(volumes)).delete()
+    m.Volume.query.filter_by(romaneio_id=romaneio_id).delete()
+    m.Romaneio.query.filter_by(id=romaneio_id).delete()
+    m.db.session.commit()
+
+    assert buscar(transportadora_id, '1000001') == set()
+    assert m.db.session.execute(m.db.text('SELECT count(*) FROM busca_romaneio')).scalar() == 0
+
+
+def test_limite_de_correspondencias_vale_depois_dos_filtros(m, monkeypatch, transportadora, nova_transportadora,
+                                                            criar_romaneio, buscar):
+    monkeypatch.setattr(m, 'LIMITE_CORRESPONDENCIAS_BUSCA', 2)
+    transportadora_id, _ = transportadora
+    outra_id, _ = nova_transportadora('Transportadora B', '22222222000122')
+    pendente = criar_romaneio(transportadora_id, '1000001', volumes=1, cliente='MERCADO AZUL')
+    # correspondências mais novas (rowid maior) que não passam nos filtros
+    criar_romaneio(outra_id, '2000001', volumes=2, cliente='MERCADO AZUL')
+    criar_romaneio(transportadora_id, '1000002', volumes=2, status='finalizado', cliente='MERCADO AZUL')
+
+    assert buscar(transportadora_id, 'AZUL', status='pendente') == {pendente}
@@ -0,0 +1,57 @@
+"""Cache de PDFs: acerto pela chave de conteúdo, chave nova quando o romaneio muda, limite do disco."""
+import os
+
+import pdf_romaneio
+import pytest
+
+
+@pytest.fixture
+def renderizacoes(m, monkeypatch, tmp_path):
+    monkeypatch.setattr(m, 'cache_pdf', m.CachePdf(str(tmp_path), max_itens_memoria=8,
+                                                    max_bytes_disco=16 * 1024 * 1024))
+    contagem = []
+    original = pdf_romaneio.pdf_romaneio
+
+    def contar(dados):
+        contagem.append(dados['id'])
+        return original(dados)
+    monkeypatch.setattr(pdf_romaneio, 'pdf_romaneio', contar)
+    return contagem
+
+
+def test_segundo_pedido_sai_do_cache(m, transportadora, criar_romaneio, renderizacoes):
+    transportadora_id, cliente = transportadora
+    romaneio_id = criar_romaneio(transportadora_id, '1000001')
+
+    primeiro = cliente.get(f'/pdf/{romaneio_id}')
+    segundo = cliente.get(f'/pdf/{romaneio_id}')
+
+    assert primeiro.status_code == segundo.status_code == 200
+    assert segundo.data == primeiro.data
+    assert renderizacoes == [romaneio_id]
+
+
+def test_mudanca_de_status_gera_pdf_novo(m, transportadora, criar_romaneio, renderizacoes):
+    transportadora_id, cliente = transportadora
+    romaneio_id = criar_romaneio(transportadora_id, '1000001')
+    antes = cliente.get(f'/pdf/{romaneio_id}').data
+
+    cliente.post('/validar_volume', json={'chave': '1000001-0'})
+    depois = cliente.get(f'/pdf/{romaneio_id}').data
+
+    assert renderizacoes == [romaneio_id, romaneio_id]
+    assert depois != antes
+    assert len(os.listdir(m.cache_pdf.diretorio)) == 2  # a versão antiga só deixa de ser usada
+
+
+def test_disco_acima_do_limite_perde_os_mais_antigos(m, tmp_path):
+    cache = m.CachePdf(str(tmp_path), max_itens_memoria=1, max_bytes_disco=350)
+    for n in range(3):
+        cache.guardar(f'{n}-simples-x', bytes(100))
+        os.utime(cache._caminho(f'{n}-simples-x'), (1000 + n, 1000 + n))
+
+    cache.guardar('3-simples-x', bytes(100))  # 400 bytes: sai o mais antigo até ficar em 90% do limite
+
+    assert sorted(os.listdir(tmp_path)) == ['1-simples-x.pdf', '2-simples-x.pdf', '3-simples-x.pdf']
+    assert cache.obter('0-simples-x') is None
+    assert cache.obter('1-simples-x') == bytes(100)  # fora da memória (1 item), lido do disco
@@ -0,0 +1,48 @@
+"""Contadores de volumes do romaneio e de romaneios pendentes da transportadora."""
+
+
+def _contadores(m, romaneio_id):
+    m.db.session.expire_all()
+    romaneio = m.db.session.get(m.Romaneio, romaneio_id)
+    return romaneio.total_volumes, romaneio.volumes_confirmados
+
+
+def test_status_desconhecido_recusado(m, transportadora, criar_romaneio):
+    transportadora_id, cliente = transportadora
+    romaneio_id = criar_romaneio(transportadora_id, '1000001')
+    volume = m.Volume.query.filter_by(romaneio_id=romaneio_id).first()
+    revisao = m.db.session.get(m.Romaneio, romaneio_id).revisao
+
+    resposta = cliente.post('/api/confirmar_volume', json={'volume_id': volume.id, 'status': 'qualquer'})
+
+    assert resposta.status_code == 400
+    m.db.session.expire_all()
+    assert m.db.session.get(m.Volume, volume.id).status == 'pendente'
+    assert m.db.session.get(m.Romaneio, romaneio_id).revisao == revisao
+    assert m.EventoVolume.query.count() == 0
+
+
+def test_status_conhecido_ajusta_contadores(m, transportadora, criar_romaneio):
+    transportadora_id, cliente = transportadora
+    romaneio_id = criar_romaneio(transportadora_id, '1000001')
+    volume = m.Volume.query.filter_by(romaneio_id=romaneio_id).first()
+
+    resposta = cliente.post('/api/confirmar_volume', json={'volume_id': volume.id, 'status': 'confirmado'})
+
+    assert resposta.status_code == 200
+    assert _contadores(m, romaneio_id) == (2, 1)
+
+
+def test_reconciliar_corrige_contadores_divergentes(m, transportadora, criar_romaneio):
+    transportadora_id, cliente = transportadora
+    romaneio_id = criar_romaneio(transportadora_id, '1000001', volumes=3)
+    cliente.post('/validar_volume', json={'chave': '1000001-0'})
+    m.Romaneio.query.update({'total_volumes': 99, 'volumes_confirmados': 7})
+    m.Transportadora.query.update({'romaneios_pendentes': 50})
+    m.db.session.commit()
+
+    resultado = m.app.test_cli_runner().invoke(args=['reconciliar-contadores'])
+
+    assert resultado.exit_code == 0, resultado.output
+    assert _contadores(m, romaneio_id) == (3, 1)
+    assert m.db.session.get(m.Transportadora, transportadora_id).romaneios_pendentes == 1
@@ -0,0 +1,58 @@
+"""Tabelas de dimensão: nomes gravados uma vez e migração dos bancos com as colunas de texto."""
+from datetime import date
+
+
+def test_nomes_viram_ids_e_voltam_como_atributos(m, transportadora, criar_romaneio):
+    transportadora_id, _ = transportadora
+    primeiro = criar_romaneio(transportadora_id, '1000001', volumes=2, cliente='MERCADO AZUL', itens=['ARRUELA'])
+    criar_romaneio(transportadora_id, '1000002', volumes=1, cliente='MERCADO AZUL')
+
+    volumes = m.Volume.query.filter_by(romaneio_id=primeiro).all()
+    assert {v.cliente for v in volumes} == {'MERCADO AZUL'}
+    assert (volumes[0].cod_regiao, volumes[0].regiao, volumes[0].rota) == ('01', 'CENTRO', 'R1')
+    assert volumes[0].itens[0].cliente == 'MERCADO AZUL'
+    assert m.Cliente.query.count() == 1  # o mesmo nome em três volumes e dois itens
+    assert len({v.cliente_id for v in m.Volume.query}) == 1
+
+
+def test_volume_sem_nome_fica_sem_id(m, transportadora):
+    transportadora_id, _ = transportadora
+    volume = m.Volume(chave_de_acesso='X', cliente=None, cod_regiao=None, regiao=None)
+
+    assert volume.cliente_id is None and volume.regiao_id is None
+    assert volume.cliente is None
+
+
+def test_migracao_passa_colunas_de_texto_para_as_dimensoes(m, transportadora):
+    transportadora_id, _ = transportadora
+    legadas = {'volume': ('cliente', 'cod_regiao', 'regiao', 'produto', 'rota'),
+               'item': ('cliente', 'regiao', 'destino')}
+    with m.db.engine.begin() as conexao:
+        for tabela, colunas in legadas.items():
+            for coluna in colunas:
+                conexao.exec_driver_sql(f'ALTER TABLE {tabela} ADD COLUMN {coluna} VARCHAR(200)')
+        conexao.exec_driver_sql(
+            'INSERT INTO romaneio (id, pre_nota, num_nota, data_emissao, status, transportadora_id) '
+            f"VALUES (1, '1000001', 'NF1', '{date.today()}', 'pendente', {transportadora_id})")
+        conexao.exec_driver_sql(
+            'INSERT INTO volume (id, romaneio_id, chave_de_acesso, status, cliente, cod_regiao, regiao, produto, rota) '
+            "VALUES (1, 1, 'C1', 'pendente', 'MERCADO AZUL', '18', 'E DIRETA', 'CAIXA', 'R9'), "
+            "       (2, 1, 'C2', 'pendente', 'MERCADO AZUL', NULL, NULL, NULL, NULL)")
+        conexao.exec_driver_sql(
+            "INSERT INTO item (id, volume_id, descricao, cliente, regiao, destino) "
+            "VALUES (1, 1, 'ARRUELA', 'MERCADO AZUL', '18', 'E DIRETA')")
+
+    m.migrar_banco()
+
+    inspetor = m.db.inspect(m.db.engine)
+    for tabela, colunas in legadas.items():
+        assert not set(colunas) & {c['name'] for c in inspetor.get_columns(tabela)}
+    m.db.session.expire_all()
+    primeiro, segundo = m.Volume.query.order_by(m.Volume.id).all()
+    assert (primeiro.cliente, primeiro.cod_regiao, primeiro.regiao, primeiro.produto, primeiro.rota) == \
+        ('MERCADO AZUL', '18', 'E DIRETA', 'CAIXA', 'R9')
+    assert segundo.cliente_id == primeiro.cliente_id and segundo.regiao_id is None
+    item = m.Item.query.one()
+    assert (item.cliente, item.regiao, item.destino) == ('MERCADO AZUL', '18', 'E DIRETA')
+    assert item.regiao_id == primeiro.regiao_id
+    assert m.Cliente.query.count() == 1
@@ -0,0 +1,23 @@
+def test_leitor_qr_servido_pelo_app(m, transportadora, criar_romaneio):
+    transportadora_id, cliente = transportadora
+    romaneio_id = criar_romaneio(transportadora_id, '1000001')
+
+    pagina = cliente.get(f'/romaneio/{romaneio_id}').get_data(as_text=True)
+    sw = cliente.get('/sw.js').get_data(as_text=True)
+    with m.app.test_request_context():
+        url = m.url_estatico('js/leitor_qr.js')
+    leitor = cliente.get(url)
+
+    assert url.startswith('/static/dist/js/leitor_qr.') and url in pagina and url in sw
+    assert leitor.status_code == 200 and b'class LeitorQr' in leitor.get_data()
+    assert 'https://' not in pagina and 'https://' not in sw
+
+
+def test_sair_limpa_paginas_guardadas(m, transportadora):
+    _, cliente = transportadora
+
+    sw = cliente.get('/sw.js').get_data(as_text=True)
+    resposta = cliente.get('/logout')
+
+    assert "'limpar-paginas'" in sw and 'caches.delete(CACHE_PAGINAS)' in sw
+    assert resposta.headers['Clear-Site-Data'] == '"cache"'
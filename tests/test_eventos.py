@@ -0,0 +1,22 @@
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def uma_vaga(m, monkeypatch):
+    monkeypatch.setattr(m, 'vagas_eventos', threading.BoundedSemaphore(1))
+
+
+def test_streams_acima_do_limite_recusados(m, transportadora, criar_romaneio, uma_vaga):
+    transportadora_id, cliente = transportadora
+    romaneio_id = criar_romaneio(transportadora_id, '1000001')
+
+    aberto = cliente.get(f'/eventos/{romaneio_id}', buffered=False)
+    assert aberto.status_code == 200 and aberto.mimetype == 'text/event-stream'
+    assert cliente.get(f'/eventos/{romaneio_id}').status_code == 503
+
+    aberto.close()  # o servidor fecha a resposta: a vaga volta
+    outro = cliente.get(f'/eventos/{romaneio_id}', buffered=False)
+    assert outro.status_code == 200
+    outro.close()
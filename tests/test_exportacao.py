@@ -0,0 +1,55 @@
+"""Exportação dos volumes em CSV e XLSX com os filtros do menu."""
+import csv
+import io
+import zipfile
+from datetime import date, timedelta
+from xml.etree import ElementTree
+
+import pytest
+
+NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+ANTIGA = date.today() - timedelta(days=40)
+
+
+@pytest.fixture
+def cliente(m, transportadora, nova_transportadora, criar_romaneio):
+    transportadora_id, cliente = transportadora
+    criar_romaneio(transportadora_id, '1000001', volumes=3, cliente='MERCADO AZUL')
+    criar_romaneio(transportadora_id, '1000002', volumes=2, status='finalizado')
+    criar_romaneio(transportadora_id, '1000003', volumes=2, data_emissao=ANTIGA)
+    outra_id, _ = nova_transportadora('Transportadora B', '22222222000122')
+    criar_romaneio(outra_id, '2000001', volumes=2)
+    cliente.post('/validar_volume', json={'chave': '1000001-0'})
+    return cliente
+
+
+def _csv(cliente, consulta=''):
+    resposta = cliente.get(f'/exportar/volumes.csv{consulta}')
+    assert resposta.status_code == 200 and resposta.mimetype == 'text/csv'
+    return list(csv.reader(io.StringIO(resposta.data.decode('utf-8-sig')), delimiter=';'))
+
+
+def test_csv_traz_os_faltantes_da_transportadora(m, cliente):
+    cabecalho, *linhas = _csv(cliente)
+
+    assert cabecalho == [titulo for _, titulo in m.COLUNAS_EXPORTACAO]
+    assert sorted(linha[-2] for linha in linhas) == ['1000001-1', '1000001-2', '1000003-0', '1000003-1']
+    assert {linha[cabecalho.index('Cliente')] for linha in linhas} == {'MERCADO AZUL', 'CLIENTE PADRAO'}
+    assert {linha[-1] for linha in linhas} == {'pendente'}
+
+
+def test_filtros_do_menu(cliente):
+    assert len(_csv(cliente, f'?data_inicio={date.today().isoformat()}')) == 1 + 2
+    assert len(_csv(cliente, '?volumes=todos')) == 1 + 7
+    assert len(_csv(cliente, '?volumes=todos&status=finalizado')) == 1 + 2
+    assert len(_csv(cliente, f'?volumes=todos&data_fim={ANTIGA.isoformat()}')) == 1 + 2
+
+
+def test_xlsx_com_as_mesmas_linhas(m, cliente):
+    resposta = cliente.get('/exportar/volumes.xlsx')
+
+    with zipfile.ZipFile(io.BytesIO(resposta.data)) as arquivo:
+        planilha = ElementTree.fromstring(arquivo.read('xl/worksheets/sheet1.xml'))
+    linhas = [[''.join(c.itertext()) for c in linha] for linha in planilha.iter(NS + 'row')]
+    assert linhas[0] == [titulo for _, titulo in m.COLUNAS_EXPORTACAO]
+    assert linhas[1:] == _csv(cliente)[1:]
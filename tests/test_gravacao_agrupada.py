@@ -0,0 +1,153 @@
+"""Commit agrupado (GRAVACAO_AGRUPADA=1): várias requisições, um commit, erro só para quem falhou."""
+import threading
+import time
+
+import pytest
+from sqlalchemy import event
+
+
+@pytest.fixture
+def gravador(m):
+    return m.GravadorAgrupado(tamanho_grupo=16, intervalo=0.05)
+
+
+@pytest.fixture
+def commits(m):
+    contagem = []
+    ouvinte = lambda conexao: contagem.append(1)  # noqa: E731
+    event.listen(m.db.engine, 'commit', ouvinte)
+    yield contagem
+    event.remove(m.db.engine, 'commit', ouvinte)
+
+
+def _em_paralelo(gravador, funcoes, fila_ocupada):
+    """Segura a thread do gravador até todas as `funcoes` estarem na fila e
+    devolve {nome: resultado ou exceção}."""
+    comecou, liberar = threading.Event(), threading.Event()
+    resultados = {}
+
+    def bloqueio():
+        comecou.set()
+        liberar.wait(5)
+
+    def executar(nome, funcao):
+        try:
+            resultados[nome] = gravador.executar(funcao)
+        except Exception as erro:
+            resultados[nome] = erro
+
+    primeira = threading.Thread(target=executar, args=('bloqueio', bloqueio))
+    primeira.start()
+    comecou.wait(5)
+    threads = [threading.Thread(target=executar, args=item) for item in funcoes.items()]
+    for thread in threads:
+        thread.start()
+    while gravador.fila.qsize() < fila_ocupada:
+        time.sleep(0.001)
+    liberar.set()
+    for thread in [primeira] + threads:
+        thread.join(5)
+    return resultados
+
+
+def _nova_transportadora(m, nome):
+    def funcao():
+        transportadora = m.Transportadora(nome=nome)
+        m.db.session.add(transportadora)
+        m.db.session.flush()
+        return transportadora.id
+    return funcao
+
+
+def test_gravacoes_concorrentes_saem_num_commit_so(m, gravador, commits):
+    funcoes = {f'T{n}': _nova_transportadora(m, f'T{n}') for n in range(6)}
+    resultados = _em_paralelo(gravador, funcoes, fila_ocupada=6)
+
+    assert len(commits) == 1  # o bloqueio não escreve; as seis vão juntas
+    ids = [resultados[nome] for nome in funcoes]
+    assert len(set(ids)) == 6
+    m.db.session.expire_all()
+    assert {t.nome for t in m.Transportadora.query.filter(m.Transportadora.id.in_(ids))} == set(funcoes)
+
+
+def test_erro_volta_so_para_a_gravacao_que_falhou(m, gravador):
+    def falha():
+        _nova_transportadora(m, 'desfeita')()
+        raise ValueError('falhou')
+
+    resultados = _em_paralelo(gravador, {
+        'antes': _nova_transportadora(m, 'antes'), 'falha': falha, 'depois': _nova_transportadora(m, 'depois'),
+    }, fila_ocupada=3)
+
+    assert isinstance(resultados['falha'], ValueError)
+    m.db.session.expire_all()
+    assert sorted(t.nome for t in m.Transportadora.query) == ['antes', 'depois']
+
+
+def test_gravar_usa_o_gravador_quando_agrupada(m, monkeypatch, transportadora, criar_romaneio):
+    monkeypatch.setattr(m, 'GRAVACAO_AGRUPADA', True)
+    transportadora_id, cliente = transportadora
+    romaneio_id = criar_romaneio(transportadora_id, '1001', volumes=2)
+
+    resposta = cliente.post('/validar_volume', json={'qr_code': '1001-0', 'romaneio_id': romaneio_id})
+
+    assert resposta.status_code == 200 and resposta.get_json()['resultado'] == 'confirmado'
+    m.db.session.expire_all()
+    assert m.db.session.get(m.Romaneio, romaneio_id).volumes_confirmados == 1
+
+
+def test_gravacao_que_nao_comeca_a_tempo_e_descartada(m):
+    gravador = m.GravadorAgrupado(tamanho_grupo=16, intervalo=0.001, espera=0.05)
+    comecou, liberar = threading.Event(), threading.Event()
+    executadas = []
+
+    def bloqueio():
+        comecou.set()
+        liberar.wait(5)
+
+    primeira = threading.Thread(target=gravador.executar, args=(bloqueio,))
+    primeira.start()
+    comecou.wait(5)
+    with pytest.raises(m.GravacaoIndisponivel):
+        gravador.executar(lambda: executadas.append('expirada'))
+    liberar.set()
+    primeira.join(5)
+
+    assert gravador.executar(lambda: 'seguinte') == 'seguinte'
+    assert executadas == []  # a descartada não roda depois que a fila anda
+
+
+def test_thread_do_gravador_morta_e_refeita(m, gravador):
+    gravador.executar(lambda: None)
+    gravador._thread = threading.Thread(target=lambda: None)
+    gravador._thread.start()
+    gravador._thread.join()
+
+    assert gravador.executar(lambda: 'ok') == 'ok'
+
+
+def test_lote_passa_pelo_gravador(m, monkeypatch, transportadora, criar_romaneio):
+    gravados = []
+    original = m.gravar
+    monkeypatch.setattr(m, 'gravar', lambda funcao: gravados.append(funcao) or original(funcao))
+    monkeypatch.setattr(m, 'GRAVACAO_AGRUPADA', True)
+    transportadora_id, cliente = transportadora
+    romaneio_id = criar_romaneio(transportadora_id, '1001', volumes=2)
+
+    resposta = cliente.post('/validar_volume/lote', json={'chaves': ['1001-0', '1001-1']})
+
+    assert resposta.get_json()['confirmados'] == 2 and len(gravados) == 1
+    m.db.session.expire_all()
+    assert m.db.session.get(m.Romaneio, romaneio_id).volumes_confirmados == 2
+
+
+def test_gravacao_indisponivel_responde_503(m, monkeypatch, transportadora):
+    def indisponivel(funcao):
+        raise m.GravacaoIndisponivel('fila cheia')
+    monkeypatch.setattr(m, 'gravar', indisponivel)
+    _, cliente = transportadora
+
+    resposta = cliente.post('/validar_volume/lote', json={'chaves': ['1001-0']})
+
+    assert resposta.status_code == 503 and resposta.headers['Retry-After'] == '1'
+    assert 'erro' in resposta.get_json()
@@ -0,0 +1,58 @@
+"""Importação do WMS: upsert pela chave de acesso, restrito à transportadora que importa."""
+import io
+
+import pytest
+
+CABECALHO = 'pre_nota;num_nota;data_emissao;chave_de_acesso;cliente;itens\n'
+
+
+@pytest.fixture
+def importar():
+    def importar(cliente, *linhas):
+        dados = (CABECALHO + ''.join(linha + '\n' for linha in linhas)).encode()
+        resposta = cliente.post('/importar', data={'arquivo': (io.BytesIO(dados), 'carga.csv')})
+        assert resposta.status_code == 200
+        return resposta.get_json()
+    return importar
+
+
+def test_importacao_cria_romaneios_volumes_e_itens(m, transportadora, importar):
+    transportadora_id, cliente = transportadora
+
+    relatorio = importar(cliente, '1000001;NF1;2024-05-02;K1;MERCADO AZUL;ARRUELA|PREGO',
+                         '1000001;NF1;02/05/2024;K2;MERCADO AZUL;', '1000002;NF2;2024-05-02;;;')
+
+    assert (relatorio['romaneios_criados'], relatorio['volumes_inseridos'], relatorio['itens']) == (1, 2, 2)
+    assert relatorio['erros'] == [{'linha': 4, 'motivo': 'campos obrigatórios vazios: chave_de_acesso'}]
+    romaneio = m.Romaneio.query.filter_by(transportadora_id=transportadora_id).one()
+    assert (romaneio.total_volumes, romaneio.volumes_confirmados) == (2, 0)
+
+
+def test_chave_de_outra_transportadora_e_rejeitada(m, transportadora, nova_transportadora, importar):
+    transportadora_id, cliente = transportadora
+    _, outro_cliente = nova_transportadora('Transportadora B', '22222222000122')
+    importar(cliente, '1000001;NF1;2024-05-02;K1;MERCADO AZUL;ARRUELA')
+
+    relatorio = importar(outro_cliente, '2000001;NF9;2024-05-02;K1;INVASOR;PREGO',
+                         '2000001;NF9;2024-05-02;K9;PADARIA VERDE;')
+
+    assert relatorio['rejeitados'] == 1 and relatorio['volumes_inseridos'] == 1
+    assert relatorio['volumes_atualizados'] == 0
+    assert relatorio['erros'] == [{'linha': 2, 'motivo': 'chave de acesso pertence a outra transportadora'}]
+    m.db.session.expire_all()
+    volume = m.Volume.query.filter_by(chave_de_acesso='K1').one()
+    assert volume.romaneio.transportadora_id == transportadora_id
+    assert volume.cliente == 'MERCADO AZUL'
+    assert [i.descricao for i in volume.itens] == ['ARRUELA']
+
+
+def test_volume_movido_refaz_os_contadores_do_romaneio_que_deixou(m, transportadora, importar):
+    transportadora_id, cliente = transportadora
+    importar(cliente, '1000001;NF1;2024-05-02;K1;;', '1000001;NF1;2024-05-02;K2;;')
+
+    relatorio = importar(cliente, '1000002;NF2;2024-05-02;K2;;')
+
+    assert relatorio['volumes_atualizados'] == 1
+    m.db.session.expire_all()
+    totais = {r.pre_nota: r.total_volumes for r in m.Romaneio.query.filter_by(transportadora_id=transportadora_id)}
+    assert totais == {'1000001': 1, '1000002': 1}
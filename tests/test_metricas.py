@@ -0,0 +1,26 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from metricas import formatar_prometheus
+
+
+def test_valores_grandes_sem_perder_precisao():
+    contadores = {('romaneio_leituras_total', ()): 1234567, ('romaneio_sql_segundos_total', ()): 0.1 + 0.2}
+    histogramas = {('romaneio_requisicao_segundos', (('rota', 'menu'),)): [1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
+                                                                          1234567.125, 7654321]}
+    texto = formatar_prometheus(contadores, histogramas, {})
+
+    assert 'romaneio_leituras_total 1234567\n' in texto
+    assert 'romaneio_sql_segundos_total 0.30000000000000004\n' in texto
+    assert 'romaneio_requisicao_segundos_sum{rota="menu"} 1234567.125\n' in texto
+    assert 'romaneio_requisicao_segundos_count{rota="menu"} 7654321\n' in texto
+
+
+def test_comando_com_erro_nao_deixa_inicio_na_conexao(m):
+    with m.app.app_context(), m.db.engine.connect() as conexao:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conexao.exec_driver_sql('SELECT * FROM tabela_que_nao_existe')
+        conexao.exec_driver_sql('SELECT 1')
+
+        assert conexao.info['inicio_sql'] == []
@@ -0,0 +1,39 @@
+"""Planos de execução das consultas críticas (o mesmo critério do `flask verificar-planos`)."""
+import pytest
+
+CONSULTAS = ('menu', 'validar_chave', 'validar_pre_nota', 'api_volumes', 'api_volumes_delta', 'api_itens',
+             'api_volumes_itens', 'exportar_faltantes', 'menu_arquivo', 'busca', 'busca_arquivo', 'resumo',
+             'eventos')
+
+
+@pytest.fixture
+def planos(m):
+    return m.planos_das_consultas_criticas()
+
+
+def test_todas_as_consultas_criticas_sao_verificadas(planos):
+    assert set(planos) == set(CONSULTAS)
+
+
+@pytest.mark.parametrize('nome', CONSULTAS)
+def test_nenhuma_consulta_critica_varre_tabela_inteira(m, planos, nome):
+    assert m.varreduras_completas(planos[nome]) == [], planos[nome]
+
+
+@pytest.mark.parametrize('nome, indice', [
+    ('menu', 'ix_romaneio_transportadora_data'),
+    ('menu_arquivo', 'ix_romaneio_transportadora_data'),
+    ('validar_chave', 'ix_volume_chave_de_acesso'),
+    ('validar_pre_nota', 'ix_romaneio_transportadora_pre_nota'),
+    ('api_volumes_delta', 'ix_volume_romaneio_revisao'),
+    ('api_itens', 'ix_item_volume'),
+    ('eventos', 'ix_evento_volume_romaneio'),
+])
+def test_consulta_usa_o_indice_esperado(planos, nome, indice):
+    assert any(indice in linha for linha in planos[nome]), planos[nome]
+
+
+def test_varredura_sem_indice_e_detectada(m):
+    assert m.varreduras_completas(['SCAN volume']) == ['SCAN volume']
+    assert m.varreduras_completas(['SCAN volume USING INDEX ix_volume_romaneio_status']) == []
+    assert m.varreduras_completas(['MATERIALIZE busca', 'SCAN busca']) == []
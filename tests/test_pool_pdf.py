@@ -0,0 +1,45 @@
+import os
+
+import pytest
+from concurrent.futures.process import BrokenProcessPool
+
+
+def dobrar_ou_morrer(dados):
+    """Derruba o processo filho na primeira vez que vê o documento 0 (enquanto a marca não existe)."""
+    marca, numero = dados
+    if numero == 0 and not os.path.exists(marca):
+        open(marca, 'w').close()
+        os._exit(1)
+    return numero * 2
+
+
+def sempre_morrer(dados):
+    os._exit(1)
+
+
+@pytest.fixture
+def pool_novo(m, monkeypatch):
+    monkeypatch.setattr(m, 'PROCESSOS_PDF', 2)
+    m._pool_pdf = None
+    yield
+    if m._pool_pdf is not None:
+        m._pool_pdf.shutdown()
+        m._pool_pdf = None
+
+
+def test_pool_quebrado_e_recriado(m, pool_novo, tmp_path):
+    marca = str(tmp_path / 'morreu')
+    documentos = [(marca, n) for n in range(6)]
+
+    resultados = dict(m.renderizar_em_paralelo(dobrar_ou_morrer, documentos))
+
+    assert resultados == {(marca, n): n * 2 for n in range(6)}
+    assert os.path.exists(marca)
+    # o pool que sobrou é o novo e segue atendendo
+    assert dict(m.renderizar_em_paralelo(dobrar_ou_morrer, [(marca, 9)])) == {(marca, 9): 18}
+
+
+def test_pool_que_quebra_de_novo_desiste(m, pool_novo):
+    with pytest.raises(BrokenProcessPool):
+        list(m.renderizar_em_paralelo(sempre_morrer, [1, 2, 3]))
+    assert m._pool_pdf is None
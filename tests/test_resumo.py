@@ -0,0 +1,85 @@
+"""Resumo da operação: contadores gravados junto com a conferência e romaneios pendentes."""
+from datetime import date
+
+
+def _resumo_de_hoje(cliente):
+    dados = cliente.get('/api/resumo').get_json()
+    return dados, next((d for d in dados['dias'] if d['dia'] == date.today().isoformat()), None)
+
+
+def _confirmar_todos(cliente, pre_nota, volumes):
+    for n in range(volumes):
+        assert cliente.post('/validar_volume', json={'qr_code': f'{pre_nota}-{n}'}).status_code == 200
+
+
+def test_leituras_achadas_e_nao_achadas_sao_contadas(transportadora, criar_romaneio):
+    transportadora_id, cliente = transportadora
+    criar_romaneio(transportadora_id, '1000001', volumes=2)
+
+    cliente.post('/validar_volume', json={'qr_code': '1000001-0'})
+    assert cliente.post('/validar_volume', json={'qr_code': 'inexistente'}).status_code == 404
+
+    _, hoje = _resumo_de_hoje(cliente)
+    assert (hoje['leituras'], hoje['volumes_confirmados']) == (2, 1)
+
+
+def test_finalizar_de_novo_nao_conta_outra_finalizacao(m, transportadora, criar_romaneio):
+    transportadora_id, cliente = transportadora
+    romaneio_id = criar_romaneio(transportadora_id, '1000001', volumes=2)
+    _confirmar_todos(cliente, '1000001', 2)
+
+    for _ in range(3):
+        resposta = cliente.post('/finalizar_conferencia', json={'romaneio_id': romaneio_id}).get_json()
+        assert resposta['status_romaneio'] == 'finalizado'
+
+    _, hoje = _resumo_de_hoje(cliente)
+    assert hoje['romaneios_finalizados'] == 1
+    assert m.EventoVolume.query.filter_by(romaneio_id=romaneio_id, volume_id=None).count() == 1
+
+
+def test_pendentes_e_o_estado_atual_e_nao_uma_contagem_de_finalizacoes(m, transportadora, criar_romaneio):
+    transportadora_id, cliente = transportadora
+    primeiro = criar_romaneio(transportadora_id, '1000001', volumes=1)
+    segundo = criar_romaneio(transportadora_id, '1000002', volumes=1)
+    criar_romaneio(transportadora_id, '1000003', volumes=1, status='finalizado')
+
+    # finalizar sem conferir tudo mantém o romaneio pendente: não muda a contagem
+    cliente.post('/finalizar_conferencia', json={'romaneio_id': segundo})
+    dados, hoje = _resumo_de_hoje(cliente)
+    assert dados['romaneios_pendentes'] == 2
+    assert hoje is None  # nada mudou de status: o resumo não tem o que registrar
+
+    _confirmar_todos(cliente, '1000001', 1)
+    cliente.post('/finalizar_conferencia', json={'romaneio_id': primeiro})
+    dados, hoje = _resumo_de_hoje(cliente)
+    assert dados['romaneios_pendentes'] == 1
+    assert (hoje['romaneios_pendentes'], hoje['romaneios_finalizados']) == (1, 1)
+
+
+def test_pendentes_acompanha_importacao_e_exclusao(m, transportadora, criar_romaneio):
+    transportadora_id, _ = transportadora
+    romaneio_id = criar_romaneio(transportadora_id, '1000001', volumes=0)
+    m.db.session.execute(m.Romaneio.__table__.insert(), [
+        {'pre_nota': p, 'num_nota': p, 'data_emissao': date.today(), 'status': 'pendente',
+         'transportadora_id': transportadora_id} for p in ('2', '3')])
+    m.Romaneio.query.filter_by(id=romaneio_id).delete()
+    m.db.session.commit()
+
+    assert m.romaneios_pendentes(transportadora_id) == 2
+    m.Transportadora.query.update({'romaneios_pendentes': 99})
+    m.db.session.commit()
+    m.reconciliar_pendentes()
+    assert m.romaneios_pendentes(transportadora_id) == 2
+
+
+def test_reconstruir_resumo_refaz_contadores_e_mantem_pendentes(m, transportadora, criar_romaneio):
+    transportadora_id, cliente = transportadora
+    romaneio_id = criar_romaneio(transportadora_id, '1000001', volumes=1)
+    criar_romaneio(transportadora_id, '1000002', volumes=1)
+    _confirmar_todos(cliente, '1000001', 1)
+    cliente.post('/finalizar_conferencia', json={'romaneio_id': romaneio_id})
+
+    m.reconstruir_resumo()
+
+    _, hoje = _resumo_de_hoje(cliente)
+    assert (hoje['volumes_confirmados'], hoje['romaneios_finalizados'], hoje['romaneios_pendentes']) == (1, 1, 1)
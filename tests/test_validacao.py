@@ -0,0 +1,80 @@
+"""Leitura de QR: validação individual e em lote, com as repetições absorvidas."""
+import pytest
+
+
+@pytest.fixture
+def romaneio(transportadora, criar_romaneio):
+    transportadora_id, cliente = transportadora
+    return criar_romaneio(transportadora_id, '1000001', volumes=3)
+
+
+def _lote(cliente, *chaves):
+    resposta = cliente.post('/validar_volume/lote', json={'chaves': list(chaves)})
+    assert resposta.status_code == 200
+    return resposta.get_json()
+
+
+def test_lote_confirma_pela_chave_e_pela_pre_nota(m, transportadora, romaneio):
+    _, cliente = transportadora
+    qr_pre_nota = '0' * 11 + '1000001'  # pre_nota_do_qr() lê as posições 11 a 17
+
+    dados = _lote(cliente, '1000001-0', qr_pre_nota, 'inexistente')
+
+    assert [r['resultado'] for r in dados['resultados']] == ['confirmado', 'confirmado', 'nao_encontrado']
+    assert dados['confirmados'] == 2
+    m.db.session.expire_all()
+    assert m.db.session.get(m.Romaneio, romaneio).volumes_confirmados == 2
+
+
+def test_lote_reenviado_nao_consome_outros_volumes_pela_pre_nota(m, transportadora, romaneio):
+    _, cliente = transportadora
+    qr_pre_nota = '0' * 11 + '1000001'
+    primeiro = _lote(cliente, qr_pre_nota)
+
+    reenviado = _lote(cliente, qr_pre_nota)
+
+    [resultado] = reenviado['resultados']
+    assert resultado['resultado'] == 'ja_conferido'
+    assert resultado['volume_id'] == primeiro['resultados'][0]['volume_id']
+    assert reenviado['confirmados'] == 0
+    m.db.session.expire_all()
+    assert m.db.session.get(m.Romaneio, romaneio).volumes_confirmados == 1
+
+
+def test_leitura_individual_e_lote_compartilham_as_leituras_recentes(m, transportadora, romaneio):
+    _, cliente = transportadora
+    qr_pre_nota = '0' * 11 + '1000001'
+    assert cliente.post('/validar_volume', json={'qr_code': qr_pre_nota}).status_code == 200
+
+    dados = _lote(cliente, qr_pre_nota, '1000001-2')
+
+    assert [r['resultado'] for r in dados['resultados']] == ['ja_conferido', 'confirmado']
+    m.db.session.expire_all()
+    assert m.db.session.get(m.Romaneio, romaneio).volumes_confirmados == 2
+
+
+def test_repeticao_de_outra_sessao_nao_e_absorvida(m, transportadora, romaneio):
+    _, cliente = transportadora
+    qr_pre_nota = '0' * 11 + '1000001'
+    _lote(cliente, qr_pre_nota)
+    outra_sessao = m.app.test_client()
+    outra_sessao.post('/', data={'cnpj': '11111111000111', 'senha': 'senha'})
+
+    dados = _lote(outra_sessao, qr_pre_nota)
+
+    assert dados['resultados'][0]['resultado'] == 'confirmado'
+
+
+def test_candidato_descartado_por_outra_requisicao(m, transportadora, romaneio, monkeypatch):
+    transportadora_id, cliente = transportadora
+    candidatos = m.IndiceLeitura.candidatos
+
+    def descartados_logo_depois(indice, chave, pre_nota):
+        encontrados = candidatos(indice, chave, pre_nota)
+        indice.descartar(list(indice.volumes))  # outra leitura descartou os mesmos volumes
+        return encontrados
+    monkeypatch.setattr(m.IndiceLeitura, 'candidatos', descartados_logo_depois)
+
+    resposta = cliente.post('/validar_volume', json={'chave': '1000001-0'})
+
+    assert resposta.status_code == 200 and resposta.get_json()['resultado'] == 'confirmado'